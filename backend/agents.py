@@ -1,32 +1,19 @@
-from agno.agent import Agent
-from agno.models.openai import OpenAIChat
-from agno.db.postgres import PostgresDb
-import os
+import logging
+from typing import TYPE_CHECKING
+
 from dotenv import load_dotenv
 
 load_dotenv()
 from models import TestConfig, EvaluationResult
+from storage import get_storage_manager, escopo_sessao
+from prompt_layout import carregar_prompt
+from credentials import criar_modelo
 
-# Inicialização Singleton do Banco de Dados para evitar conflitos de Metadata
-# Isso garante que a tabela 'agent_memories' seja definida apenas uma vez
-agent_storage = None
+if TYPE_CHECKING:
+    from agno.agent import Agent
 
-# Construção segura da URL do banco a partir das variáveis individuais
-db_user = os.getenv("DB_USER")
-db_password = os.getenv("DB_PASSWORD")
-db_host = os.getenv("DB_HOST")
-db_port = os.getenv("DB_PORT", "5432")
-db_name = os.getenv("DB_NAME", "postgres")
+logger = logging.getLogger(__name__)
 
-if db_user and db_password and db_host:
-    from urllib.parse import quote_plus
-    encoded_password = quote_plus(db_password)
-    db_url = f"postgresql://{db_user}:{encoded_password}@{db_host}:{db_port}/{db_name}"
-    
-    agent_storage = PostgresDb(
-        db_url=db_url,
-        memory_table="agent_memories",
-    )
 
 # Modelos disponíveis da OpenAI
 AVAILABLE_MODELS = [
@@ -49,27 +36,46 @@ AVAILABLE_MODELS = [
     "o3-mini"
 ]
 
-def create_subject_agent(config: TestConfig, model_id: str = "gpt-4.1") -> Agent:
+def novo_agente(**kwargs) -> "Agent":
+    """
+    `agno.agent.Agent(**kwargs)`, importando o Agno só na criação do primeiro agente.
+
+    Todos os agentes do projeto passam por aqui: o import do Agno sai do cold
+    start da API e dos workers.
+    """
+    from agno.agent import Agent
+
+    return Agent(**kwargs)
+
+def create_subject_agent(
+    config: TestConfig,
+    model_id: str = "gpt-4.1",
+    collection_id: str = None,
+    run_id: str = None
+) -> "Agent":
     """
     Cria o agente que está sendo testado (O Sujeito).
     Aceita o model_id para selecionar qual modelo OpenAI usar.
+    collection_id/run_id isolam memórias e sessão desta execução no storage.
+    A chave vem de config.openai_api_key (nunca de os.environ compartilhado).
     """
-    return Agent(
-        model=OpenAIChat(id=model_id),
+    return novo_agente(
+        model=criar_modelo(model_id, config.openai_api_key),
         description="Você é o Assistente de IA sendo testado.",
         instructions=[config.subject_instruction],
         markdown=True,
-        db=agent_storage,
+        db=get_storage_manager().db_para(collection_id),
         update_memory_on_run=True,
+        **escopo_sessao(collection_id, run_id, "subject"),
     )
 
-def create_evaluator_agent(config: TestConfig) -> Agent:
+def create_evaluator_agent(config: TestConfig, collection_id: str = None, run_id: str = None) -> "Agent":
     """
     Cria o agente que conduz o teste (O Avaliador).
     Usa gpt-4.1 como padrão.
     """
-    return Agent(
-        model=OpenAIChat(id="gpt-4.1"),
+    return novo_agente(
+        model=criar_modelo("gpt-4.1", config.openai_api_key),
         description="Você é o Testador QA avaliando outro agente de IA.",
         instructions=[
             config.evaluator_instruction, 
@@ -77,33 +83,31 @@ def create_evaluator_agent(config: TestConfig) -> Agent:
             "Interaja sequencialmente. Não gere o relatório final até que a conversa termine."
         ],
         markdown=True,
-        db=agent_storage,
+        db=get_storage_manager().db_para(collection_id),
         update_memory_on_run=True,
+        **escopo_sessao(collection_id, run_id, "evaluator"),
     )
 
-def create_judge_agent(config: TestConfig) -> Agent:
+def create_judge_agent(config: TestConfig) -> "Agent":
     """
     Um agente especializado de curta duração que analisa a transcrição e produz o relatório final.
     Usa o modelo padrão do Agno (OpenAIChat gpt-4o).
+    A rubrica (prompts/prompt_judge_agent.md) é lida uma vez por processo e é o
+    prefixo estável de todas as chamadas ao juiz (ver prompt_layout).
     """
-    # Define o caminho para o arquivo de prompt
-    prompt_path = os.path.join(os.path.dirname(__file__), "prompts", "prompt_judge_agent.md")
-    
-    # Lê o conteúdo do arquivo
     try:
-        with open(prompt_path, "r", encoding="utf-8") as f:
-            judge_instructions = f.read()
+        judge_instructions = carregar_prompt("prompt_judge_agent.md")
     except Exception as e:
         # Fallback caso o arquivo não seja encontrado
-        print(f"AVISO: Não foi possível ler o prompt do juiz em {prompt_path}: {e}")
+        logger.warning("Não foi possível ler o prompt do juiz: %s", e)
         judge_instructions = (
             "Analise a conversa a seguir entre um Testador QA e um Agente Sujeito. "
             "Com base nos objetivos, avalie o desempenho do Agente Sujeito. "
             "Retorne o resultado no formato JSON especificado. O campo 'reasoning' e 'suggestions' DEVEM estar em Português do Brasil."
         )
 
-    return Agent(
-        model=OpenAIChat(id="gpt-4.1"),
+    return novo_agente(
+        model=criar_modelo("gpt-4.1", config.openai_api_key),
         description="Você é o Juiz Final.",
         instructions=[judge_instructions],
         output_schema=EvaluationResult,
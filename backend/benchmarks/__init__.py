@@ -0,0 +1,25 @@
+# Benchmarks module for persona testing system
+"""
+Benchmark harness for the persona execution pipeline using a local fake LLM.
+"""
+
+from .fake_llm import FakeAgent, FakeLLMConfig, FakeLLMError, RegistroChamadas
+from .cenarios import (
+    CENARIOS,
+    cenario_bateria,
+    cenario_matriz,
+    cenario_otimizacao,
+    comparar_resultados
+)
+
+__all__ = [
+    "FakeAgent",
+    "FakeLLMConfig",
+    "FakeLLMError",
+    "RegistroChamadas",
+    "CENARIOS",
+    "cenario_bateria",
+    "cenario_matriz",
+    "cenario_otimizacao",
+    "comparar_resultados"
+]
@@ -0,0 +1,82 @@
+"""
+Executa os benchmarks do pipeline de personas.
+
+Uso (a partir de backend/):
+    python -m benchmarks
+    python -m benchmarks --cenarios bateria matriz --latencia 0.02 --saida bench.json
+    python -m benchmarks --comparar bench_anterior.json --tolerancia 0.15
+
+O cenário "otimizacao" importa `main`; o banco é substituído, então não é
+preciso definir SUPABASE_URL/SUPABASE_KEY.
+
+Tempo de import (cold start da API e dos workers):
+    python -m benchmarks.import_time --orcamento-ms 800
+"""
+
+import argparse
+import json
+import sys
+
+from benchmarks.cenarios import CENARIOS, comparar_resultados
+from benchmarks.fake_llm import FakeLLMConfig
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmarks do QA Master com LLM falso")
+    parser.add_argument("--cenarios", nargs="+", choices=list(CENARIOS), default=list(CENARIOS))
+    parser.add_argument("--latencia", type=float, default=0.005, help="Latência base por chamada (s)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Variação da latência (s)")
+    parser.add_argument("--tokens-por-segundo", type=float, default=0.0)
+    parser.add_argument("--taxa-erro", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--personas", type=int, default=20, help="Personas na bateria/matriz")
+    parser.add_argument("--prompts", type=int, default=3, help="Prompts na matriz")
+    parser.add_argument("--iteracoes", type=int, default=3, help="Iterações do loop de otimização")
+    parser.add_argument("--max-turnos", type=int, default=10)
+    parser.add_argument("--saida", help="Arquivo JSON para salvar os resultados")
+    parser.add_argument("--comparar", help="Arquivo JSON de referência para detectar regressões")
+    parser.add_argument("--tolerancia", type=float, default=0.2)
+    args = parser.parse_args()
+
+    config = FakeLLMConfig(
+        latencia_base=args.latencia,
+        jitter=args.jitter,
+        tokens_por_segundo=args.tokens_por_segundo,
+        taxa_erro=args.taxa_erro,
+        seed=args.seed,
+    )
+    parametros = {
+        "bateria": {"num_personas": args.personas, "max_turnos": args.max_turnos},
+        "matriz": {"num_prompts": args.prompts, "num_personas": args.personas, "max_turnos": args.max_turnos},
+        "otimizacao": {"iteracoes": args.iteracoes, "max_turnos": args.max_turnos},
+    }
+
+    resultados = []
+    for nome in args.cenarios:
+        resultado = CENARIOS[nome](config=config, **parametros[nome])
+        resultados.append(resultado)
+        print(
+            f"{nome:<12} tempo={resultado['tempo_total_s']:.3f}s "
+            f"chamadas={resultado['chamadas']} ({resultado['chamadas_por_segundo']}/s) "
+            f"p50={resultado['latencia_turno_p50_ms']}ms p95={resultado['latencia_turno_p95_ms']}ms "
+            f"pico_mem={resultado['pico_memoria_mb']}MB"
+        )
+
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            json.dump(resultados, f, indent=2, ensure_ascii=False)
+
+    if args.comparar:
+        with open(args.comparar, "r", encoding="utf-8") as f:
+            referencia = json.load(f)
+        regressoes = comparar_resultados(resultados, referencia, args.tolerancia)
+        for regressao in regressoes:
+            print(f"REGRESSÃO: {regressao}")
+        if regressoes:
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
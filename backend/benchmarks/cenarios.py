@@ -0,0 +1,233 @@
+"""
+Cenários de benchmark do pipeline de personas.
+
+Cada cenário roda o código real (`executar_bateria_com_analise_juiz`,
+`executar_matriz_testes`, `run_optimization_stream`) com os agentes
+substituídos por `FakeAgent`, e mede:
+- Tempo total (wall time)
+- Latência por chamada ao LLM (p50/p95), do início ao fim de cada chamada
+- Chamadas ao LLM por segundo
+- Pico de memória (tracemalloc)
+"""
+
+import asyncio
+import os
+import time
+import tracemalloc
+from contextlib import ExitStack, contextmanager
+from typing import Callable, Optional
+from unittest import mock
+
+from benchmarks.fake_llm import FakeAgent, FakeLLMConfig, RegistroChamadas
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROMPT_BENCHMARK = os.path.join(BASE_DIR, "prompts_teste", "sofia_teste_001_qualificacao.md")
+
+
+def _percentil(valores: list[float], p: float) -> float:
+    """Percentil por interpolação linear (valores já ordenados)."""
+    if not valores:
+        return 0.0
+    k = (len(valores) - 1) * p
+    baixo = int(k)
+    alto = min(baixo + 1, len(valores) - 1)
+    return valores[baixo] + (valores[alto] - valores[baixo]) * (k - baixo)
+
+
+def _medir(nome: str, parametros: dict, registro: RegistroChamadas, executar: Callable[[], object]) -> dict:
+    """Executa `executar` medindo tempo, memória e latências registradas."""
+    registro.limpar()
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    try:
+        executar()
+    finally:
+        tempo_total = time.perf_counter() - inicio
+        _, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    # Duração de cada chamada (fim - início): com chamadas em paralelo, o
+    # intervalo entre conclusões mede a concorrência, não a latência
+    latencias = sorted((c["fim"] - c["inicio"]) * 1000 for c in registro.chamadas)
+    total_chamadas = len(registro.chamadas)
+
+    return {
+        "cenario": nome,
+        "parametros": parametros,
+        "tempo_total_s": round(tempo_total, 4),
+        "chamadas": total_chamadas,
+        "erros": sum(1 for c in registro.chamadas if c["erro"]),
+        "chamadas_por_segundo": round(total_chamadas / tempo_total, 2) if tempo_total else 0.0,
+        "latencia_turno_p50_ms": round(_percentil(latencias, 0.50), 3),
+        "latencia_turno_p95_ms": round(_percentil(latencias, 0.95), 3),
+        "pico_memoria_mb": round(pico / (1024 * 1024), 3),
+    }
+
+
+@contextmanager
+def _testador_falso(config: FakeLLMConfig, registro: RegistroChamadas):
+    """
+    Substitui o Agent criado dentro do executor pelo FakeAgent testador.
+
+    O modelo também é substituído: `criar_modelo` importaria o SDK da OpenAI
+    (carregado só no primeiro uso) dentro da medição.
+    """
+    with mock.patch(
+        "tests.test_executor.novo_agente",
+        new=lambda **kwargs: FakeAgent("testador", config, registro),
+    ), mock.patch("tests.test_executor.criar_modelo", new=lambda *args, **kwargs: None):
+        yield
+
+
+def cenario_bateria(
+    num_personas: int = 20,
+    max_turnos: int = 10,
+    config: Optional[FakeLLMConfig] = None
+) -> dict:
+    """Bateria 1 prompt x N personas com análise do juiz."""
+    from tests.test_executor import executar_bateria_com_analise_juiz
+
+    config = config or FakeLLMConfig()
+    registro = RegistroChamadas()
+    alvo = FakeAgent("alvo", config, registro)
+    juiz = FakeAgent("juiz", config, registro, saida_estruturada=False)
+
+    def executar():
+        with _testador_falso(config, registro):
+            executar_bateria_com_analise_juiz(
+                prompt_teste=PROMPT_BENCHMARK,
+                num_personas=num_personas,
+                agente_alvo=alvo,
+                agente_juiz=juiz,
+                max_turnos=max_turnos,
+                modo_selecao="sequencial",
+                is_file_path=True,
+            )
+
+    parametros = {"num_personas": num_personas, "max_turnos": max_turnos, **config.__dict__}
+    return _medir("bateria", parametros, registro, executar)
+
+
+def cenario_matriz(
+    num_prompts: int = 3,
+    num_personas: int = 5,
+    max_turnos: int = 10,
+    config: Optional[FakeLLMConfig] = None
+) -> dict:
+    """Matriz N prompts x M personas."""
+    from tests.test_executor import executar_matriz_testes, selecionar_personas
+
+    config = config or FakeLLMConfig()
+    registro = RegistroChamadas()
+    alvo = FakeAgent("alvo", config, registro)
+    personas = selecionar_personas(num_personas, modo="sequencial")
+
+    def executar():
+        with _testador_falso(config, registro):
+            executar_matriz_testes(
+                [PROMPT_BENCHMARK] * num_prompts,
+                personas,
+                alvo,
+                max_turnos=max_turnos,
+            )
+
+    parametros = {"num_prompts": num_prompts, "num_personas": num_personas, "max_turnos": max_turnos, **config.__dict__}
+    return _medir("matriz", parametros, registro, executar)
+
+
+def cenario_otimizacao(
+    iteracoes: int = 3,
+    max_turnos: int = 5,
+    config: Optional[FakeLLMConfig] = None
+) -> dict:
+    """
+    Loop de otimização (`run_optimization_stream`) com K iterações.
+
+    O juiz falso devolve scores abaixo do alvo até a K-ésima iteração,
+    quando o alvo é atingido e o loop termina.
+    """
+    import main
+
+    config = config or FakeLLMConfig()
+    registro = RegistroChamadas()
+    scores = [50 + i for i in range(iteracoes - 1)] + [95]
+    juiz = FakeAgent("juiz", config, registro, scores_juiz=scores)
+    colecao = {
+        "id": "bench",
+        "openai_api_key": "sk-fake",
+        "base_subject_instruction": "Você é a Sofia, SDR.",
+        "base_evaluator_instruction": "Teste a Sofia.",
+        "max_turns": max_turnos,
+        "subject_model": "fake-llm",
+    }
+    contador_runs = iter(range(1, 10_000))
+
+    async def consumir(resposta):
+        async for _ in resposta.body_iterator:
+            pass
+
+    def executar():
+        with ExitStack() as stack:
+            patches = {
+                "main.get_collection_by_id": lambda _id: colecao,
+                "main.get_collection_runs": lambda _id: [],
+                "main.create_test_run": lambda data: {"id": f"run-{next(contador_runs)}"},
+                "main.update_test_run": lambda run_id, updates: {"id": run_id, **updates},
+                "main.create_subject_agent": lambda *a, **k: FakeAgent("alvo", config, registro),
+                "main.create_evaluator_agent": lambda *a, **k: FakeAgent("avaliador", config, registro),
+                "main.create_judge_agent": lambda *a, **k: juiz,
+                "main.create_optimizer_agent": lambda *a, **k: FakeAgent("otimizador", config, registro),
+                "optimizer.create_verifier_agent": lambda *a, **k: FakeAgent("verificador", config, registro),
+            }
+            for alvo, substituto in patches.items():
+                stack.enter_context(mock.patch(alvo, new=substituto))
+            stack.enter_context(mock.patch.dict(os.environ))
+            resposta = asyncio.run(main.run_optimization_stream("bench"))
+            asyncio.run(consumir(resposta))
+
+    parametros = {"iteracoes": iteracoes, "max_turnos": max_turnos, **config.__dict__}
+    return _medir("otimizacao", parametros, registro, executar)
+
+
+CENARIOS = {
+    "bateria": cenario_bateria,
+    "matriz": cenario_matriz,
+    "otimizacao": cenario_otimizacao,
+}
+
+# Métricas em que valor maior é pior (as demais, maior é melhor)
+METRICAS_MENOR_MELHOR = ("tempo_total_s", "latencia_turno_p50_ms", "latencia_turno_p95_ms", "pico_memoria_mb")
+METRICAS_MAIOR_MELHOR = ("chamadas_por_segundo",)
+
+
+def comparar_resultados(atual: list[dict], referencia: list[dict], tolerancia: float = 0.2) -> list[str]:
+    """
+    Compara resultados com uma execução de referência e lista as regressões.
+
+    Args:
+        atual: Resultados desta execução
+        referencia: Resultados salvos anteriormente (mesmo formato)
+        tolerancia: Piora relativa aceita (0.2 = 20%)
+
+    Returns:
+        Lista de mensagens descrevendo cada regressão (vazia se nenhuma)
+    """
+    por_cenario = {r["cenario"]: r for r in referencia}
+    regressoes = []
+
+    for resultado in atual:
+        base = por_cenario.get(resultado["cenario"])
+        if base is None:
+            continue
+        for metrica in METRICAS_MENOR_MELHOR + METRICAS_MAIOR_MELHOR:
+            antes, depois = base.get(metrica), resultado.get(metrica)
+            if not antes or depois is None:
+                continue
+            variacao = (depois - antes) / antes
+            if metrica in METRICAS_MAIOR_MELHOR:
+                variacao = -variacao
+            if variacao > tolerancia:
+                regressoes.append(
+                    f"{resultado['cenario']}.{metrica}: {antes} -> {depois} ({variacao:+.1%} pior)"
+                )
+    return regressoes
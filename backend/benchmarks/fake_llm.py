@@ -0,0 +1,200 @@
+"""
+Fake LLM - Agente local e determinístico para benchmarks sem custo de API.
+
+O `FakeAgent` imita a interface usada pelo pipeline (`agent.run(msg)` retornando
+um objeto com `.content` e `.metrics`), com:
+- Latência configurável (base + jitter + taxa de geração de tokens)
+- Injeção de erros com probabilidade configurável
+- Saída determinística por seed
+- Papel "juiz" que devolve uma avaliação válida de `models.EvaluationResult`
+"""
+
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+from models import EvaluationResult
+
+
+class FakeLLMError(RuntimeError):
+    """Erro injetado propositalmente pelo FakeAgent."""
+
+
+@dataclass
+class FakeLLMConfig:
+    """
+    Parâmetros de comportamento do modelo falso.
+
+    Attributes:
+        latencia_base: Segundos fixos por chamada (tempo até o primeiro token)
+        jitter: Variação máxima (+/-) em segundos sobre a latência base
+        tokens_por_segundo: Taxa de geração; 0 desativa o custo por token
+        tokens_resposta: Tokens de saída por resposta
+        taxa_erro: Probabilidade (0-1) de uma chamada levantar FakeLLMError
+        turnos_ate_fim: Após quantas respostas o testador envia "[FIM]" (0 = nunca)
+        seed: Semente para respostas e latências reproduzíveis
+    """
+    latencia_base: float = 0.005
+    jitter: float = 0.0
+    tokens_por_segundo: float = 0.0
+    tokens_resposta: int = 60
+    taxa_erro: float = 0.0
+    turnos_ate_fim: int = 0
+    seed: int = 42
+
+
+@dataclass
+class FakeMetrics:
+    """Métricas no mesmo formato do `RunOutput.metrics` do Agno."""
+    input_tokens: int = 0
+    output_tokens: int = 0
+    total_tokens: int = 0
+    cache_read_tokens: int = 0
+
+
+@dataclass
+class FakeRunOutput:
+    """Resposta de `FakeAgent.run` (compatível com `RunOutput` do Agno)."""
+    content: object
+    metrics: FakeMetrics = field(default_factory=FakeMetrics)
+    model: str = "fake-llm"
+
+
+class RegistroChamadas:
+    """
+    Registro thread-safe do início e da conclusão de cada chamada.
+
+    Usado pelos cenários para calcular latência por turno e chamadas/segundo.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.chamadas: list[dict] = []
+
+    def registrar(self, papel: str, inicio: float, fim: float, erro: bool) -> None:
+        with self._lock:
+            self.chamadas.append({"papel": papel, "inicio": inicio, "fim": fim, "erro": erro})
+
+    def limpar(self) -> None:
+        with self._lock:
+            self.chamadas.clear()
+
+
+def _estimar_tokens(texto: str) -> int:
+    return max(1, len(texto) // 4)
+
+
+def avaliacao_fake(score: int, test_id: str = "N/A") -> EvaluationResult:
+    """Monta uma avaliação válida com todos os scores iguais a `score`."""
+    resultado = "APROVADO" if score >= 70 else "REPROVADO"
+    return EvaluationResult.model_validate({
+        "test_id": test_id,
+        "test_scenario": "benchmark",
+        "scores": {
+            "compliance": score,
+            "eficacia": score,
+            "eficiencia": score,
+            "qualidade_comunicacao": score,
+            "experiencia_usuario": score,
+            "score_geral": score,
+        },
+        "analise": {
+            "compliance": {"score": score, "comentario": "ok"},
+            "eficacia": {"score": score, "objetivo_atingido": score >= 70, "comentario": "ok"},
+            "eficiencia": {"score": score, "comentario": "ok"},
+            "qualidade_comunicacao": {
+                "score": score, "tom": "apropriado", "clareza": "alta",
+                "naturalidade": "natural", "formatacao": "adequada", "comentario": "ok"
+            },
+            "experiencia_usuario": {"score": score, "sentimento_usuario": "neutro", "comentario": "ok"},
+        },
+        "resumo": {
+            "resultado": resultado,
+            "pontos_fortes": ["Cordialidade no atendimento"],
+            "pontos_fracos": ["Demora para coletar dados"],
+            "recomendacoes": ["Pedir nome e telefone mais cedo"],
+        },
+        "status_final": {"aprovado": score >= 70, "pronto_para_producao": score >= 90},
+    })
+
+
+class FakeAgent:
+    """
+    Agente falso com a mesma interface de `agno.agent.Agent.run`.
+
+    Args:
+        papel: "testador", "alvo", "avaliador", "juiz" ou "otimizador"
+        config: Comportamento de latência/erros (FakeLLMConfig)
+        registro: Registro compartilhado de chamadas (opcional)
+        scores_juiz: Sequência de scores devolvidos pelo juiz (o último se repete)
+        saida_estruturada: Se True o juiz devolve EvaluationResult; se False, JSON em texto
+
+    Example:
+        >>> alvo = FakeAgent("alvo", FakeLLMConfig(latencia_base=0.01))
+        >>> alvo.run("oi").content
+        'Resposta 1 do alvo ...'
+    """
+
+    def __init__(
+        self,
+        papel: str,
+        config: Optional[FakeLLMConfig] = None,
+        registro: Optional[RegistroChamadas] = None,
+        scores_juiz: Optional[list[int]] = None,
+        saida_estruturada: bool = True,
+        **_ignorados
+    ):
+        self.papel = papel
+        self.config = config or FakeLLMConfig()
+        self.registro = registro
+        self.scores_juiz = scores_juiz or [75]
+        self.saida_estruturada = saida_estruturada
+        self._rng = random.Random(f"{self.config.seed}:{papel}")
+        self._lock = threading.Lock()
+        self._chamadas = 0
+
+    def _latencia(self) -> float:
+        latencia = self.config.latencia_base
+        if self.config.jitter:
+            latencia += self._rng.uniform(-self.config.jitter, self.config.jitter)
+        if self.config.tokens_por_segundo:
+            latencia += self.config.tokens_resposta / self.config.tokens_por_segundo
+        return max(0.0, latencia)
+
+    def _conteudo(self, n: int, mensagem: str) -> object:
+        if self.papel == "juiz":
+            score = self.scores_juiz[min(n - 1, len(self.scores_juiz) - 1)]
+            avaliacao = avaliacao_fake(score)
+            return avaliacao if self.saida_estruturada else avaliacao.model_dump_json()
+        if self.papel in ("otimizador", "verificador"):
+            return f"{mensagem[:200]}\n- Regra adicional {n}"
+        if self.papel in ("testador", "avaliador") and self.config.turnos_ate_fim and n >= self.config.turnos_ate_fim:
+            return "ok, obrigado! [FIM]"
+        palavras = " ".join(f"palavra{self._rng.randint(0, 999)}" for _ in range(self.config.tokens_resposta // 4))
+        return f"Resposta {n} do {self.papel} {palavras}"
+
+    def run(self, mensagem: str, **_kwargs) -> FakeRunOutput:
+        inicio = time.perf_counter()
+        with self._lock:
+            self._chamadas += 1
+            n = self._chamadas
+            latencia = self._latencia()
+            falhar = self.config.taxa_erro and self._rng.random() < self.config.taxa_erro
+            conteudo = None if falhar else self._conteudo(n, mensagem)
+
+        time.sleep(latencia)
+
+        if self.registro is not None:
+            self.registro.registrar(self.papel, inicio, time.perf_counter(), bool(falhar))
+        if falhar:
+            raise FakeLLMError(f"Erro injetado na chamada {n} do {self.papel}")
+
+        saida = conteudo if isinstance(conteudo, str) else str(conteudo)
+        metrics = FakeMetrics(
+            input_tokens=_estimar_tokens(mensagem),
+            output_tokens=_estimar_tokens(saida),
+        )
+        metrics.total_tokens = metrics.input_tokens + metrics.output_tokens
+        return FakeRunOutput(content=conteudo, metrics=metrics)
@@ -0,0 +1,95 @@
+"""
+Mede o tempo de import (cold start) da API e dos workers com `python -X importtime`.
+
+Cada módulo é importado em um interpretador novo, sem SUPABASE_URL/SUPABASE_KEY
+nem OPENAI_API_KEY: o import não pode depender delas. Falha (código 1) se o
+tempo passar do orçamento ou se algum módulo pesado (Agno, OpenAI, Supabase)
+for importado já no import, em vez de no primeiro uso.
+
+Uso (a partir de backend/):
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time --modulos main workers --orcamento-ms 800 --top 15
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+from typing import Sequence
+
+DIRETORIO_BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+VARIAVEIS_REMOVIDAS = ("SUPABASE_URL", "SUPABASE_KEY", "OPENAI_API_KEY")
+MODULOS_PROIBIDOS = ("agno", "openai", "supabase")
+
+# "import time: self [us] | cumulative | imported package"
+_LINHA = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$")
+
+
+def medir_import(modulo: str) -> dict:
+    """
+    Importa `modulo` em um subprocesso com -X importtime.
+
+    Returns:
+        {"modulo", "total_ms", "modulos": [(nome, self_ms, acumulado_ms), ...]}
+
+    Raises:
+        RuntimeError: Se o import falhar
+    """
+    env = {k: v for k, v in os.environ.items() if k not in VARIAVEIS_REMOVIDAS}
+    processo = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {modulo}"],
+        cwd=DIRETORIO_BACKEND, env=env, capture_output=True, text=True
+    )
+    if processo.returncode != 0:
+        raise RuntimeError(f"import {modulo} falhou:\n{processo.stderr[-2000:]}")
+
+    modulos = []
+    total_us = 0
+    for linha in processo.stderr.splitlines():
+        m = _LINHA.match(linha)
+        if not m:
+            continue
+        self_us, acumulado_us, indentacao, nome = int(m[1]), int(m[2]), m[3], m[4]
+        modulos.append((nome, self_us / 1000, acumulado_us / 1000))
+        if not indentacao:
+            # Só imports de primeiro nível: os aninhados já estão no acumulado
+            total_us += acumulado_us
+    return {"modulo": modulo, "total_ms": total_us / 1000, "modulos": modulos}
+
+
+def modulos_proibidos(medicao: dict, proibidos: Sequence[str] = MODULOS_PROIBIDOS) -> list[str]:
+    """Pacotes de `proibidos` carregados pelo import (só o pacote raiz de cada um)."""
+    carregados = {nome.split(".")[0] for nome, _, _ in medicao["modulos"]}
+    return [p for p in proibidos if p in carregados]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Tempo de import da API e dos workers")
+    parser.add_argument("--modulos", nargs="+", default=["main", "workers.jobs"])
+    parser.add_argument("--repeticoes", type=int, default=3, help="Mede N vezes e usa a menor")
+    parser.add_argument("--orcamento-ms", type=float, default=1000.0, help="Tempo máximo por módulo")
+    parser.add_argument("--top", type=int, default=10, help="Módulos mais pesados exibidos")
+    parser.add_argument("--proibidos", nargs="*", default=list(MODULOS_PROIBIDOS),
+                        help="Pacotes que não podem ser importados no import")
+    args = parser.parse_args()
+
+    falhas = []
+    for modulo in args.modulos:
+        medicao = min((medir_import(modulo) for _ in range(args.repeticoes)), key=lambda m: m["total_ms"])
+        print(f"{modulo:<14} {medicao['total_ms']:.1f}ms (orçamento {args.orcamento_ms:.0f}ms)")
+        for nome, self_ms, acumulado_ms in sorted(medicao["modulos"], key=lambda m: m[1], reverse=True)[:args.top]:
+            print(f"    {self_ms:8.1f}ms self {acumulado_ms:9.1f}ms acumulado  {nome}")
+
+        if medicao["total_ms"] > args.orcamento_ms:
+            falhas.append(f"{modulo}: {medicao['total_ms']:.1f}ms > {args.orcamento_ms:.0f}ms")
+        for pacote in modulos_proibidos(medicao, args.proibidos):
+            falhas.append(f"{modulo}: importa {pacote} no import (deveria ser no primeiro uso)")
+
+    for falha in falhas:
+        print(f"REGRESSÃO: {falha}")
+    return 1 if falhas else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
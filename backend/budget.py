@@ -0,0 +1,110 @@
+"""
+Budget - Limites de tokens, custo e tempo por execução de coleção.
+
+O loop de otimização consulta o `BudgetTracker` antes de cada chamada aos
+agentes. Quando algum limite é atingido o loop para de forma controlada,
+devolvendo o melhor prompt encontrado até então.
+"""
+
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+from telemetry import LLMTracer
+
+
+@dataclass
+class RunBudget:
+    """
+    Limites de uma execução. Campos None não são aplicados.
+
+    Attributes:
+        max_tokens: Total de tokens (entrada + saída) de todas as chamadas
+        max_cost_usd: Custo estimado total em USD
+        max_wall_seconds: Duração máxima da execução em segundos
+    """
+    max_tokens: Optional[int] = None
+    max_cost_usd: Optional[float] = None
+    max_wall_seconds: Optional[float] = None
+
+    @classmethod
+    def from_collection(cls, collection: dict[str, Any]) -> "RunBudget":
+        """Lê os limites das colunas opcionais da coleção."""
+        return cls(
+            max_tokens=collection.get("max_tokens"),
+            max_cost_usd=collection.get("max_cost_usd"),
+            max_wall_seconds=collection.get("max_wall_seconds"),
+        )
+
+    @property
+    def ilimitado(self) -> bool:
+        return self.max_tokens is None and self.max_cost_usd is None and self.max_wall_seconds is None
+
+
+class BudgetTracker:
+    """
+    Acompanha o consumo de uma execução somando os tracers de cada iteração.
+
+    Args:
+        budget: Limites a aplicar
+        relogio: Função de tempo monotônico (substituível em benchmarks)
+
+    Example:
+        >>> tracker = BudgetTracker(RunBudget(max_tokens=50_000))
+        >>> tracker.acompanhar(tracer)
+        >>> if tracker.esgotado():
+        ...     parar()
+    """
+
+    def __init__(self, budget: RunBudget, relogio: Callable[[], float] = time.monotonic):
+        self.budget = budget
+        self._relogio = relogio
+        self._inicio = relogio()
+        self._tracers: list[LLMTracer] = []
+
+    def acompanhar(self, tracer: LLMTracer) -> None:
+        """Passa a contabilizar as chamadas registradas por `tracer`."""
+        self._tracers.append(tracer)
+
+    def consumo(self) -> dict:
+        """Tokens, custo e segundos consumidos até agora."""
+        tokens = 0
+        custo = 0.0
+        for tracer in self._tracers:
+            for call in tracer.calls:
+                tokens += call.total_tokens
+                custo += call.cost_usd
+        return {
+            "tokens": tokens,
+            "cost_usd": round(custo, 6),
+            "wall_seconds": round(self._relogio() - self._inicio, 2),
+        }
+
+    def status(self) -> dict:
+        """
+        Consumo, saldo restante e motivo de esgotamento (se houver).
+
+        Returns:
+            {"usado": {...}, "restante": {...}, "esgotado": str | None}
+        """
+        usado = self.consumo()
+        limites = {
+            "tokens": self.budget.max_tokens,
+            "cost_usd": self.budget.max_cost_usd,
+            "wall_seconds": self.budget.max_wall_seconds,
+        }
+        restante = {
+            chave: (None if limite is None else round(max(0, limite - usado[chave]), 6))
+            for chave, limite in limites.items()
+        }
+        esgotado = next(
+            (chave for chave, limite in limites.items() if limite is not None and usado[chave] >= limite),
+            None,
+        )
+        return {"usado": usado, "restante": restante, "esgotado": esgotado}
+
+    def esgotado(self) -> Optional[str]:
+        """Retorna o limite atingido ("tokens", "cost_usd", "wall_seconds") ou None."""
+        if self.budget.ilimitado:
+            return None
+        return self.status()["esgotado"]
@@ -0,0 +1,368 @@
+"""
+Conversation - Motor único do loop de turnos entre testador e agente testado.
+
+O loop de otimização (`main.run_optimization_stream`) e o executor de personas
+(`tests.test_executor.executar_teste_com_persona`) rodam o mesmo
+`ConversationRunner`: alternância de papéis, janela de contexto, chamadas via
+`LLMTracer` e medição de cada turno ficam aqui. O que muda entre os dois vem
+por hooks (`ConversationHook`):
+
+- fim de conversa: `fim()` (ex: padrões de despedida das personas)
+- orçamento/interrupção: `antes_da_chamada()` (ex: `LimiteOrcamento`)
+- persistência e streaming: `ao_turno()` (ex: enviar o evento SSE, gravar a mensagem)
+- retries e recuperação: `repetir()` (ex: `RepetirChamada`) e `recuperar()`
+
+Os papéis das chamadas são sempre "evaluator" (testador, abre a conversa) e
+"subject" (agente testado); o formato das mensagens da transcrição (rótulos de
+papel, campos extras) é do chamador.
+"""
+
+import asyncio
+import concurrent.futures
+import contextvars
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Optional, Sequence
+
+from budget import BudgetTracker
+from core.context_window import ContextWindow
+from logs import atualizar_contexto
+from telemetry import LLMTracer
+
+logger = logging.getLogger(__name__)
+
+TESTADOR = "evaluator"
+ALVO = "subject"
+ROTULOS_PADRAO = {TESTADOR: "evaluator", ALVO: "subject"}
+
+# Motivos de término (EstadoConversa.motivo)
+FIM_NATURAL = "fim_natural"
+LIMITE = "limite"
+INTERROMPIDA = "interrompida"
+ERRO = "erro"
+
+
+@dataclass
+class Turno:
+    """
+    Uma mensagem da conversa.
+
+    Attributes:
+        indice: Posição na conversa (1 = abertura do testador)
+        papel: TESTADOR ou ALVO
+        conteudo: Texto da resposta (ou o conteúdo de recuperação)
+        inicio: Momento em que a chamada começou
+        duracao_ms: Tempo da chamada ao agente, incluindo retries
+        tentativas: Chamadas feitas até a resposta
+        recuperado: True se o conteúdo veio de `recuperar()` após um erro
+        mensagem: Entrada correspondente na transcrição
+    """
+    indice: int
+    papel: str
+    conteudo: str
+    inicio: datetime
+    duracao_ms: float
+    tentativas: int = 1
+    recuperado: bool = False
+    mensagem: dict = field(default_factory=dict)
+
+
+@dataclass
+class EstadoConversa:
+    """
+    Estado (e, ao final, resultado) de uma conversa.
+
+    Attributes:
+        turnos: Turnos na ordem
+        transcricao: Mensagens no formato do chamador (uma por turno)
+        motivo: FIM_NATURAL, LIMITE, INTERROMPIDA ou ERRO (None enquanto roda)
+        interrupcao: Motivo devolvido por `antes_da_chamada()` (ex: "max_tokens")
+        erro: Exceção que encerrou a conversa (motivo ERRO)
+    """
+    turnos: list[Turno] = field(default_factory=list)
+    transcricao: list[dict] = field(default_factory=list)
+    motivo: Optional[str] = None
+    interrupcao: Optional[str] = None
+    erro: Optional[BaseException] = None
+    inicio: datetime = field(default_factory=datetime.now)
+    fim: Optional[datetime] = None
+
+    @property
+    def finalizado_naturalmente(self) -> bool:
+        return self.motivo == FIM_NATURAL
+
+    @property
+    def duracao_segundos(self) -> float:
+        return ((self.fim or datetime.now()) - self.inicio).total_seconds()
+
+    def resumo_tempos(self) -> dict:
+        """
+        Latência das chamadas por papel.
+
+        Turnos recuperados (conteúdo de `recuperar()`) ficam de fora: a duração
+        deles é a da chamada que falhou, não a de uma resposta.
+
+        Returns:
+            {"evaluator": {"turnos", "total_ms", "media_ms", "p50_ms", "p95_ms", "max_ms"},
+             "subject": {...}, "retries": chamadas repetidas, "recuperados": turnos recuperados}
+        """
+        resumo: dict[str, Any] = {}
+        for papel in (TESTADOR, ALVO):
+            duracoes = sorted(t.duracao_ms for t in self.turnos if t.papel == papel and not t.recuperado)
+            if not duracoes:
+                continue
+            n = len(duracoes)
+            resumo[papel] = {
+                "turnos": n,
+                "total_ms": round(sum(duracoes), 2),
+                "media_ms": round(sum(duracoes) / n, 2),
+                "p50_ms": round(duracoes[(n - 1) // 2], 2),
+                "p95_ms": round(duracoes[min(n - 1, int(0.95 * n))], 2),
+                "max_ms": round(duracoes[-1], 2),
+            }
+        resumo["retries"] = sum(t.tentativas - 1 for t in self.turnos)
+        resumo["recuperados"] = sum(1 for t in self.turnos if t.recuperado)
+        return resumo
+
+
+class ConversationHook:
+    """
+    Pontos de extensão do `ConversationRunner` (todos opcionais).
+
+    Com vários hooks, `antes_da_chamada`, `repetir` e `recuperar` usam o
+    primeiro resultado não-None; `fim` encerra se qualquer hook pedir;
+    `ao_turno` chama todos, na ordem.
+    """
+
+    async def antes_da_chamada(self, estado: EstadoConversa, papel: str) -> Optional[str]:
+        """Motivo para interromper antes da próxima chamada (None = segue)."""
+        return None
+
+    async def ao_turno(self, estado: EstadoConversa, turno: Turno) -> None:
+        """Turno concluído (já na transcrição): persistir, transmitir, logar."""
+
+    async def fim(self, estado: EstadoConversa) -> bool:
+        """True se a conversa terminou naturalmente após o último turno."""
+        return False
+
+    async def repetir(self, estado: EstadoConversa, papel: str, erro: Exception, tentativa: int) -> Optional[float]:
+        """Segundos de espera antes de repetir a chamada que falhou (None = não repetir)."""
+        return None
+
+    async def recuperar(self, estado: EstadoConversa, papel: str, erro: Exception) -> Optional[str]:
+        """Conteúdo que substitui uma chamada que falhou de vez (None = encerra com ERRO)."""
+        return None
+
+
+class LimiteOrcamento(ConversationHook):
+    """Interrompe a conversa quando o `BudgetTracker` da execução se esgota."""
+
+    def __init__(self, budget: BudgetTracker):
+        self.budget = budget
+
+    async def antes_da_chamada(self, estado: EstadoConversa, papel: str) -> Optional[str]:
+        return self.budget.esgotado()
+
+
+class RepetirChamada(ConversationHook):
+    """
+    Repete chamadas que falharam, com espera exponencial.
+
+    Args:
+        max_tentativas: Total de chamadas por turno (incluindo a primeira)
+        espera: Espera antes da primeira repetição (segundos)
+        fator: Multiplicador da espera a cada nova tentativa
+        erros: Tipos de exceção que justificam repetir
+    """
+
+    def __init__(
+        self,
+        max_tentativas: int = 3,
+        espera: float = 1.0,
+        fator: float = 2.0,
+        erros: tuple[type[BaseException], ...] = (Exception,)
+    ):
+        self.max_tentativas = max_tentativas
+        self.espera = espera
+        self.fator = fator
+        self.erros = erros
+
+    async def repetir(self, estado: EstadoConversa, papel: str, erro: Exception, tentativa: int) -> Optional[float]:
+        if tentativa >= self.max_tentativas or not isinstance(erro, self.erros):
+            return None
+        return self.espera * self.fator ** (tentativa - 1)
+
+
+def _mensagem_padrao(turno: Turno, rotulo: str) -> dict:
+    return {"role": rotulo, "content": turno.conteudo}
+
+
+class ConversationRunner:
+    """
+    Executa uma conversa testador x agente testado, turno a turno.
+
+    Args:
+        testador: Agente que abre e conduz a conversa (papel "evaluator")
+        alvo: Agente testado (papel "subject")
+        tracer: Registra latência/tokens/custo de cada chamada
+        abertura: Mensagem enviada ao testador para abrir a conversa
+        max_mensagens: Limite de mensagens (testador + alvo)
+        contexto: Janela de contexto que monta as mensagens seguintes
+        hooks: Hooks na ordem de prioridade
+        rotulos: Rótulo de cada papel na transcrição (ex: {"evaluator": "user", ...});
+                 é o que a janela de contexto e a detecção de fim enxergam
+        formatar_mensagem: (turno, rotulo) -> mensagem da transcrição
+        rotulos_tracer: Rótulos extras de cada chamada no tracer (persona_id, test_id...)
+        em_thread: Chamadas em asyncio.to_thread (True no event loop da API; False
+                   quando o runner roda sozinho em `executar_sincrono`)
+        propagar_erros: Relança o erro de uma chamada não recuperada (senão
+                        encerra com motivo ERRO)
+
+    Example:
+        >>> runner = ConversationRunner(testador, alvo, tracer, abertura="Inicie a conversa.",
+        ...                             max_mensagens=20, hooks=[LimiteOrcamento(budget)])
+        >>> estado = await runner.executar()
+        >>> estado.motivo, estado.resumo_tempos()["subject"]["p95_ms"]
+        ('limite', 812.4)
+    """
+
+    def __init__(
+        self,
+        testador: Any,
+        alvo: Any,
+        tracer: LLMTracer,
+        abertura: str,
+        max_mensagens: int,
+        contexto: Optional[ContextWindow] = None,
+        hooks: Sequence[ConversationHook] = (),
+        rotulos: Optional[dict[str, str]] = None,
+        formatar_mensagem: Callable[[Turno, str], dict] = _mensagem_padrao,
+        rotulos_tracer: Optional[dict] = None,
+        em_thread: bool = True,
+        propagar_erros: bool = True
+    ):
+        self.agentes = {TESTADOR: testador, ALVO: alvo}
+        self.tracer = tracer
+        self.abertura = abertura
+        self.max_mensagens = max_mensagens
+        self.contexto = contexto or ContextWindow()
+        self.hooks = list(hooks)
+        self.rotulos = rotulos or ROTULOS_PADRAO
+        self.formatar_mensagem = formatar_mensagem
+        self.rotulos_tracer = rotulos_tracer or {}
+        self.em_thread = em_thread
+        self.propagar_erros = propagar_erros
+
+    async def _chamar_agente(self, papel: str, mensagem: str) -> Any:
+        if self.em_thread:
+            return await asyncio.to_thread(
+                self.tracer.run, self.agentes[papel], mensagem, role=papel, **self.rotulos_tracer
+            )
+        return self.tracer.run(self.agentes[papel], mensagem, role=papel, **self.rotulos_tracer)
+
+    async def _primeiro(self, metodo: str, *args) -> Any:
+        for hook in self.hooks:
+            resultado = await getattr(hook, metodo)(*args)
+            if resultado is not None:
+                return resultado
+        return None
+
+    async def _turno(self, estado: EstadoConversa, papel: str, mensagem: str) -> Optional[Turno]:
+        """Chama o agente (com retries/recuperação); None se a conversa deve parar."""
+        inicio = datetime.now()
+        t0 = time.perf_counter()
+        tentativa = 0
+        recuperado = False
+        while True:
+            tentativa += 1
+            try:
+                resposta = await self._chamar_agente(papel, mensagem)
+                conteudo = resposta.content if hasattr(resposta, "content") else str(resposta)
+                break
+            except Exception as e:
+                espera = await self._primeiro("repetir", estado, papel, e, tentativa)
+                if espera is not None:
+                    logger.warning("Chamada do %s falhou (%s); tentativa %d em %.1fs", papel, e, tentativa + 1, espera)
+                    if espera > 0:
+                        await asyncio.sleep(espera)
+                    continue
+                conteudo = await self._primeiro("recuperar", estado, papel, e)
+                if conteudo is None:
+                    estado.motivo, estado.erro = ERRO, e
+                    if self.propagar_erros:
+                        raise
+                    logger.error("Erro no %s: %s", papel, e)
+                    return None
+                logger.error("Erro no %s: %s (usando conteúdo de recuperação)", papel, e)
+                recuperado = True
+                break
+        return Turno(
+            indice=len(estado.turnos) + 1,
+            papel=papel,
+            conteudo=conteudo,
+            inicio=inicio,
+            duracao_ms=(time.perf_counter() - t0) * 1000,
+            tentativas=tentativa,
+            recuperado=recuperado,
+        )
+
+    async def executar(self) -> EstadoConversa:
+        """
+        Roda a conversa até o fim natural, o limite de mensagens, uma interrupção
+        ou um erro não recuperado.
+
+        Raises:
+            A exceção da chamada, se `propagar_erros` e nenhum hook recuperar
+        """
+        estado = EstadoConversa()
+        papel = TESTADOR
+        ultima = None
+        try:
+            while len(estado.turnos) < self.max_mensagens:
+                interrupcao = await self._primeiro("antes_da_chamada", estado, papel)
+                if interrupcao:
+                    estado.motivo, estado.interrupcao = INTERROMPIDA, interrupcao
+                    break
+
+                atualizar_contexto(turno=len(estado.turnos) + 1)
+                mensagem = (
+                    self.abertura if not estado.turnos
+                    else self.contexto.mensagem_para(estado.transcricao[:-1], ultima)
+                )
+                turno = await self._turno(estado, papel, mensagem)
+                if turno is None:
+                    break
+                turno.mensagem = self.formatar_mensagem(turno, self.rotulos[papel])
+                estado.turnos.append(turno)
+                estado.transcricao.append(turno.mensagem)
+                for hook in self.hooks:
+                    await hook.ao_turno(estado, turno)
+
+                if any([await hook.fim(estado) for hook in self.hooks]):
+                    estado.motivo = FIM_NATURAL
+                    break
+                ultima = turno.conteudo
+                papel = ALVO if papel == TESTADOR else TESTADOR
+            else:
+                estado.motivo = LIMITE
+        finally:
+            estado.fim = datetime.now()
+        return estado
+
+    def executar_sincrono(self) -> EstadoConversa:
+        """
+        `executar()` em um event loop próprio (threads de bateria, matriz e workers).
+
+        Chamado de dentro de um event loop em execução (código async, notebooks),
+        onde `asyncio.run` falharia, a conversa roda em uma thread auxiliar com
+        um loop novo e a chamada bloqueia até o fim, como nas demais threads.
+        """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(self.executar())
+        contexto = contextvars.copy_context()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="conversa") as executor:
+            return executor.submit(contexto.run, asyncio.run, self.executar()).result()
@@ -4,5 +4,11 @@ Core module containing persona loading and injection functionality.
 """
 
 from .persona_injector import PersonaInjector
+from .context_window import ContextWindow, contar_tokens
+from .client_data import PoolDadosCliente, configurar_pool
+from .persona_catalog import CatalogoPersonas, abrir_catalogo
+from .persona_features import vetores_personas, selecionar_diversas, cobertura
 
-__all__ = ["PersonaInjector"]
+__all__ = ["PersonaInjector", "ContextWindow", "contar_tokens", "PoolDadosCliente", "configurar_pool",
+           "CatalogoPersonas", "abrir_catalogo",
+           "vetores_personas", "selecionar_diversas", "cobertura"]
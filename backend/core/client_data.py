@@ -0,0 +1,222 @@
+"""
+ClientData - Pool de dados fictícios de clientes brasileiros.
+
+Cada conversa de teste recebe dados de cliente (nome, telefone...). Montar um
+`Faker("pt_BR")` por conversa custa o carregamento dos provedores do locale a
+cada chamada; aqui os registros são gerados UMA vez, em um pool com semente:
+
+- Nome (Faker pt_BR se instalado, senão listas internas), telefone celular com
+  DDD válido, email derivado do nome, CPF com dígitos verificadores válidos e
+  a cidade do DDD
+- Sorteios O(1): `proximo()` percorre o pool em ordem circular e `para(chave)`
+  escolhe um registro fixo por chave (ex: persona), sob um lock
+- Mesma semente = mesmos registros e mesma sequência de sorteios
+"""
+
+import logging
+import os
+import random
+import threading
+import unicodedata
+import zlib
+from typing import Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TAMANHO_POOL = 1024
+# Probabilidade de o registro padrão trazer email (comportamento histórico)
+PROBABILIDADE_EMAIL = 0.3
+CAMPOS_PADRAO = ("nome", "telefone")
+CAMPOS = ("nome", "telefone", "email", "cpf", "cidade")
+
+PRIMEIROS_NOMES = [
+    "João", "Maria", "Pedro", "Ana", "Carlos", "Fernanda", "Lucas", "Juliana",
+    "Rafael", "Camila", "Gustavo", "Larissa", "Bruno", "Amanda", "Diego", "Patrícia",
+    "Thiago", "Vanessa", "Felipe", "Mariana", "José", "Francisca", "Antônio", "Adriana",
+    "Paulo", "Aline", "Marcos", "Bruna", "Luiz", "Beatriz", "Gabriel", "Letícia",
+    "Rodrigo", "Débora", "Eduardo", "Renata", "Leonardo", "Tatiane", "Matheus", "Priscila",
+    "Vinícius", "Sandra", "Ricardo", "Cláudia", "Henrique", "Luana", "Daniel", "Jéssica",
+]
+
+SOBRENOMES = [
+    "Silva", "Santos", "Oliveira", "Souza", "Rodrigues", "Ferreira", "Alves", "Pereira",
+    "Lima", "Gomes", "Costa", "Ribeiro", "Martins", "Carvalho", "Almeida", "Lopes",
+    "Soares", "Fernandes", "Vieira", "Barbosa", "Rocha", "Dias", "Nascimento", "Andrade",
+    "Moreira", "Nunes", "Marques", "Machado", "Mendes", "Freitas", "Cardoso", "Ramos",
+    "Gonçalves", "Santana", "Teixeira", "Araújo", "Castro", "Pinto", "Correia", "Monteiro",
+]
+
+TRATAMENTOS = {"sr", "sra", "srta", "dr", "dra"}
+
+DOMINIOS_EMAIL = ["gmail.com", "hotmail.com", "outlook.com", "yahoo.com.br", "uol.com.br", "bol.com.br"]
+
+# DDDs válidos (Anatel) com uma cidade de referência de cada área
+CIDADES_POR_DDD = {
+    "11": "São Paulo - SP", "12": "São José dos Campos - SP", "13": "Santos - SP",
+    "14": "Bauru - SP", "15": "Sorocaba - SP", "16": "Ribeirão Preto - SP",
+    "17": "São José do Rio Preto - SP", "18": "Presidente Prudente - SP", "19": "Campinas - SP",
+    "21": "Rio de Janeiro - RJ", "22": "Campos dos Goytacazes - RJ", "24": "Volta Redonda - RJ",
+    "27": "Vitória - ES", "28": "Cachoeiro de Itapemirim - ES",
+    "31": "Belo Horizonte - MG", "32": "Juiz de Fora - MG", "33": "Governador Valadares - MG",
+    "34": "Uberlândia - MG", "35": "Poços de Caldas - MG", "37": "Divinópolis - MG",
+    "38": "Montes Claros - MG",
+    "41": "Curitiba - PR", "42": "Ponta Grossa - PR", "43": "Londrina - PR",
+    "44": "Maringá - PR", "45": "Foz do Iguaçu - PR", "46": "Francisco Beltrão - PR",
+    "47": "Joinville - SC", "48": "Florianópolis - SC", "49": "Chapecó - SC",
+    "51": "Porto Alegre - RS", "53": "Pelotas - RS", "54": "Caxias do Sul - RS", "55": "Santa Maria - RS",
+    "61": "Brasília - DF", "62": "Goiânia - GO", "63": "Palmas - TO", "64": "Rio Verde - GO",
+    "65": "Cuiabá - MT", "66": "Rondonópolis - MT", "67": "Campo Grande - MS",
+    "68": "Rio Branco - AC", "69": "Porto Velho - RO",
+    "71": "Salvador - BA", "73": "Ilhéus - BA", "74": "Juazeiro - BA",
+    "75": "Feira de Santana - BA", "77": "Vitória da Conquista - BA", "79": "Aracaju - SE",
+    "81": "Recife - PE", "82": "Maceió - AL", "83": "João Pessoa - PB", "84": "Natal - RN",
+    "85": "Fortaleza - CE", "86": "Teresina - PI", "87": "Petrolina - PE",
+    "88": "Juazeiro do Norte - CE", "89": "Picos - PI",
+    "91": "Belém - PA", "92": "Manaus - AM", "93": "Santarém - PA", "94": "Marabá - PA",
+    "95": "Boa Vista - RR", "96": "Macapá - AP", "97": "Coari - AM", "98": "São Luís - MA",
+    "99": "Imperatriz - MA",
+}
+
+
+def gerar_cpf(rng: random.Random, formatado: bool = True) -> str:
+    """CPF aleatório com dígitos verificadores válidos (nunca com todos os dígitos iguais)."""
+    while True:
+        base = [rng.randint(0, 9) for _ in range(9)]
+        if len(set(base)) > 1:
+            break
+    for tamanho in (9, 10):
+        soma = sum(d * peso for d, peso in zip(base, range(tamanho + 1, 1, -1)))
+        resto = soma % 11
+        base.append(0 if resto < 2 else 11 - resto)
+    cpf = "".join(map(str, base))
+    return f"{cpf[:3]}.{cpf[3:6]}.{cpf[6:9]}-{cpf[9:]}" if formatado else cpf
+
+
+def cpf_valido(cpf: str) -> bool:
+    """Confere os dígitos verificadores de um CPF (com ou sem máscara)."""
+    digitos = [int(c) for c in cpf if c.isdigit()]
+    if len(digitos) != 11 or len(set(digitos)) == 1:
+        return False
+    for tamanho in (9, 10):
+        soma = sum(d * peso for d, peso in zip(digitos, range(tamanho + 1, 1, -1)))
+        resto = soma % 11
+        if digitos[tamanho] != (0 if resto < 2 else 11 - resto):
+            return False
+    return True
+
+
+def _sem_acentos(texto: str) -> str:
+    return unicodedata.normalize("NFKD", texto).encode("ascii", "ignore").decode("ascii")
+
+
+def _gerador_nomes(rng: random.Random, seed: int):
+    """Nomes do Faker pt_BR (carregado uma vez, com semente) ou das listas internas."""
+    try:
+        from faker import Faker
+    except ImportError:
+        logger.warning("Faker não instalado, usando nomes internos no pool de clientes")
+    else:
+        fake = Faker("pt_BR")
+        fake.seed_instance(seed)
+        return fake.name
+    return lambda: f"{rng.choice(PRIMEIROS_NOMES)} {rng.choice(SOBRENOMES)}"
+
+
+class PoolDadosCliente:
+    """
+    Pool reutilizável de registros de clientes fictícios.
+
+    Args:
+        tamanho: Número de registros gerados
+        seed: Semente (None = aleatória, sorteada uma vez)
+        usar_faker: Usar o Faker pt_BR para os nomes, se instalado
+
+    Example:
+        >>> pool = PoolDadosCliente(seed=42)
+        >>> pool.proximo()
+        {'nome': '...', 'telefone': '(27)99123-4567'}
+        >>> pool.para("PERSONA_010", campos=CAMPOS)["cpf"]
+        '123.456.789-09'
+    """
+
+    def __init__(self, tamanho: int = DEFAULT_TAMANHO_POOL, seed: Optional[int] = None, usar_faker: bool = True):
+        if tamanho < 1:
+            raise ValueError("tamanho deve ser >= 1")
+        self.seed = seed if seed is not None else random.SystemRandom().randrange(2 ** 32)
+        self._lock = threading.Lock()
+        self._cursor = 0
+
+        rng = random.Random(self.seed)
+        gerar_nome = _gerador_nomes(rng, self.seed) if usar_faker else (
+            lambda: f"{rng.choice(PRIMEIROS_NOMES)} {rng.choice(SOBRENOMES)}"
+        )
+        ddds = sorted(CIDADES_POR_DDD)
+        self._registros: list[dict] = []
+        self._com_email: list[bool] = []
+        for _ in range(tamanho):
+            nome = gerar_nome()
+            ddd = rng.choice(ddds)
+            numero = f"9{rng.randint(0, 99_999_999):08d}"
+            partes = [p for p in _sem_acentos(nome).lower().replace(".", "").split() if p not in TRATAMENTOS]
+            usuario = f"{partes[0]}.{partes[-1]}" if len(partes) > 1 else partes[0]
+            self._registros.append({
+                "nome": nome,
+                "telefone": f"({ddd}){numero[:5]}-{numero[5:]}",
+                "email": f"{usuario}{rng.randint(1, 999)}@{rng.choice(DOMINIOS_EMAIL)}",
+                "cpf": gerar_cpf(rng),
+                "cidade": CIDADES_POR_DDD[ddd],
+            })
+            self._com_email.append(rng.random() < PROBABILIDADE_EMAIL)
+
+    def __len__(self) -> int:
+        return len(self._registros)
+
+    def _selecionar(self, indice: int, campos: Optional[Sequence[str]]) -> dict:
+        registro = self._registros[indice]
+        if campos is None:
+            campos = CAMPOS_PADRAO + (("email",) if self._com_email[indice] else ())
+        return {campo: registro[campo] for campo in campos}
+
+    def proximo(self, campos: Optional[Sequence[str]] = None) -> dict:
+        """
+        Próximo registro do pool (circular).
+
+        Args:
+            campos: Campos devolvidos (padrão: nome, telefone e, em ~30% dos
+                    registros, email). Use CAMPOS para todos.
+        """
+        with self._lock:
+            indice = self._cursor
+            self._cursor = (self._cursor + 1) % len(self._registros)
+        return self._selecionar(indice, campos)
+
+    def para(self, chave: str, campos: Optional[Sequence[str]] = None) -> dict:
+        """Registro fixo para uma chave (independe da ordem de chamada entre threads)."""
+        return self._selecionar(zlib.crc32(chave.encode("utf-8")) % len(self._registros), campos)
+
+
+_pool: Optional[PoolDadosCliente] = None
+_pool_lock = threading.Lock()
+
+
+def configurar_pool(seed: Optional[int] = None, tamanho: int = DEFAULT_TAMANHO_POOL) -> PoolDadosCliente:
+    """Recria o pool global (ex: com semente fixa para execuções reproduzíveis)."""
+    global _pool
+    with _pool_lock:
+        _pool = PoolDadosCliente(tamanho=tamanho, seed=seed)
+        return _pool
+
+
+def obter_pool() -> PoolDadosCliente:
+    """
+    Pool global, criado no primeiro uso.
+
+    A semente vem de QA_CLIENT_DATA_SEED, se definida.
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                seed = os.getenv("QA_CLIENT_DATA_SEED")
+                _pool = PoolDadosCliente(seed=int(seed) if seed else None)
+    return _pool
@@ -0,0 +1,255 @@
+"""
+ContextWindow - Gerenciamento do histórico enviado aos agentes e ao juiz.
+
+Conversas longas (até 50 turnos) fazem cada chamada carregar todo o histórico.
+Este módulo monta a mensagem de cada turno segundo uma estratégia configurável
+e contabiliza os tokens economizados em relação ao histórico completo:
+
+- "nativo": envia só a última mensagem (o Agno decide o que mais incluir)
+- "completo": histórico completo explícito (referência, sem economia)
+- "janela": apenas as últimas N mensagens
+- "tokens": as mensagens mais recentes que cabem em um limite de tokens
+- "resumo": resumo acumulado das mensagens antigas + últimas N mensagens
+
+A contagem usa `tiktoken` quando instalado (exata para modelos OpenAI);
+caso contrário estima ~4 caracteres por token.
+"""
+
+import logging
+import os
+from functools import lru_cache
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+ESTRATEGIAS = ("nativo", "completo", "janela", "tokens", "resumo")
+ESTRATEGIA_PADRAO = os.getenv("QA_HISTORY_STRATEGY", "nativo")
+
+DEFAULT_MAX_MENSAGENS = 8
+DEFAULT_MAX_TOKENS = 2000
+DEFAULT_MAX_TOKENS_RESUMO = 400
+# Caracteres mantidos de cada mensagem antiga no resumo extrativo
+CHARS_POR_LINHA_RESUMO = 160
+
+
+@lru_cache(maxsize=1)
+def _encoder():
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        logger.warning("tiktoken não disponível, usando estimativa de tokens (~4 chars/token)")
+        return None
+
+
+def contar_tokens(texto: str) -> int:
+    """
+    Conta os tokens de um texto.
+
+    Args:
+        texto: Texto a contar
+
+    Returns:
+        Número de tokens (exato com tiktoken, estimado sem ele)
+    """
+    if not texto:
+        return 0
+    encoder = _encoder()
+    if encoder is None:
+        return max(1, len(texto) // 4)
+    return len(encoder.encode(texto, disallowed_special=()))
+
+
+def _formatar_mensagem(msg: dict) -> str:
+    return f"{msg['role'].upper()}: {msg['content']}"
+
+
+def resumo_extrativo(mensagens: list[dict]) -> list[str]:
+    """Resume cada mensagem em uma linha curta (sem chamada a LLM)."""
+    linhas = []
+    for msg in mensagens:
+        conteudo = " ".join(str(msg.get("content", "")).split())
+        if len(conteudo) > CHARS_POR_LINHA_RESUMO:
+            conteudo = conteudo[:CHARS_POR_LINHA_RESUMO].rstrip() + "..."
+        linhas.append(f"- {msg['role'].upper()}: {conteudo}")
+    return linhas
+
+
+class ContextWindow:
+    """
+    Monta o contexto de cada turno de UMA conversa segundo a estratégia escolhida.
+
+    O histórico é tratado como append-only: a contagem de tokens por mensagem
+    e o resumo acumulado são incrementais, então o custo por turno não cresce
+    com o tamanho da conversa.
+
+    Args:
+        estrategia: Uma de ESTRATEGIAS (padrão: env QA_HISTORY_STRATEGY ou "nativo")
+        max_mensagens: Mensagens recentes mantidas em "janela" e "resumo"
+        max_tokens: Limite de tokens do histórico na estratégia "tokens"
+        max_tokens_resumo: Limite do resumo acumulado na estratégia "resumo"
+        resumidor: Função opcional (mensagens -> linhas) para substituir o resumo extrativo
+
+    Example:
+        >>> ctx = ContextWindow("janela", max_mensagens=4)
+        >>> mensagem = ctx.mensagem_para(conversa[:-1], conversa[-1]["content"])
+        >>> ctx.economia()["tokens_economizados"]
+        1234
+    """
+
+    def __init__(
+        self,
+        estrategia: Optional[str] = None,
+        max_mensagens: int = DEFAULT_MAX_MENSAGENS,
+        max_tokens: int = DEFAULT_MAX_TOKENS,
+        max_tokens_resumo: int = DEFAULT_MAX_TOKENS_RESUMO,
+        resumidor: Optional[Callable[[list[dict]], list[str]]] = None
+    ):
+        estrategia = estrategia or ESTRATEGIA_PADRAO
+        if estrategia not in ESTRATEGIAS:
+            raise ValueError(f"Estratégia de histórico inválida: {estrategia}. Use uma de {ESTRATEGIAS}")
+        self.estrategia = estrategia
+        self.max_mensagens = max_mensagens
+        self.max_tokens = max_tokens
+        self.max_tokens_resumo = max_tokens_resumo
+        self.resumidor = resumidor or resumo_extrativo
+
+        self._tokens_por_msg: list[int] = []
+        self._linhas_resumo: list[str] = []
+        self._tokens_resumo: list[int] = []
+        self._resumidas = 0
+        self._tokens_completos = 0
+        self._tokens_enviados = 0
+        self._chamadas = 0
+
+    @classmethod
+    def criar(cls, estrategia: "Optional[str | ContextWindow]" = None) -> "ContextWindow":
+        """Aceita um nome de estratégia ou uma instância pronta (reutilizada como modelo)."""
+        if isinstance(estrategia, ContextWindow):
+            return cls(
+                estrategia.estrategia,
+                max_mensagens=estrategia.max_mensagens,
+                max_tokens=estrategia.max_tokens,
+                max_tokens_resumo=estrategia.max_tokens_resumo,
+                resumidor=estrategia.resumidor,
+            )
+        return cls(estrategia)
+
+    # --- Contagem incremental ---
+
+    def _sincronizar(self, historico: list[dict]) -> None:
+        for msg in historico[len(self._tokens_por_msg):]:
+            self._tokens_por_msg.append(contar_tokens(_formatar_mensagem(msg)))
+
+    def _atualizar_resumo(self, historico: list[dict], ate: int) -> None:
+        """Incorpora ao resumo as mensagens que saíram da janela."""
+        if ate <= self._resumidas:
+            return
+        novas = self.resumidor(historico[self._resumidas:ate])
+        self._linhas_resumo.extend(novas)
+        self._tokens_resumo.extend(contar_tokens(linha) for linha in novas)
+        self._resumidas = ate
+        # Mantém o resumo dentro do limite descartando as linhas mais antigas
+        while self._linhas_resumo and sum(self._tokens_resumo) > self.max_tokens_resumo:
+            self._linhas_resumo.pop(0)
+            self._tokens_resumo.pop(0)
+
+    def _selecionar(self, historico: list[dict]) -> tuple[list[str], list[dict]]:
+        """Retorna (linhas de resumo, mensagens recentes) conforme a estratégia."""
+        if self.estrategia == "completo":
+            return [], historico
+        if self.estrategia == "janela":
+            return [], historico[-self.max_mensagens:] if self.max_mensagens else []
+        if self.estrategia == "tokens":
+            total = 0
+            inicio = len(historico)
+            for i in range(len(historico) - 1, -1, -1):
+                if total + self._tokens_por_msg[i] > self.max_tokens:
+                    break
+                total += self._tokens_por_msg[i]
+                inicio = i
+            return [], historico[inicio:]
+        # resumo
+        corte = max(0, len(historico) - self.max_mensagens)
+        self._atualizar_resumo(historico, corte)
+        return self._linhas_resumo, historico[corte:]
+
+    def _renderizar(self, resumo: list[str], recentes: list[dict], omitidas: int) -> str:
+        partes = []
+        if resumo:
+            partes.append("## RESUMO DO INÍCIO DA CONVERSA\n" + "\n".join(resumo))
+        elif omitidas:
+            partes.append(f"[{omitidas} mensagens anteriores omitidas]")
+        if recentes:
+            partes.append("\n".join(_formatar_mensagem(m) for m in recentes))
+        return "\n\n".join(partes)
+
+    def _contabilizar(self, completos: int, enviados: int) -> None:
+        self._tokens_completos += completos
+        self._tokens_enviados += enviados
+        self._chamadas += 1
+
+    # --- API pública ---
+
+    def mensagem_para(self, historico: list[dict], mensagem_atual: str) -> str:
+        """
+        Monta a mensagem enviada a um agente neste turno.
+
+        Args:
+            historico: Mensagens anteriores ({"role", "content"}), sem a atual
+            mensagem_atual: Última mensagem do interlocutor
+
+        Returns:
+            Texto a enviar para `agent.run`
+        """
+        self._sincronizar(historico)
+        tokens_atual = contar_tokens(mensagem_atual)
+        tokens_historico = sum(self._tokens_por_msg[:len(historico)])
+
+        if self.estrategia == "nativo":
+            # O histórico fica a cargo do Agno: não há economia a contabilizar
+            self._contabilizar(tokens_atual, tokens_atual)
+            return mensagem_atual
+        if not historico:
+            self._contabilizar(tokens_atual, tokens_atual)
+            return mensagem_atual
+
+        resumo, recentes = self._selecionar(historico)
+        contexto = self._renderizar(resumo, recentes, len(historico) - len(recentes))
+        mensagem = f"## HISTÓRICO DA CONVERSA\n{contexto}\n\n## MENSAGEM ATUAL\n{mensagem_atual}"
+        self._contabilizar(tokens_historico + tokens_atual, contar_tokens(mensagem))
+        return mensagem
+
+    def transcricao_para_juiz(self, historico: list[dict]) -> str:
+        """
+        Monta a transcrição enviada ao juiz.
+
+        Nas estratégias "nativo" e "completo" a transcrição é integral.
+        """
+        self._sincronizar(historico)
+        tokens_completos = sum(self._tokens_por_msg[:len(historico)])
+
+        if self.estrategia in ("nativo", "completo"):
+            texto = "\n".join(_formatar_mensagem(m) for m in historico)
+            self._contabilizar(tokens_completos, tokens_completos)
+            return texto
+
+        resumo, recentes = self._selecionar(historico)
+        texto = self._renderizar(resumo, recentes, len(historico) - len(recentes))
+        self._contabilizar(tokens_completos, contar_tokens(texto))
+        return texto
+
+    def economia(self) -> dict:
+        """
+        Tokens de histórico que seriam enviados vs. efetivamente enviados.
+
+        Returns:
+            {"estrategia", "chamadas", "tokens_completos", "tokens_enviados", "tokens_economizados"}
+        """
+        return {
+            "estrategia": self.estrategia,
+            "chamadas": self._chamadas,
+            "tokens_completos": self._tokens_completos,
+            "tokens_enviados": self._tokens_enviados,
+            "tokens_economizados": self._tokens_completos - self._tokens_enviados,
+        }
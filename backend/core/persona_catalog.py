@@ -0,0 +1,273 @@
+"""
+PersonaCatalog - Catálogo de personas indexado e carregado sob demanda.
+
+A origem pode ser um único arquivo ou um diretório de shards:
+- .json: {"personas": [...]} (formato de personas_genericas_puras.json) ou uma lista
+- .jsonl: uma persona por linha
+
+Na abertura cada shard é lido uma vez só para montar os índices (ID ->
+posição no shard, e índices secundários de personalidade, nivel_stress e
+tags); os corpos das personas não ficam em memória. `obter()` lê a persona
+do shard quando pedida (JSONL: seek direto no offset da linha) e mantém as
+mais recentes em um cache LRU.
+
+Example:
+    >>> catalogo = abrir_catalogo("personas/")        # diretório de shards
+    >>> len(catalogo)
+    4800
+    >>> catalogo.filtrar(nivel_stress=["alto", "MÁXIMO"], tags="financeiro")[:3]
+    ['FIN_0007', 'FIN_0042', 'FIN_0113']
+    >>> catalogo.obter("FIN_0007")["nome"]
+    'O Endividado'
+"""
+
+import json
+import logging
+import os
+import threading
+import unicodedata
+from collections import OrderedDict
+from collections.abc import Mapping
+from functools import lru_cache
+from typing import Iterator, Optional, Sequence, Union
+
+logger = logging.getLogger(__name__)
+
+EXTENSOES = (".json", ".jsonl")
+CAMPOS_INDEXADOS = ("personalidade", "nivel_stress", "tags")
+DEFAULT_TAMANHO_CACHE = 512
+PERSONAS_PADRAO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "personas_genericas_puras.json")
+
+Criterio = Optional[Union[str, Sequence[str]]]
+
+
+def caminho_personas_padrao() -> str:
+    """Catálogo padrão: QA_PERSONAS_PATH (arquivo ou diretório) ou as 20 personas genéricas."""
+    return os.getenv("QA_PERSONAS_PATH", PERSONAS_PADRAO)
+
+
+def normalizar_valor(valor: str) -> str:
+    """Chave dos índices: minúsculas e sem acentos ("MÁXIMO" -> "maximo")."""
+    texto = unicodedata.normalize("NFKD", str(valor)).encode("ascii", "ignore").decode("ascii")
+    return texto.strip().lower()
+
+
+def listar_shards(origem: str) -> list[str]:
+    """Shards de um arquivo ou diretório (ordem alfabética, incluindo subdiretórios)."""
+    if os.path.isfile(origem):
+        return [origem]
+    shards = []
+    for raiz, diretorios, arquivos in os.walk(origem):
+        diretorios.sort()
+        shards += [os.path.join(raiz, a) for a in sorted(arquivos) if a.endswith(EXTENSOES)]
+    return shards
+
+
+def _personas_json(dados) -> list:
+    return dados.get("personas", []) if isinstance(dados, dict) else dados
+
+
+@lru_cache(maxsize=4)
+def _ler_shard_json(caminho: str, mtime_ns: int) -> list:
+    """Shard .json inteiro (poucos em cache; mtime invalida ao editar o arquivo)."""
+    with open(caminho, "r", encoding="utf-8") as f:
+        return _personas_json(json.load(f))
+
+
+class CatalogoPersonas(Mapping):
+    """
+    Catálogo de personas: mapeamento ID -> persona, com corpos carregados sob demanda.
+
+    Args:
+        origem: Arquivo .json/.jsonl ou diretório com shards (lidos em ordem alfabética,
+                incluindo subdiretórios)
+        tamanho_cache: Quantidade de personas completas mantidas em memória
+
+    Raises:
+        FileNotFoundError: Se a origem não existir
+    """
+
+    def __init__(self, origem: str, tamanho_cache: int = DEFAULT_TAMANHO_CACHE):
+        if not os.path.exists(origem):
+            raise FileNotFoundError(f"Arquivo de personas não encontrado: {origem}")
+        self.origem = origem
+        self.tamanho_cache = tamanho_cache
+        self._lock = threading.Lock()
+        self._cache: OrderedDict[str, dict] = OrderedDict()
+        # ID -> (shard, posição): posição = offset em bytes (JSONL) ou índice na lista (JSON)
+        self._localizacao: dict[str, tuple[str, int]] = {}
+        self._resumos: dict[str, dict] = {}
+        self._indices: dict[str, dict[str, set[str]]] = {campo: {} for campo in CAMPOS_INDEXADOS}
+        self.shards = listar_shards(origem)
+        for shard in self.shards:
+            self._indexar_shard(shard)
+        self._ordem = {persona_id: i for i, persona_id in enumerate(self._localizacao)}
+        logger.info("Catálogo de personas %s: %s personas em %s shard(s)", origem, len(self._localizacao), len(self.shards))
+
+    def _registrar(self, persona: dict, shard: str, posicao: int) -> None:
+        persona_id = persona.get("id")
+        if not persona_id:
+            return
+        if persona_id in self._localizacao:
+            logger.warning("Persona %s duplicada em %s; mantida a de %s", persona_id, shard, self._localizacao[persona_id][0])
+            return
+        self._localizacao[persona_id] = (shard, posicao)
+        tags = persona.get("tags") or []
+        self._resumos[persona_id] = {
+            "id": persona_id,
+            "nome": persona.get("nome", persona_id),
+            "personalidade": persona.get("personalidade", ""),
+            "nivel_stress": persona.get("nivel_stress", ""),
+            "tags": list(tags),
+        }
+        valores = {
+            "personalidade": [persona.get("personalidade")],
+            "nivel_stress": [persona.get("nivel_stress")],
+            "tags": tags,
+        }
+        for campo, lista in valores.items():
+            for valor in lista:
+                if valor:
+                    self._indices[campo].setdefault(normalizar_valor(valor), set()).add(persona_id)
+
+    def _indexar_shard(self, shard: str) -> None:
+        if shard.endswith(".jsonl"):
+            with open(shard, "rb") as f:
+                offset = 0
+                for linha in f:
+                    if linha.strip():
+                        self._registrar(json.loads(linha), shard, offset)
+                    offset += len(linha)
+        else:
+            with open(shard, "r", encoding="utf-8") as f:
+                for i, persona in enumerate(_personas_json(json.load(f))):
+                    self._registrar(persona, shard, i)
+
+    def _ler_persona(self, persona_id: str) -> dict:
+        shard, posicao = self._localizacao[persona_id]
+        if shard.endswith(".jsonl"):
+            with open(shard, "rb") as f:
+                f.seek(posicao)
+                return json.loads(f.readline())
+        return _ler_shard_json(shard, os.stat(shard).st_mtime_ns)[posicao]
+
+    # --- Mapping ---
+
+    def __getitem__(self, persona_id: str) -> dict:
+        if persona_id not in self._localizacao:
+            raise KeyError(persona_id)
+        with self._lock:
+            if persona_id in self._cache:
+                self._cache.move_to_end(persona_id)
+                return self._cache[persona_id]
+        persona = self._ler_persona(persona_id)
+        with self._lock:
+            self._cache[persona_id] = persona
+            if len(self._cache) > self.tamanho_cache:
+                self._cache.popitem(last=False)
+        return persona
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._localizacao)
+
+    def __len__(self) -> int:
+        return len(self._localizacao)
+
+    def __contains__(self, persona_id) -> bool:
+        return persona_id in self._localizacao
+
+    # --- Consultas ---
+
+    def obter(self, persona_id: str) -> dict:
+        """
+        Persona completa.
+
+        Raises:
+            KeyError: Se o ID não existir
+        """
+        return self[persona_id]
+
+    def ids(self) -> list[str]:
+        """Todos os IDs, na ordem dos shards."""
+        return list(self._localizacao)
+
+    def resumo(self, persona_id: str) -> dict:
+        """Campos indexados (id, nome, personalidade, nivel_stress, tags), sem ler o shard."""
+        return self._resumos[persona_id]
+
+    def resumos(self) -> list[dict]:
+        return list(self._resumos.values())
+
+    def valores(self, campo: str) -> dict[str, int]:
+        """Valores de um campo indexado com a quantidade de personas de cada um."""
+        return {valor: len(ids) for valor, ids in sorted(self._indices[campo].items())}
+
+    def filtrar(
+        self,
+        personalidade: Criterio = None,
+        nivel_stress: Criterio = None,
+        tags: Criterio = None,
+        ids: Optional[Sequence[str]] = None
+    ) -> list[str]:
+        """
+        IDs que atendem a todos os critérios informados.
+
+        Args:
+            personalidade: Um valor ou lista de valores aceitos (qualquer um)
+            nivel_stress: Um valor ou lista de valores aceitos (qualquer um)
+            tags: Tag ou lista de tags que a persona precisa ter (todas)
+            ids: Restringe a estes IDs
+
+        Returns:
+            IDs na ordem do catálogo (comparação sem acentos/maiúsculas)
+        """
+        def como_lista(criterio: Criterio) -> list[str]:
+            return [criterio] if isinstance(criterio, str) else list(criterio)
+
+        conjuntos = []
+        for campo, criterio in (("personalidade", personalidade), ("nivel_stress", nivel_stress)):
+            if criterio:
+                aceitos: set[str] = set()
+                for valor in como_lista(criterio):
+                    aceitos |= self._indices[campo].get(normalizar_valor(valor), set())
+                conjuntos.append(aceitos)
+        if tags:
+            for tag in como_lista(tags):
+                conjuntos.append(self._indices["tags"].get(normalizar_valor(tag), set()))
+        if ids is not None:
+            conjuntos.append(set(ids))
+
+        if not conjuntos:
+            return self.ids()
+        selecionados = set.intersection(*conjuntos) & self._localizacao.keys()
+        return sorted(selecionados, key=self._ordem.__getitem__)
+
+
+def _assinatura(shards: Sequence[str]) -> tuple:
+    """(shard, mtime, tamanho) de cada shard: muda quando algum arquivo muda."""
+    return tuple((shard, os.stat(shard).st_mtime_ns, os.stat(shard).st_size) for shard in shards)
+
+
+_catalogos: dict[str, tuple[tuple, CatalogoPersonas]] = {}
+_catalogos_lock = threading.Lock()
+
+
+def abrir_catalogo(origem: Optional[str] = None) -> CatalogoPersonas:
+    """
+    Catálogo compartilhado do processo (reindexado se algum shard mudar).
+
+    Args:
+        origem: Arquivo ou diretório (padrão: caminho_personas_padrao())
+
+    Raises:
+        FileNotFoundError: Se a origem não existir
+    """
+    origem = os.path.abspath(origem or caminho_personas_padrao())
+    if not os.path.exists(origem):
+        raise FileNotFoundError(f"Arquivo de personas não encontrado: {origem}")
+    assinatura = _assinatura(listar_shards(origem))
+    with _catalogos_lock:
+        atual = _catalogos.get(origem)
+        if atual is None or atual[0] != assinatura:
+            _catalogos[origem] = (assinatura, CatalogoPersonas(origem))
+        return _catalogos[origem][1]
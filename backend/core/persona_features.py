@@ -0,0 +1,189 @@
+"""
+PersonaFeatures - Vetores de características das personas e seleção por diversidade.
+
+Cada persona vira um vetor com três blocos (cada um normalizado e ponderado):
+- nivel_stress ordinal (baixo < medio < alto < MÁXIMO)
+- atributos categóricos: termos de `personalidade` e `tom_comunicacao`
+  ("casual_brasileiro_desconfiado" -> casual, brasileiro, desconfiado)
+- texto de comportamento: TF-IDF de comportamentos, padrões de linguagem e
+  triggers
+
+A seleção usa o k-center guloso (max-min): começa pela persona mais distante
+do centróide e adiciona, a cada passo, a persona mais distante das já
+escolhidas. Com N personas, cobre o espaço de comportamentos com menos
+conversas do que índices espaçados na ordem do JSON.
+"""
+
+import math
+import re
+import unicodedata
+from collections import Counter
+from typing import Optional, Sequence
+
+import numpy as np
+
+NIVEIS_STRESS = {"baixo": 0.0, "medio": 1 / 3, "alto": 2 / 3, "maximo": 1.0}
+
+# Stress tem uma dimensão só (0 a 1); com peso 1.5 a diferença entre "baixo" e
+# "MÁXIMO" pesa como personas sem nenhum termo em comum nos outros blocos (~1.41)
+PESOS_PADRAO = {"stress": 1.5, "categorico": 1.0, "texto": 1.0}
+
+# Vocabulários limitados aos termos mais frequentes: com catálogos de
+# milhares de personas a matriz continua com ~1k colunas
+MAX_TERMOS_CATEGORICOS = 512
+MAX_TERMOS_TEXTO = 512
+
+STOPWORDS = {
+    "que", "com", "para", "por", "uma", "um", "dos", "das", "nao", "mas", "sem",
+    "mais", "muito", "quando", "depois", "tudo", "como", "vez", "vezes", "seu", "sua",
+    "voce", "voces", "isso", "esse", "essa", "ser", "tem", "ter", "pra", "apos", "se",
+}
+
+
+def _normalizar(texto: str) -> str:
+    texto = unicodedata.normalize("NFKD", str(texto)).encode("ascii", "ignore").decode("ascii")
+    return texto.lower()
+
+
+def _termos(texto: str) -> list[str]:
+    return [t for t in re.findall(r"[a-z]{3,}", _normalizar(texto)) if t not in STOPWORDS]
+
+
+def _texto_comportamento(persona: dict) -> str:
+    partes = list(persona.get("comportamentos", [])) + list(persona.get("padroes_linguagem", []))
+    triggers = persona.get("triggers_comportamento") or {}
+    partes += [str(v) for v in triggers.values()]
+    return " ".join(partes)
+
+
+def _normalizar_linhas(matriz: np.ndarray) -> np.ndarray:
+    normas = np.linalg.norm(matriz, axis=1, keepdims=True)
+    return matriz / np.where(normas > 0, normas, 1.0)
+
+
+def vetores_personas(personas: Sequence[dict], pesos: Optional[dict] = None) -> np.ndarray:
+    """
+    Matriz (n_personas x n_features) com os três blocos de características.
+
+    Args:
+        personas: Personas no formato de personas_genericas_puras.json
+        pesos: Peso de cada bloco ("stress", "categorico", "texto")
+
+    Returns:
+        Matriz float32; distâncias euclidianas entre linhas medem a diferença
+        de comportamento entre personas
+    """
+    pesos = {**PESOS_PADRAO, **(pesos or {})}
+    n = len(personas)
+
+    stress = np.array([
+        [NIVEIS_STRESS.get(_normalizar(p.get("nivel_stress", "")), 0.5)] for p in personas
+    ], dtype=np.float32).reshape(n, 1)
+
+    categorias = [
+        set(_termos(p.get("personalidade", "").replace("_", " ")))
+        | set(_termos(p.get("tom_comunicacao", "").replace("_", " ")))
+        for p in personas
+    ]
+    df_cat = Counter(t for termos in categorias for t in termos)
+    vocab_cat = sorted(t for t, _ in df_cat.most_common(MAX_TERMOS_CATEGORICOS))
+    indice_cat = {t: i for i, t in enumerate(vocab_cat)}
+    categorico = np.zeros((n, len(vocab_cat)), dtype=np.float32)
+    for i, termos in enumerate(categorias):
+        for termo in termos:
+            if termo in indice_cat:
+                categorico[i, indice_cat[termo]] = 1.0
+
+    contagens = [Counter(_termos(_texto_comportamento(p))) for p in personas]
+    df = Counter(t for c in contagens for t in c)
+    vocab_txt = sorted(t for t, _ in df.most_common(MAX_TERMOS_TEXTO))
+    indice_txt = {t: i for i, t in enumerate(vocab_txt)}
+    texto = np.zeros((n, len(vocab_txt)), dtype=np.float32)
+    for i, contagem in enumerate(contagens):
+        for termo, tf in contagem.items():
+            if termo in indice_txt:
+                texto[i, indice_txt[termo]] = tf * (math.log((1 + n) / (1 + df[termo])) + 1)
+
+    # Blocos com norma 1 por linha: nenhum domina só por ter mais dimensões
+    return np.hstack([
+        pesos["stress"] * stress,
+        pesos["categorico"] * _normalizar_linhas(categorico),
+        pesos["texto"] * _normalizar_linhas(texto),
+    ])
+
+
+def selecionar_k_centro(matriz: np.ndarray, k: int, inicial: Optional[int] = None) -> list[int]:
+    """
+    K-center guloso (max-min) sobre as linhas de `matriz`.
+
+    Args:
+        matriz: Vetores (uma linha por item)
+        k: Quantidade de itens selecionados
+        inicial: Primeiro item (padrão: o mais distante do centróide)
+
+    Returns:
+        Índices na ordem de escolha (os primeiros são os mais diversos)
+    """
+    n = len(matriz)
+    k = min(k, n)
+    if k <= 0:
+        return []
+    if inicial is None:
+        inicial = int(np.argmax(np.linalg.norm(matriz - matriz.mean(axis=0), axis=1)))
+    escolhidos = [inicial]
+    distancias = np.linalg.norm(matriz - matriz[inicial], axis=1)
+    while len(escolhidos) < k:
+        distancias[escolhidos] = -1.0
+        proximo = int(np.argmax(distancias))
+        escolhidos.append(proximo)
+        distancias = np.minimum(distancias, np.linalg.norm(matriz - matriz[proximo], axis=1))
+    return escolhidos
+
+
+def selecionar_diversas(personas: Sequence[dict], n: int, pesos: Optional[dict] = None) -> list[str]:
+    """
+    IDs das N personas mais diversas (k-center guloso sobre `vetores_personas`).
+
+    Example:
+        >>> selecionar_diversas(list(injector.personas.values()), 5)
+        ['PERSONA_020', 'PERSONA_007', 'PERSONA_011', ...]
+    """
+    if not personas:
+        return []
+    indices = selecionar_k_centro(vetores_personas(personas, pesos), n)
+    return [personas[i]["id"] for i in indices]
+
+
+def cobertura(
+    personas: Sequence[dict],
+    ids: Sequence[str],
+    pesos: Optional[dict] = None,
+    matriz: Optional[np.ndarray] = None
+) -> dict:
+    """
+    Quanto do catálogo as personas selecionadas cobrem (`matriz`: vetores já
+    calculados por `vetores_personas`, para não refazê-los).
+
+    Returns:
+        {"nivel_stress": fração dos níveis de stress presentes,
+         "raio": maior distância de uma persona do catálogo à selecionada mais
+                 próxima (menor = melhor cobertura),
+         "distancia_media": distância média de cada persona à selecionada mais próxima}
+    """
+    selecionados = set(ids)
+    indices = [i for i, p in enumerate(personas) if p.get("id") in selecionados]
+    niveis = {_normalizar(p.get("nivel_stress", "")) for p in personas}
+    niveis_sel = {_normalizar(personas[i].get("nivel_stress", "")) for i in indices}
+    if not indices:
+        return {"nivel_stress": 0.0, "raio": None, "distancia_media": None}
+
+    if matriz is None:
+        matriz = vetores_personas(personas, pesos)
+    distancias = np.full(len(personas), np.inf)
+    for i in indices:
+        distancias = np.minimum(distancias, np.linalg.norm(matriz - matriz[i], axis=1))
+    return {
+        "nivel_stress": round(len(niveis_sel) / len(niveis), 3) if niveis else 0.0,
+        "raio": round(float(distancias.max()), 4),
+        "distancia_media": round(float(distancias.mean()), 4),
+    }
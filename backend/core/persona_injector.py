@@ -2,29 +2,38 @@
 PersonaInjector - Sistema de injeção de personas para testes automatizados.
 
 Este módulo fornece a classe PersonaInjector que:
-- Carrega 20 personas genéricas de um arquivo JSON
-- Combina persona + prompt de teste em um único prompt final
-- Gera dados aleatórios opcionais (nome, telefone)
+- Lê as personas de um catálogo (core.persona_catalog): o arquivo JSON das
+  20 personas genéricas ou um diretório de shards JSON/JSONL com milhares
+- Combina prompt de teste + persona em um único prompt final (parte comum
+  primeiro, para o cache de prompt do provedor)
+- Gera dados aleatórios opcionais (nome, telefone) a partir do pool de core.client_data
 """
 
-import json
 import logging
-import os
-import random
-from typing import Optional
+from typing import Optional, Sequence
+
+from .client_data import obter_pool
+from .persona_catalog import CatalogoPersonas, abrir_catalogo
 
-# Configuração de logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+INSTRUCOES_FINAIS = """## INSTRUÇÕES FINAIS
+
+Você deve:
+1. Usar a PERSONA descrita abaixo durante toda a conversa
+2. Seguir as instruções do PROMPT DE TESTE acima
+3. Ser natural - combine a persona com as instruções
+4. Manter o tom e padrões de linguagem da sua persona"""
+
+
 class PersonaInjector:
     """
     Classe responsável por carregar personas e gerar prompts de teste.
     
     Attributes:
-        personas_path: Caminho para o arquivo JSON de personas
-        personas: Dicionário de personas indexado por ID
+        personas_path: Arquivo JSON/JSONL ou diretório de shards de personas
+        personas: Catálogo indexado por ID (mapeamento; corpos lidos sob demanda)
     
     Example:
         >>> injector = PersonaInjector("personas_genericas_puras.json")
@@ -37,38 +46,22 @@ class PersonaInjector:
     
     def __init__(self, personas_path: str):
         """
-        Inicializa o PersonaInjector carregando personas do JSON.
+        Inicializa o PersonaInjector sobre o catálogo de personas.
+        
+        O catálogo é compartilhado no processo (abrir_catalogo): criar um
+        injector por conversa não relê os arquivos.
         
         Args:
-            personas_path: Caminho para o arquivo JSON de personas
+            personas_path: Arquivo JSON/JSONL ou diretório de shards de personas
             
         Raises:
             FileNotFoundError: Se o arquivo não existir
             json.JSONDecodeError: Se o JSON for inválido
         """
         self.personas_path = personas_path
-        self.personas: dict[str, dict] = {}
-        self._carregar_personas()
-    
-    def _carregar_personas(self) -> None:
-        """Carrega personas do arquivo JSON."""
-        if not os.path.exists(self.personas_path):
-            raise FileNotFoundError(
-                f"Arquivo de personas não encontrado: {self.personas_path}"
-            )
-        
-        logger.info(f"Carregando personas de: {self.personas_path}")
-        
-        with open(self.personas_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        
-        # Indexar personas por ID
-        for persona in data.get("personas", []):
-            persona_id = persona.get("id")
-            if persona_id:
-                self.personas[persona_id] = persona
-        
-        logger.info(f"Carregadas {len(self.personas)} personas")
+        self.personas: CatalogoPersonas = abrir_catalogo(personas_path)
+        # Bloco formatado de cada persona (texto fixo, reutilizado byte a byte)
+        self._blocos_persona: dict[str, str] = {}
     
     def listar_personas(self) -> list[dict]:
         """
@@ -79,12 +72,12 @@ class PersonaInjector:
         """
         return [
             {
-                "id": p["id"],
-                "nome": p["nome"],
-                "personalidade": p.get("personalidade", ""),
-                "nivel_stress": p.get("nivel_stress", "")
+                "id": r["id"],
+                "nome": r["nome"],
+                "personalidade": r["personalidade"],
+                "nivel_stress": r["nivel_stress"]
             }
-            for p in self.personas.values()
+            for r in self.personas.resumos()
         ]
     
     def obter_persona(self, persona_id: str) -> dict:
@@ -101,12 +94,13 @@ class PersonaInjector:
             ValueError: Se o ID não existir
         """
         if persona_id not in self.personas:
-            ids_validos = list(self.personas.keys())
+            ids_validos = self.personas.ids()
+            exemplos = ids_validos[:20] + (["..."] if len(ids_validos) > 20 else [])
             raise ValueError(
                 f"Persona '{persona_id}' não encontrada. "
-                f"IDs válidos: {ids_validos}"
+                f"IDs válidos ({len(ids_validos)}): {exemplos}"
             )
-        return self.personas[persona_id]
+        return self.personas.obter(persona_id)
     
     def _formatar_persona(self, persona: dict) -> str:
         """
@@ -211,102 +205,59 @@ class PersonaInjector:
         # Obter persona (valida se existe)
         persona = self.obter_persona(persona_id)
         
-        logger.info(f"Criando prompt com persona: {persona_id} ({persona['nome']})")
+        logger.debug("Criando prompt com persona: %s (%s)", persona_id, persona["nome"])
         
-        # Montar prompt final
+        # Montar prompt final, do mais estável ao mais variável: o prefixo
+        # (prompt de teste + instruções) é igual para todas as personas de uma
+        # bateria e é aproveitado pelo cache de prompt do provedor
         partes = []
         
-        # 1. Dados da persona
-        partes.append(self._formatar_persona(persona))
+        # 1. Prompt de teste (comum a todas as personas)
+        partes.append(seu_prompt.strip())
         
         # 2. Separador
-        partes.append("---\n")
+        partes.append("\n---\n")
         
-        # 3. Prompt de teste
-        partes.append(seu_prompt.strip())
+        # 3. Instruções gerais (texto fixo)
+        partes.append(INSTRUCOES_FINAIS)
         
         # 4. Separador
         partes.append("\n---\n")
         
-        # 5. Dados do cliente (se houver)
+        # 5. Dados da persona (fixos por persona)
+        if persona_id not in self._blocos_persona:
+            self._blocos_persona[persona_id] = self._formatar_persona(persona)
+        partes.append(self._blocos_persona[persona_id])
+        
+        # 6. Dados do cliente (se houver, sorteados a cada teste)
         if dados_opcionais:
             partes.append(self._formatar_dados_cliente(dados_opcionais))
         
-        # 6. Instruções finais
-        partes.append("""## INSTRUÇÕES FINAIS
-
-Você deve:
-1. Usar a PERSONA "{nome}" durante toda a conversa
-2. Seguir as instruções do PROMPT DE TESTE acima
-3. Ser natural - combine a persona com as instruções
-4. Manter o tom e padrões de linguagem da sua persona
-
-**COMECE AGORA!**""".format(nome=persona["nome"]))
+        partes.append("**COMECE AGORA!**")
         
         return "\n".join(partes)
 
 
 # Funções de conveniência para geração de dados
 
-# Listas de nomes brasileiros para uso quando faker não estiver disponível
-NOMES_BRASILEIROS = [
-    "João Silva", "Maria Santos", "Pedro Oliveira", "Ana Costa",
-    "Carlos Pereira", "Fernanda Lima", "Lucas Rodrigues", "Juliana Souza",
-    "Rafael Almeida", "Camila Ferreira", "Gustavo Ribeiro", "Larissa Martins",
-    "Bruno Carvalho", "Amanda Gomes", "Diego Barbosa", "Patrícia Rocha",
-    "Thiago Nascimento", "Vanessa Mendes", "Felipe Araújo", "Mariana Castro"
-]
-
-DDDS_BRASIL = [
-    "11", "21", "27", "31", "41", "47", "48", "51", "61", "62",
-    "71", "81", "82", "83", "84", "85", "86", "87", "88", "91"
-]
-
-
-def gerar_dados_cliente_aleatorios() -> dict:
+def gerar_dados_cliente_aleatorios(campos: Optional[Sequence[str]] = None) -> dict:
     """
     Gera dados fictícios de cliente brasileiro.
     
-    Tenta usar a biblioteca faker se disponível, caso contrário
-    usa listas internas de nomes brasileiros.
+    Sorteia um registro do pool pré-gerado (core.client_data), criado uma
+    única vez por processo; defina QA_CLIENT_DATA_SEED (ou use
+    `configurar_pool`) para execuções reproduzíveis.
+    
+    Args:
+        campos: Campos desejados entre nome, telefone, email, cpf e cidade
+                (padrão: nome, telefone e, às vezes, email)
     
     Returns:
-        dict: Dicionário com nome, telefone e opcionalmente email
+        dict: Dicionário com os dados do cliente
         
     Example:
         >>> dados = gerar_dados_cliente_aleatorios()
         >>> print(dados)
         {'nome': 'João Silva', 'telefone': '(27)99999-9999'}
     """
-    try:
-        from faker import Faker
-        fake = Faker("pt_BR")
-        
-        nome = fake.name()
-        ddd = random.choice(DDDS_BRASIL)
-        numero = fake.msisdn()[4:13]  # 9 dígitos
-        telefone = f"({ddd}){numero[:5]}-{numero[5:]}"
-        
-        dados = {
-            "nome": nome,
-            "telefone": telefone
-        }
-        
-        # 30% de chance de incluir email
-        if random.random() < 0.3:
-            dados["email"] = fake.email()
-        
-        return dados
-        
-    except ImportError:
-        logger.warning("Faker não instalado, usando dados internos")
-        
-        nome = random.choice(NOMES_BRASILEIROS)
-        ddd = random.choice(DDDS_BRASIL)
-        numero = "".join([str(random.randint(0, 9)) for _ in range(9)])
-        telefone = f"({ddd}){numero[:5]}-{numero[5:]}"
-        
-        return {
-            "nome": nome,
-            "telefone": telefone
-        }
+    return obter_pool().proximo(campos)
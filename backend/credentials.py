@@ -0,0 +1,91 @@
+"""
+Credentials - Chave da OpenAI por execução, sem alterar `os.environ`.
+
+Cada coleção tem a própria `openai_api_key`. Gravar a chave em
+`os.environ["OPENAI_API_KEY"]` faz execuções simultâneas de coleções
+diferentes usarem a chave uma da outra. Aqui a chave é passada
+explicitamente a cada `OpenAIChat`, e as conexões HTTP são reaproveitadas
+por chave (um `httpx.Client` por chave, com keep-alive), então várias
+coleções podem rodar ao mesmo tempo no mesmo processo.
+
+Sem chave explícita, vale a variável de ambiente OPENAI_API_KEY (como antes).
+
+O SDK da OpenAI (via agno.models.openai) e o httpx só são importados na
+criação do primeiro modelo/pool: importar este módulo não custa o ~1s do SDK.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    import httpx
+    from agno.models.openai import OpenAIChat
+
+logger = logging.getLogger(__name__)
+
+# Conexões por chave: cobre uma bateria/matriz com vários workers
+MAX_CONEXOES_POR_CHAVE = 32
+MAX_CONEXOES_OCIOSAS_POR_CHAVE = 16
+# Mesmos limites padrão do SDK da OpenAI
+TIMEOUT_HTTP_SEGUNDOS = 600.0
+TIMEOUT_CONEXAO_SEGUNDOS = 5.0
+
+_clientes: dict[str, "httpx.Client"] = {}
+_lock = threading.Lock()
+
+
+def _impressao(api_key: str) -> str:
+    """Identificador não reversível da chave (para índices e logs)."""
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:12]
+
+
+def http_client_para(api_key: str) -> "httpx.Client":
+    """Cliente HTTP compartilhado por todas as chamadas feitas com esta chave."""
+    import httpx
+
+    chave = _impressao(api_key)
+    with _lock:
+        cliente = _clientes.get(chave)
+        if cliente is None or cliente.is_closed:
+            logger.info("Criando pool HTTP para a chave %s", chave)
+            cliente = httpx.Client(
+                limits=httpx.Limits(
+                    max_connections=MAX_CONEXOES_POR_CHAVE,
+                    max_keepalive_connections=MAX_CONEXOES_OCIOSAS_POR_CHAVE
+                ),
+                timeout=httpx.Timeout(TIMEOUT_HTTP_SEGUNDOS, connect=TIMEOUT_CONEXAO_SEGUNDOS),
+                follow_redirects=True
+            )
+            _clientes[chave] = cliente
+        return cliente
+
+
+def criar_modelo(model_id: str, api_key: Optional[str] = None) -> "OpenAIChat":
+    """
+    OpenAIChat com a chave da execução e o pool HTTP dessa chave.
+
+    Args:
+        model_id: Modelo da OpenAI (ex: "gpt-4.1")
+        api_key: Chave da coleção (None = OPENAI_API_KEY do ambiente)
+
+    Example:
+        >>> Agent(model=criar_modelo("gpt-4.1", collection["openai_api_key"]), ...)
+    """
+    from agno.models.openai import OpenAIChat
+
+    api_key = api_key or os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        # O Agno acusa a falta de chave na primeira chamada, como antes
+        return OpenAIChat(id=model_id)
+    return OpenAIChat(id=model_id, api_key=api_key, http_client=http_client_para(api_key))
+
+
+def fechar_clientes() -> None:
+    """Fecha os pools HTTP (shutdown da aplicação)."""
+    with _lock:
+        for cliente in _clientes.values():
+            cliente.close()
+        _clientes.clear()
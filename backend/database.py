@@ -1,7 +1,8 @@
+import logging
 import os
-from supabase import create_client, Client
+import threading
 from pydantic import BaseModel
-from typing import Optional, List, Dict, Any
+from typing import TYPE_CHECKING, Optional, List, Dict, Any, Literal
 import uuid
 from datetime import datetime
 from dotenv import load_dotenv
@@ -9,12 +10,36 @@ from dotenv import load_dotenv
 # Load environment variables from .env file
 load_dotenv()
 
-# Initialize Supabase Client
-# Ensure SUPABASE_URL and SUPABASE_KEY are set in environment variables
-url: str = os.environ.get("SUPABASE_URL", "")
-key: str = os.environ.get("SUPABASE_KEY", "")
-
-supabase: Client = create_client(url, key)
+if TYPE_CHECKING:
+    from supabase import Client
+
+logger = logging.getLogger(__name__)
+
+# Cliente Supabase criado na primeira consulta (não no import): a API e os
+# workers sobem sem pagar o import do SDK, e importar este módulo não exige
+# SUPABASE_URL/SUPABASE_KEY
+_supabase: Optional["Client"] = None
+_supabase_lock = threading.Lock()
+
+
+def get_supabase() -> "Client":
+    """
+    Cliente Supabase do processo, criado no primeiro uso.
+
+    Raises:
+        RuntimeError: Se SUPABASE_URL ou SUPABASE_KEY não estiverem definidas
+    """
+    global _supabase
+    if _supabase is None:
+        with _supabase_lock:
+            if _supabase is None:
+                url = os.environ.get("SUPABASE_URL", "")
+                key = os.environ.get("SUPABASE_KEY", "")
+                if not url or not key:
+                    raise RuntimeError("Defina SUPABASE_URL e SUPABASE_KEY para acessar o banco")
+                from supabase import create_client
+                _supabase = create_client(url, key)
+    return _supabase
 
 # --- Pydantic Models for DB Operations ---
 
@@ -27,6 +52,12 @@ class CollectionCreate(BaseModel):
     max_turns: int = 20
     num_personas: int = 5
     subject_model: str = "gpt-4.1"  # Modelo OpenAI para o agente testado
+    # Orçamento por execução do loop (None = sem limite)
+    max_tokens: Optional[int] = None
+    max_cost_usd: Optional[float] = None
+    max_wall_seconds: Optional[float] = None
+    # Estratégia de histórico das conversas (nativo, completo, janela, tokens, resumo)
+    history_strategy: Optional[Literal["nativo", "completo", "janela", "tokens", "resumo"]] = None
 
 class CollectionUpdate(BaseModel):
     name: Optional[str] = None
@@ -37,6 +68,16 @@ class CollectionUpdate(BaseModel):
     max_turns: Optional[int] = None
     num_personas: Optional[int] = None
     subject_model: Optional[str] = None  # Modelo OpenAI para o agente testado
+    max_tokens: Optional[int] = None
+    max_cost_usd: Optional[float] = None
+    max_wall_seconds: Optional[float] = None
+    history_strategy: Optional[Literal["nativo", "completo", "janela", "tokens", "resumo"]] = None
+
+
+# Origem de um test_run: iteração do loop de otimização ou conversa de regressão
+# (workers). Só as do loop contam como iteração e servem de "última execução".
+KIND_LOOP = "loop"
+KIND_REGRESSION = "regression"
 
 
 class TestRunCreate(BaseModel):
@@ -47,9 +88,37 @@ class TestRunCreate(BaseModel):
     transcript: Optional[List[Dict[str, Any]]] = None
     evaluation_result: Optional[Dict[str, Any]] = None
     score: Optional[float] = None
+    kind: Literal["loop", "regression"] = KIND_LOOP
 
 # --- DB Functions ---
 
+# Colunas de collections que dependem de migrations opcionais
+# (subject_model, add_collection_budgets.sql, history_strategy)
+OPTIONAL_COLLECTION_COLUMNS = ("subject_model", "max_tokens", "max_cost_usd", "max_wall_seconds", "history_strategy")
+
+def _drop_missing_collection_columns(payload: Dict[str, Any], error: Exception) -> bool:
+    """Remove do payload as colunas opcionais que o banco não conhece.
+
+    Args:
+        payload: Dados enviados ao insert/update (alterado no lugar).
+        error: Exceção devolvida pelo Supabase.
+
+    Returns:
+        True se alguma coluna foi removida e vale tentar de novo.
+    """
+    message = str(error)
+    present = [c for c in OPTIONAL_COLLECTION_COLUMNS if c in payload]
+    missing = [c for c in present if c in message]
+    # PGRST204 sem nome de coluna reconhecível: descarta todas as opcionais
+    if not missing and "PGRST204" in message:
+        missing = present
+    if not missing:
+        return False
+    logger.warning("Colunas %s não encontradas em collections. Salvando sem elas.", missing)
+    for column in missing:
+        payload.pop(column, None)
+    return True
+
 def create_collection(data: CollectionCreate) -> Dict[str, Any]:
     payload = {
         "name": data.name,
@@ -61,45 +130,46 @@ def create_collection(data: CollectionCreate) -> Dict[str, Any]:
         "num_personas": data.num_personas,
         "subject_model": data.subject_model
     }
+    # Colunas opcionais só são enviadas quando definidas (migrations opcionais)
+    for optional_field in ("max_tokens", "max_cost_usd", "max_wall_seconds", "history_strategy"):
+        value = getattr(data, optional_field)
+        if value is not None:
+            payload[optional_field] = value
     try:
-        response = supabase.table("collections").insert(payload).execute()
+        response = get_supabase().table("collections").insert(payload).execute()
         return response.data[0]
     except Exception as e:
-        # Fallback: Se a coluna subject_model não existir, tenta salvar sem ela
-        if "subject_model" in str(e) or "PGRST204" in str(e):
-            print("AVISO: Coluna 'subject_model' não encontrada. Salvando sem preferencia de modelo.")
-            payload.pop("subject_model", None)
-            response = supabase.table("collections").insert(payload).execute()
+        # Fallback: sem as colunas opcionais (migrations não aplicadas), salva sem elas
+        if _drop_missing_collection_columns(payload, e):
+            response = get_supabase().table("collections").insert(payload).execute()
             return response.data[0]
         raise e
 
 def get_collections() -> List[Dict[str, Any]]:
-    response = supabase.table("collections").select("*").order("created_at", desc=True).execute()
+    response = get_supabase().table("collections").select("*").order("created_at", desc=True).execute()
     return response.data
 
 def get_collection_by_id(collection_id: str) -> Dict[str, Any]:
-    response = supabase.table("collections").select("*").eq("id", collection_id).single().execute()
+    response = get_supabase().table("collections").select("*").eq("id", collection_id).single().execute()
     return response.data
 
 def update_collection(collection_id: str, updates: Dict[str, Any]) -> Dict[str, Any]:
     try:
-        response = supabase.table("collections").update(updates).eq("id", collection_id).execute()
+        response = get_supabase().table("collections").update(updates).eq("id", collection_id).execute()
         return response.data[0]
     except Exception as e:
-        # Fallback: Se a coluna subject_model não existir, tenta atualizar sem ela
-        if "subject_model" in str(e) or "PGRST204" in str(e):
-            print("AVISO: Coluna 'subject_model' não encontrada. Atualizando sem preferencia de modelo.")
-            updates.pop("subject_model", None)
-            response = supabase.table("collections").update(updates).eq("id", collection_id).execute()
+        # Fallback: mesmo tratamento do insert para colunas opcionais ausentes
+        if _drop_missing_collection_columns(updates, e):
+            response = get_supabase().table("collections").update(updates).eq("id", collection_id).execute()
             return response.data[0]
         raise e
 
 def delete_collection(collection_id: str) -> None:
-    supabase.table("collections").delete().eq("id", collection_id).execute()
+    get_supabase().table("collections").delete().eq("id", collection_id).execute()
 
 
 def create_test_run(data: TestRunCreate) -> Dict[str, Any]:
-    response = supabase.table("test_runs").insert({
+    payload = {
         "collection_id": data.collection_id,
         "iteration": data.iteration,
         "status": data.status,
@@ -107,15 +177,47 @@ def create_test_run(data: TestRunCreate) -> Dict[str, Any]:
         "transcript": data.transcript,
         "evaluation_result": data.evaluation_result,
         "score": data.score
-    }).execute()
+    }
+    # kind só é enviado fora do padrão: runs do loop não dependem da migration
+    if data.kind != KIND_LOOP:
+        payload["kind"] = data.kind
+    try:
+        response = get_supabase().table("test_runs").insert(payload).execute()
+    except Exception as e:
+        # Fallback: sem a coluna kind, a origem fica marcada em metrics (ver run_kind)
+        if "kind" in payload and ("kind" in str(e) or "PGRST204" in str(e)):
+            logger.warning("Coluna 'kind' não encontrada. Marcando a origem do test_run em metrics.")
+            payload["metrics"] = {"kind": payload.pop("kind")}
+            response = get_supabase().table("test_runs").insert(payload).execute()
+        else:
+            raise e
     return response.data[0]
 
 def update_test_run(run_id: str, updates: Dict[str, Any]) -> Dict[str, Any]:
-    response = supabase.table("test_runs").update(updates).eq("id", run_id).execute()
+    try:
+        response = get_supabase().table("test_runs").update(updates).eq("id", run_id).execute()
+    except Exception as e:
+        # Fallback: Se a coluna metrics não existir, tenta atualizar sem ela
+        if "metrics" in updates and ("metrics" in str(e) or "PGRST204" in str(e)):
+            logger.warning("Coluna 'metrics' não encontrada. Atualizando sem métricas de LLM.")
+            updates = {k: v for k, v in updates.items() if k != "metrics"}
+            if not updates:
+                return {"id": run_id}
+            response = get_supabase().table("test_runs").update(updates).eq("id", run_id).execute()
+        else:
+            raise e
     if response.data:
         return response.data[0]
     return {"id": run_id, **updates}
 
 def get_collection_runs(collection_id: str) -> List[Dict[str, Any]]:
-    response = supabase.table("test_runs").select("*").eq("collection_id", collection_id).order("iteration", desc=False).execute()
+    response = get_supabase().table("test_runs").select("*").eq("collection_id", collection_id).order("iteration", desc=False).execute()
     return response.data
+
+def run_kind(run: Dict[str, Any]) -> str:
+    """Origem do test_run: coluna kind ou, em bancos sem a migration, a marca em metrics."""
+    return run.get("kind") or (run.get("metrics") or {}).get("kind") or KIND_LOOP
+
+def loop_runs(runs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Só as iterações do loop de otimização (sem as conversas de regressão), na mesma ordem."""
+    return [run for run in runs if run_kind(run) == KIND_LOOP]
@@ -0,0 +1,358 @@
+"""
+Judge - Montagem dos pedidos ao agente juiz e interpretação das respostas.
+
+Pedido: `montar_pedido_juiz` é o único construtor usado pela bateria de
+personas e pelo loop de otimização. A rubrica fica nas instruções do agente
+(prompt_judge_agent.md); a mensagem segue sempre a mesma ordem de seções,
+do mais estável (regras) ao mais variável (conversa), para que o início
+seja idêntico entre chamadas e aproveitado pelo cache de prompt do provedor.
+
+Resposta:
+o juiz deveria devolver um `EvaluationResult` estruturado, mas na prática
+pode responder com texto: JSON dentro de bloco ```json, texto antes/depois,
+mais de um objeto, vírgulas sobrando, aspas tipográficas ou JSON truncado.
+Cada avaliação perdida é uma chamada de juiz desperdiçada, então:
+
+1. Objetos Pydantic/dict são validados diretamente
+2. Texto passa por um extrator de uma só passada (blocos cercados primeiro,
+   depois objetos `{...}` balanceados, ignorando chaves dentro de strings)
+3. Candidatos que não parseiam recebem reparos leves e são tentados de novo
+4. Só se nada disso produzir uma avaliação válida é feita UMA chamada de
+   reparo ao juiz, com o erro e a resposta anterior
+"""
+
+import json
+import logging
+import re
+from dataclasses import dataclass
+from typing import Any, Iterator, Optional
+
+from pydantic import BaseModel, ValidationError
+
+from models import EvaluationResult
+from telemetry import LLMTracer
+
+logger = logging.getLogger(__name__)
+
+# Caracteres da resposta anterior reenviados na chamada de reparo
+MAX_CHARS_REPARO = 12000
+# Recuos (membros descartados) tentados ao reparar um JSON truncado
+MAX_RECUOS_TRUNCADO = 10
+
+_RE_BLOCO_CERCADO = re.compile(r"```(?:json|JSON)?\s*\n?(.*?)```", re.DOTALL)
+_RE_VIRGULA_FINAL = re.compile(r",\s*([}\]])")
+_RE_LITERAIS_PYTHON = re.compile(r"([:\[,]\s*)(True|False|None)\b")
+_LITERAIS_JSON = {"True": "true", "False": "false", "None": "null"}
+_ASPAS_TIPOGRAFICAS = str.maketrans({"“": '"', "”": '"', "„": '"', "‘": "'", "’": "'"})
+# Chaves que às vezes embrulham a avaliação ({"avaliacao": {...}})
+_CHAVES_ENVELOPE = ("avaliacao", "evaluation", "resultado", "result")
+
+
+@dataclass
+class ResultadoJuiz:
+    """
+    Resultado da interpretação de uma resposta do juiz.
+
+    Attributes:
+        avaliacao: Avaliação validada (None se não foi possível validar)
+        dados: Melhor objeto JSON encontrado, mesmo que não valide
+        erro: Motivo da falha (None quando `avaliacao` existe)
+        reparado: True se foi necessária a chamada de reparo ao juiz
+    """
+    avaliacao: Optional[EvaluationResult] = None
+    dados: Optional[dict] = None
+    erro: Optional[str] = None
+    reparado: bool = False
+
+    def como_dict(self) -> Optional[dict]:
+        """
+        Avaliação como dict. Sem avaliação válida, devolve o objeto bruto se
+        ao menos trouxer "scores" (melhor aproveitar parcialmente do que perder).
+        """
+        if self.avaliacao is not None:
+            return self.avaliacao.model_dump()
+        if isinstance(self.dados, dict) and isinstance(self.dados.get("scores"), dict):
+            return self.dados
+        return None
+
+
+def montar_pedido_juiz(
+    transcricao: str,
+    cenario: str,
+    regras: str = "",
+    persona_id: Optional[str] = None,
+    persona_nome: Optional[str] = None,
+    total_turnos: Optional[int] = None
+) -> str:
+    """
+    Monta a mensagem de avaliação enviada ao juiz.
+
+    As seções seguem a entrada descrita na rubrica (REGRAS DO AGENTE,
+    CENÁRIO DO TESTE, CONVERSA COMPLETA). Regras vêm primeiro por serem
+    iguais em todas as conversas de uma bateria/coleção.
+
+    Args:
+        transcricao: Conversa já formatada (ver ContextWindow.transcricao_para_juiz)
+        cenario: Nome do cenário/prompt de teste
+        regras: Regras (prompt) do agente avaliado
+        persona_id: ID da persona usada no teste (opcional)
+        persona_nome: Nome da persona (opcional)
+        total_turnos: Número de mensagens da conversa (opcional)
+
+    Example:
+        >>> pedido = montar_pedido_juiz(transcricao, "sofia_teste_001.md", regras_sofia,
+        ...                             persona_id="PERSONA_010", persona_nome="O Apressado")
+    """
+    linhas_cenario = [f"Cenário: {cenario}"]
+    if persona_id or persona_nome:
+        persona = persona_nome or persona_id
+        if persona_id and persona_nome and persona_id != persona_nome:
+            persona = f"{persona_nome} ({persona_id})"
+        linhas_cenario.append(f"Persona: {persona}")
+    if total_turnos is not None:
+        linhas_cenario.append(f"Total de turnos: {total_turnos}")
+
+    return (
+        f"## REGRAS DO AGENTE\n{regras.strip() or '(não informadas)'}\n\n"
+        f"## CENÁRIO DO TESTE\n" + "\n".join(linhas_cenario) + "\n\n"
+        f"## CONVERSA COMPLETA\n{transcricao}\n\n"
+        "Analise esta conversa e forneça a avaliação no formato JSON especificado."
+    )
+
+
+def _objetos_balanceados(texto: str) -> Iterator[str]:
+    """
+    Percorre o texto uma vez e gera cada trecho `{...}` de nível superior.
+
+    Chaves dentro de strings JSON não contam. Um objeto aberto e não fechado
+    no fim do texto (resposta truncada) também é gerado, para o reparo.
+    """
+    profundidade = 0
+    inicio = -1
+    em_string = False
+    escape = False
+    for i, ch in enumerate(texto):
+        if profundidade and em_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                em_string = False
+            continue
+        if ch == '"' and profundidade:
+            em_string = True
+        elif ch == "{":
+            if profundidade == 0:
+                inicio = i
+            profundidade += 1
+        elif ch == "}" and profundidade:
+            profundidade -= 1
+            if profundidade == 0:
+                yield texto[inicio:i + 1]
+    if profundidade:
+        yield texto[inicio:]
+
+
+def _fechar_estruturas(texto: str) -> tuple[str, list[int]]:
+    """
+    Fecha string e estruturas abertas no fim do texto.
+
+    Returns:
+        (texto fechado, posições de corte: vírgulas e aberturas fora de strings)
+    """
+    pilha = []
+    cortes = []
+    em_string = False
+    escape = False
+    for i, ch in enumerate(texto):
+        if em_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                em_string = False
+        elif ch == '"':
+            em_string = True
+        elif ch in "{[":
+            pilha.append("}" if ch == "{" else "]")
+            cortes.append(i + 1)
+        elif ch in "}]" and pilha:
+            pilha.pop()
+        elif ch == ",":
+            cortes.append(i)
+    if em_string:
+        texto += '"'
+    texto = texto.rstrip().rstrip(",")
+    if texto.endswith(":"):
+        texto += " null"
+    return texto + "".join(reversed(pilha)), cortes
+
+
+def reparar_json(trecho: str) -> str:
+    """
+    Reparos leves em um trecho JSON quase válido.
+
+    - Aspas tipográficas -> aspas retas
+    - True/False/None -> true/false/null
+    - Vírgulas antes de } ou ]
+    - Resposta truncada: fecha o que ficou aberto; se ainda for inválido,
+      recua até o último membro completo (vírgula ou abertura anterior)
+    """
+    texto = trecho.translate(_ASPAS_TIPOGRAFICAS).strip()
+    texto = _RE_LITERAIS_PYTHON.sub(lambda m: m.group(1) + _LITERAIS_JSON[m.group(2)], texto)
+
+    fechado, cortes = _fechar_estruturas(texto)
+    fechado = _RE_VIRGULA_FINAL.sub(r"\1", fechado)
+    for corte in [None] + list(reversed(cortes))[:MAX_RECUOS_TRUNCADO]:
+        if corte is not None:
+            fechado = _RE_VIRGULA_FINAL.sub(r"\1", _fechar_estruturas(texto[:corte])[0])
+        try:
+            json.loads(fechado)
+            return fechado
+        except json.JSONDecodeError:
+            continue
+    return _RE_VIRGULA_FINAL.sub(r"\1", _fechar_estruturas(texto)[0])
+
+
+def extrair_objetos_json(texto: str) -> list[Any]:
+    """
+    Todos os objetos JSON que puderem ser lidos do texto, na ordem.
+
+    Blocos ```json têm prioridade; depois, objetos soltos no texto. Trechos
+    inválidos passam por `reparar_json` antes de serem descartados.
+    """
+    trechos = [bloco for bloco in _RE_BLOCO_CERCADO.findall(texto)]
+    trechos.extend(_objetos_balanceados(texto))
+
+    objetos = []
+    vistos = set()
+    for trecho in trechos:
+        trecho = trecho.strip()
+        if not trecho or trecho in vistos:
+            continue
+        vistos.add(trecho)
+        try:
+            objetos.append(json.loads(trecho))
+            continue
+        except json.JSONDecodeError:
+            pass
+        try:
+            objetos.append(json.loads(reparar_json(trecho)))
+        except json.JSONDecodeError:
+            continue
+    return objetos
+
+
+def _desembrulhar(obj: Any) -> Any:
+    if isinstance(obj, dict) and "scores" not in obj:
+        for chave in _CHAVES_ENVELOPE:
+            interno = obj.get(chave)
+            if isinstance(interno, dict) and "scores" in interno:
+                return interno
+    return obj
+
+
+def interpretar_avaliacao(conteudo: Any) -> ResultadoJuiz:
+    """
+    Converte a resposta do juiz (modelo, dict ou texto) em EvaluationResult.
+
+    Entre vários objetos no texto, o primeiro que valida vence; se nenhum
+    validar, `dados` guarda o primeiro que tenha "scores" (ou o primeiro).
+
+    Example:
+        >>> r = interpretar_avaliacao('Segue:\\n```json\\n{"scores": ...}\\n```')
+        >>> r.avaliacao.scores.score_geral
+    """
+    if isinstance(conteudo, EvaluationResult):
+        return ResultadoJuiz(avaliacao=conteudo, dados=conteudo.model_dump())
+    if isinstance(conteudo, BaseModel):
+        conteudo = conteudo.model_dump()
+
+    if isinstance(conteudo, dict):
+        candidatos = [conteudo]
+    elif isinstance(conteudo, str):
+        candidatos = extrair_objetos_json(conteudo)
+    else:
+        return ResultadoJuiz(erro=f"Resposta do juiz de tipo inesperado: {type(conteudo).__name__}")
+
+    candidatos = [_desembrulhar(c) for c in candidatos if isinstance(c, dict)]
+    if not candidatos:
+        return ResultadoJuiz(erro="Nenhum objeto JSON encontrado na resposta do juiz")
+
+    primeiro_erro = None
+    for candidato in candidatos:
+        try:
+            return ResultadoJuiz(avaliacao=EvaluationResult.model_validate(candidato), dados=candidato)
+        except ValidationError as e:
+            primeiro_erro = primeiro_erro or e
+
+    dados = next((c for c in candidatos if "scores" in c), candidatos[0])
+    erros = "; ".join(
+        f"{'.'.join(str(p) for p in erro['loc'])}: {erro['msg']}"
+        for erro in primeiro_erro.errors()[:10]
+    )
+    return ResultadoJuiz(dados=dados, erro=f"JSON fora do formato EvaluationResult ({erros})")
+
+
+def _conteudo(resposta: Any) -> Any:
+    return resposta.content if hasattr(resposta, "content") else resposta
+
+
+def avaliar_com_reparo(
+    agente_juiz: Any,
+    mensagem: str,
+    tracer: Optional[LLMTracer] = None,
+    **rotulos
+) -> ResultadoJuiz:
+    """
+    Chama o juiz e interpreta a resposta; se não houver avaliação válida,
+    faz uma única chamada de reparo com o erro e a resposta anterior.
+
+    Args:
+        agente_juiz: Agente juiz
+        mensagem: Prompt de avaliação
+        tracer: Rastreador de chamadas (papéis "judge" e "judge_repair")
+        **rotulos: Rótulos das chamadas (persona_id, test_id...)
+
+    Returns:
+        ResultadoJuiz (com `reparado=True` se o reparo foi usado)
+    """
+    tracer = tracer or LLMTracer()
+    resposta = _conteudo(tracer.run(agente_juiz, mensagem, role="judge", **rotulos))
+    resultado = interpretar_avaliacao(resposta)
+    if resultado.avaliacao is not None or resposta in (None, ""):
+        return resultado
+
+    logger.warning("Avaliação do juiz inválida, solicitando reparo: %s", resultado.erro)
+    anterior = resposta if isinstance(resposta, str) else json.dumps(resultado.dados, ensure_ascii=False, default=str)
+    pedido_reparo = (
+        "Sua resposta anterior não pôde ser convertida no formato de avaliação exigido.\n"
+        f"Problema: {resultado.erro}\n\n"
+        f"## RESPOSTA ANTERIOR\n{anterior[:MAX_CHARS_REPARO]}\n\n"
+        "Responda APENAS com o objeto JSON corrigido e completo, sem texto adicional."
+    )
+    try:
+        reparo = _conteudo(tracer.run(agente_juiz, pedido_reparo, role="judge_repair", **rotulos))
+    except Exception as e:
+        logger.error("Chamada de reparo do juiz falhou: %s", e)
+        return resultado
+
+    reparado = interpretar_avaliacao(reparo)
+    reparado.reparado = True
+    if reparado.avaliacao is not None:
+        return reparado
+    if reparado.dados is None:
+        # O reparo piorou: mantém o que já havia sido extraído
+        resultado.reparado = True
+        return resultado
+    if isinstance(resultado.dados, dict):
+        # Reparo também parcial: mescla com a primeira resposta, sem perder o
+        # que só ela trouxe (ex: "scores" válidos que o reparo omitiu)
+        combinado = {**resultado.dados, **reparado.dados}
+        if isinstance(resultado.dados.get("scores"), dict) and not isinstance(reparado.dados.get("scores"), dict):
+            combinado["scores"] = resultado.dados["scores"]
+        reparado = interpretar_avaliacao(combinado)
+        reparado.reparado = True
+    return reparado
@@ -0,0 +1,235 @@
+"""
+Logs - Logging estruturado e sem bloqueio para API, workers e loop de turnos.
+
+- Contexto: `contexto_log(run_id=..., persona_id=...)` e `atualizar_contexto(turno=...)`
+  guardam os campos em uma ContextVar (isolada por thread e por task asyncio);
+  todo registro emitido dentro do bloco sai com eles, sem repetir nos textos.
+- Sem bloqueio: a thread que loga só enfileira o registro (QueueHandler em fila
+  limitada; com a fila cheia o registro é descartado e contado). A escrita no
+  stderr acontece em uma thread própria (QueueListener).
+- Amostragem: registros por turno (`extra=AMOSTRA_TURNO`) passam 1 a cada N,
+  conforme QA_LOG_TURNOS (padrão 0.1); WARNING e acima sempre passam.
+
+Os módulos só usam `logging.getLogger(__name__)` com formatação preguiçosa
+(`logger.info("Turno %d", turno)`); quem configura é o ponto de entrada
+(`main.py`, `python -m workers`) chamando `configurar_logging()`.
+
+Variáveis de ambiente:
+    QA_LOG_LEVEL   DEBUG/INFO/WARNING... (padrão INFO)
+    QA_LOG_FORMAT  texto ou json (uma linha JSON por registro)
+    QA_LOG_TURNOS  fração dos registros por turno mantidos (0 a 1)
+"""
+
+import atexit
+import copy
+import itertools
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Iterator, Optional, TextIO
+
+DEFAULT_NIVEL = "INFO"
+DEFAULT_FORMATO = "texto"
+DEFAULT_TAXA_TURNOS = 0.1
+TAMANHO_FILA = 10_000
+
+# `logger.info(..., extra=AMOSTRA_TURNO)`: registro por turno, sujeito à amostragem
+AMOSTRA_TURNO = {"amostrar": True}
+
+_contexto: ContextVar[dict] = ContextVar("qa_log_contexto", default={})
+
+
+@contextmanager
+def contexto_log(**campos) -> Iterator[None]:
+    """
+    Campos de contexto (run_id, persona_id, turno...) dos registros emitidos no bloco.
+
+    Campos None são ignorados; ao sair do bloco o contexto anterior volta.
+
+    Example:
+        >>> with contexto_log(collection_id=cid, run_id=run_id):
+        ...     logger.info("Avaliando")   # ... [collection_id=... run_id=...]
+    """
+    novos = {campo: valor for campo, valor in campos.items() if valor is not None}
+    token = _contexto.set({**_contexto.get(), **novos})
+    try:
+        yield
+    finally:
+        _contexto.reset(token)
+
+
+def atualizar_contexto(**campos) -> None:
+    """Atualiza campos do contexto atual (ex: turno) até o fim do `contexto_log` em volta."""
+    _contexto.set({**_contexto.get(), **campos})
+
+
+def contexto_atual() -> dict:
+    return dict(_contexto.get())
+
+
+class FiltroContexto(logging.Filter):
+    """Anexa o contexto atual ao registro (roda na thread que emitiu o log)."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.contexto = _contexto.get()
+        return True
+
+
+class FiltroAmostragem(logging.Filter):
+    """
+    Mantém 1 a cada N registros marcados com AMOSTRA_TURNO (N = 1/taxa).
+
+    Roda antes da formatação: os registros descartados não custam nada além
+    da criação do LogRecord.
+    """
+
+    def __init__(self, taxa: float = DEFAULT_TAXA_TURNOS):
+        super().__init__()
+        self.taxa = taxa
+        self._intervalo = max(1, round(1 / taxa)) if taxa > 0 else 0
+        self._contador = itertools.count()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not getattr(record, "amostrar", False) or record.levelno >= logging.WARNING:
+            return True
+        if not self._intervalo:
+            return False
+        return next(self._contador) % self._intervalo == 0
+
+
+class HandlerFila(logging.handlers.QueueHandler):
+    """QueueHandler que nunca bloqueia: com a fila cheia, descarta e conta."""
+
+    def __init__(self, fila: queue.Queue):
+        super().__init__(fila)
+        self.descartados = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.descartados += 1
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Resolve a mensagem e o traceback aqui (os args podem mudar depois), mas
+        # deixa o layout para o formatador da thread de escrita
+        record = copy.copy(record)
+        record.msg = record.message = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _texto_contexto(record: logging.LogRecord) -> str:
+    contexto = getattr(record, "contexto", None)
+    if not contexto:
+        return ""
+    return " [" + " ".join(f"{campo}={valor}" for campo, valor in contexto.items()) + "]"
+
+
+class FormatadorTexto(logging.Formatter):
+    """`2025-01-01 12:00:00,000 INFO tests.test_executor: mensagem [persona_id=... turno=3]`"""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    def formatMessage(self, record: logging.LogRecord) -> str:
+        return super().formatMessage(record) + _texto_contexto(record)
+
+
+class FormatadorJson(logging.Formatter):
+    """Uma linha JSON por registro, com os campos de contexto no primeiro nível."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        dados = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "nivel": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "processo": record.processName,
+            "thread": record.threadName,
+            **getattr(record, "contexto", {}),
+        }
+        if record.exc_text:
+            dados["exc"] = record.exc_text
+        return json.dumps(dados, ensure_ascii=False, default=str)
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_handler: Optional[HandlerFila] = None
+_pid: Optional[int] = None
+_lock = threading.Lock()
+
+
+def configurar_logging(
+    nivel: Optional[str] = None,
+    formato: Optional[str] = None,
+    taxa_turnos: Optional[float] = None,
+    stream: Optional[TextIO] = None
+) -> HandlerFila:
+    """
+    Instala o handler em fila no logger raiz (uma vez por processo).
+
+    Chamadas seguintes não fazem nada; em um processo filho (fork) a fila e a
+    thread de escrita são recriadas, porque a thread do pai não existe nele.
+
+    Args:
+        nivel: Nível do logger raiz (padrão: QA_LOG_LEVEL ou INFO)
+        formato: "texto" ou "json" (padrão: QA_LOG_FORMAT ou texto)
+        taxa_turnos: Fração dos registros por turno mantidos (padrão: QA_LOG_TURNOS ou 0.1)
+        stream: Destino (padrão: stderr)
+
+    Returns:
+        O handler instalado (`descartados` = registros perdidos com a fila cheia)
+    """
+    global _listener, _handler, _pid
+    with _lock:
+        if _handler is not None and _pid == os.getpid():
+            return _handler
+
+        raiz = logging.getLogger()
+        if _handler is not None:
+            # Herdado do processo pai: a fila e o listener pertencem a ele
+            raiz.removeHandler(_handler)
+
+        nivel = (nivel or os.getenv("QA_LOG_LEVEL", DEFAULT_NIVEL)).upper()
+        formato = formato or os.getenv("QA_LOG_FORMAT", DEFAULT_FORMATO)
+        if taxa_turnos is None:
+            taxa_turnos = float(os.getenv("QA_LOG_TURNOS", DEFAULT_TAXA_TURNOS))
+
+        saida = logging.StreamHandler(stream)
+        saida.setFormatter(FormatadorJson() if formato == "json" else FormatadorTexto())
+
+        fila: queue.Queue = queue.Queue(maxsize=TAMANHO_FILA)
+        handler = HandlerFila(fila)
+        handler.addFilter(FiltroAmostragem(taxa_turnos))
+        handler.addFilter(FiltroContexto())
+
+        raiz.addHandler(handler)
+        raiz.setLevel(nivel)
+        _listener = logging.handlers.QueueListener(fila, saida, respect_handler_level=True)
+        _listener.start()
+        _handler, _pid = handler, os.getpid()
+        return handler
+
+
+def encerrar_logging() -> None:
+    """Escreve os registros pendentes e para a thread de escrita."""
+    global _listener, _handler
+    with _lock:
+        if _handler is not None:
+            logging.getLogger().removeHandler(_handler)
+        if _listener is not None and _pid == os.getpid():
+            _listener.stop()
+        _listener = _handler = None
+
+
+atexit.register(encerrar_logging)
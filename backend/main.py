@@ -1,14 +1,13 @@
-import json
 import asyncio
-from typing import AsyncGenerator, Dict, Any
-import os
+import logging
+from typing import Dict, Any
 import uuid
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel
 
-from models import TestConfig, EvaluationResult
+from models import TestConfig, EvaluationResult, BatteryRunRequest, RegressionRunRequest
 from agents import create_subject_agent, create_evaluator_agent, create_judge_agent, AVAILABLE_MODELS
 from database import (
     create_collection, 
@@ -19,6 +18,9 @@ from database import (
     get_collection_runs,
     update_test_run, 
     get_collection_runs,
+    loop_runs,
+    run_kind,
+    KIND_REGRESSION,
     update_collection,
     delete_collection,
     CollectionCreate,
@@ -27,6 +29,21 @@ from database import (
 )
 
 from optimizer import create_optimizer_agent, generate_improved_prompt
+from judge import avaliar_com_reparo, montar_pedido_juiz
+from storage import get_storage_manager
+from credentials import fechar_clientes
+from telemetry import LLMTracer, METRICS
+from budget import BudgetTracker, RunBudget
+from core.context_window import ContextWindow
+from conversation import ConversationHook, ConversationRunner, EstadoConversa, LimiteOrcamento, Turno
+from tests.test_executor import executar_bateria_async, selecionar_personas
+from tests.aggregation import CriterioParada, MatrizScores
+from tests.history import abrir_historico
+from workers import fila_padrao, enfileirar_regressao
+from logs import atualizar_contexto, configurar_logging, encerrar_logging
+from sse import CanalSSE, resposta_sse
+
+logger = logging.getLogger(__name__)
 
 app = FastAPI(title="QA Master Backend")
 
@@ -38,10 +55,33 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+def setup_logging():
+    configurar_logging()
+
+@app.on_event("shutdown")
+def close_storage():
+    get_storage_manager().fechar()
+    fechar_clientes()
+    encerrar_logging()
+
 @app.get("/")
 def read_root():
     return {"message": "QA Master Backend está rodando"}
 
+@app.get("/api/health")
+def health_check():
+    """Verifica a saúde do storage dos agentes (pool de conexões)"""
+    storage = get_storage_manager().health_check()
+    if not storage["ok"]:
+        raise HTTPException(status_code=503, detail=storage)
+    return {"status": "ok", "storage": storage}
+
+@app.get("/api/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    """Métricas das chamadas LLM (latência, tokens, custo) no formato Prometheus"""
+    return PlainTextResponse(METRICS.render_prometheus(), media_type="text/plain; version=0.0.4")
+
 # --- Endpoint para listar modelos disponíveis ---
 
 @app.get("/api/models")
@@ -70,6 +110,23 @@ def get_collection(collection_id: str):
 def list_collection_runs(collection_id: str):
     return get_collection_runs(collection_id)
 
+@app.get("/api/collections/{collection_id}/stats")
+def collection_score_stats(collection_id: str):
+    """
+    Distribuição dos scores (média, desvio, percentis, IC) de todas as iterações avaliadas.
+
+    Conversas de regressão ficam em um grupo próprio ("<iteração>-regression"),
+    separadas da iteração do loop que testaram.
+    """
+    runs = get_collection_runs(collection_id)
+    matriz = MatrizScores.de_registros(
+        (f"{run['iteration']}-{KIND_REGRESSION}" if run_kind(run) == KIND_REGRESSION else str(run["iteration"]),
+         run["evaluation_result"]["scores"])
+        for run in runs
+        if (run.get("evaluation_result") or {}).get("scores")
+    )
+    return {"total_runs": len(matriz), "estatisticas": matriz.estatisticas()}
+
 @app.put("/api/collections/{collection_id}")
 def update_collection_endpoint(collection_id: str, data: CollectionUpdate):
     # Filter out None values
@@ -86,6 +143,19 @@ def delete_collection_endpoint(collection_id: str):
 
 # --- Endpoint de Otimização (Loop) ---
 
+class TurnosSSE(ConversationHook):
+    """Transmite cada turno da conversa (e o orçamento atualizado) no stream."""
+
+    def __init__(self, canal: CanalSSE, budget: BudgetTracker):
+        self.canal = canal
+        self.budget = budget
+
+    async def ao_turno(self, estado: EstadoConversa, turno: Turno) -> None:
+        await self.canal.enviar("message", role=turno.papel, content=turno.conteudo, duration_ms=round(turno.duracao_ms))
+        if not self.budget.budget.ilimitado:
+            await self.canal.enviar("budget", **self.budget.status())
+
+
 @app.post("/api/collections/{collection_id}/run")
 async def run_optimization_stream(collection_id: str):
     """
@@ -97,14 +167,13 @@ async def run_optimization_stream(collection_id: str):
     if not collection:
         raise HTTPException(status_code=404, detail="Collection not found")
 
-    # 2. Pega a chave do objeto 'collection' e disponibiliza para a biblioteca Agno
-    os.environ["OPENAI_API_KEY"] = collection["openai_api_key"]
-
-    async def event_generator() -> AsyncGenerator[str, None]:
+    # 2. A chave da coleção vai explicitamente em cada agente (config.openai_api_key);
+    #    os.environ não é alterado, então coleções diferentes rodam em paralelo
+    async def produtor(canal: CanalSSE) -> None:
         
-        # Recuperar histórico para saber qual iteração estamos
-        runs = get_collection_runs(collection_id)
-        current_iteration = len(runs) + 1
+        # Recuperar histórico para saber qual iteração estamos (regressões não contam)
+        runs = loop_runs(await asyncio.to_thread(get_collection_runs, collection_id))
+        current_iteration = max((run["iteration"] for run in runs), default=0) + 1
         
         # Determinar prompt inicial (se for 1ª iteração usa base, senão usa o último melhor ou o último gerado)
         # Lógica simplificada: usa o último gerado, ou o base.
@@ -122,130 +191,284 @@ async def run_optimization_stream(collection_id: str):
         TARGET_SCORE = 90
         
         iteration_count = 0
+        best_score = -1
+        best_subject_instruction = current_subject_instruction
+        # Prompt da iteração anterior: base dos diffs enviados ao cliente
+        previous_instruction = None
+
+        # Limites de tokens/custo/tempo da coleção (colunas opcionais)
+        budget = BudgetTracker(RunBudget.from_collection(collection))
+
+        async def budget_done(limit: str) -> None:
+            # O melhor prompt já foi enviado em alguma iteração: vai só a referência
+            await canal.enviar(
+                "done", reason="budget_exhausted", limit=limit, best_score=best_score,
+                **canal.prompt(best_subject_instruction, campo="best_prompt")
+            )
 
         while iteration_count < MAX_SAFETY_ITERATIONS:
             
-            yield f"data: {json.dumps({'type': 'status', 'content': f'Iniciando Iteração {current_iteration}...'})}\n\n"
+            exhausted = budget.esgotado()
+            if exhausted:
+                await canal.enviar("status", content=f"Orçamento esgotado ({exhausted}). Parando no melhor prompt (score {best_score}).")
+                await budget_done(exhausted)
+                break
+            
+            await canal.enviar("status", content=f"Iniciando Iteração {current_iteration}...")
             
             # --- SALVAR ESTADO INICIAL NO BANCO (Status Running) ---
-            created_run = create_test_run(TestRunCreate(
+            created_run = await asyncio.to_thread(create_test_run, TestRunCreate(
                 collection_id=collection_id,
                 iteration=current_iteration,
                 status="running",
                 subject_instruction=current_subject_instruction
             ))
             run_id = created_run["id"]
+            # A task produtora tem o próprio contexto: não vaza para outras requisições
+            atualizar_contexto(collection_id=collection_id, run_id=run_id, iteration=current_iteration)
+            tracer = LLMTracer(collection_id=collection_id, run_id=run_id, iteration=current_iteration)
+            budget.acompanhar(tracer)
             
             # Configuração para criar agentes
             config = TestConfig(
                 subject_instruction=current_subject_instruction,
                 evaluator_instruction=collection["base_evaluator_instruction"],
                 openai_api_key=collection["openai_api_key"],
-                max_turns=collection["max_turns"]
+                max_turns=collection["max_turns"],
+                history_strategy=collection.get("history_strategy")
             )
+            context = ContextWindow(config.history_strategy)
+
+            conversation = None
+
+            def run_metrics() -> dict:
+                metrics = {**tracer.resumo(detalhado=True), "contexto": context.economia()}
+                if conversation is not None:
+                    metrics["turnos"] = conversation.resumo_tempos()
+                return metrics
 
             # --- EXECUTAR TESTE (Mesma lógica do run_test_stream anterior) ---
             try:
                 # Usa o modelo selecionado na collection (ou gpt-4o por padrão)
                 model_id = collection.get("subject_model", "gpt-4o")
-                subject = create_subject_agent(config, model_id=model_id)
-                evaluator = create_evaluator_agent(config)
+                subject = create_subject_agent(config, model_id=model_id, collection_id=collection_id, run_id=run_id)
+                evaluator = create_evaluator_agent(config, collection_id=collection_id, run_id=run_id)
                 judge = create_judge_agent(config)
                 
-                transcript_str = ""
-                transcript_objs = []
-                last_message = "Comece a conversa."
-                sender = "evaluator" 
-
-                # Transmite que começou
-                yield f"data: {json.dumps({'type': 'iteration_start', 'iteration': current_iteration, 'prompt': current_subject_instruction})}\n\n"
-
-                for turn_i in range(config.max_turns * 2):
-                    if sender == "evaluator":
-                        agent = evaluator
-                        current_role = "evaluator"
-                        prompt = last_message if turn_i > 0 else "Inicie a conversa conforme as instruções. Seja conciso."
-                    else:
-                        agent = subject
-                        current_role = "subject"
-                        prompt = last_message
-
-                    response = agent.run(prompt)
-                    content = response.content
-                    
-                    last_message = content
-                    transcript_str += f"{current_role.upper()}: {content}\n\n"
-                    transcript_objs.append({"role": current_role, "content": content})
-                    
-                    # Yield realtime message (opcional, pode poluir se for muito rápido, mas legal para ver)
-                    yield f"data: {json.dumps({'type': 'message', 'role': current_role, 'content': content})}\n\n"
-                    
-                    sender = "subject" if sender == "evaluator" else "evaluator"
-                    await asyncio.sleep(0.1) # Rápido
+                # Transmite que começou (o prompt vai como diff da iteração anterior)
+                await canal.enviar(
+                    "iteration_start", iteration=current_iteration,
+                    **canal.prompt(current_subject_instruction, base=previous_instruction)
+                )
+
+                runner = ConversationRunner(
+                    evaluator, subject, tracer,
+                    abertura="Inicie a conversa conforme as instruções. Seja conciso.",
+                    max_mensagens=config.max_turns * 2,
+                    contexto=context,
+                    hooks=[LimiteOrcamento(budget), TurnosSSE(canal, budget)]
+                )
+                conversation = await runner.executar()
+                transcript_objs = conversation.transcricao
+
+                # Orçamento esgotado no meio da conversa: descarta a iteração e para
+                exhausted = conversation.interrupcao or budget.esgotado()
+                if exhausted:
+                    await asyncio.to_thread(update_test_run, run_id, {
+                        "status": "cancelled",
+                        "transcript": transcript_objs,
+                        "metrics": run_metrics()
+                    })
+                    await canal.enviar("status", content=f"Orçamento esgotado ({exhausted}) durante a conversa. Parando no melhor prompt (score {best_score}).")
+                    await budget_done(exhausted)
+                    break
 
                 # --- AVALIAÇÃO ---
-                yield f"data: {json.dumps({'type': 'status', 'content': 'Avaliando...'})}\n\n"
-                eval_response = judge.run(f"Transcrição:\n{transcript_str}")
-                result_data = eval_response.content
-                
-                if hasattr(result_data, "model_dump"):
-                    result_json = result_data.model_dump()
-                else:
-                    result_json = result_data if isinstance(result_data, dict) else {}
+                await canal.enviar("status", content="Avaliando...")
+                transcript_str = context.transcricao_para_juiz(transcript_objs)
+                judge_request = montar_pedido_juiz(
+                    transcript_str,
+                    cenario=collection.get("name") or "Loop de otimização",
+                    regras=current_subject_instruction,
+                    total_turnos=len(transcript_objs)
+                )
+                judged = await asyncio.to_thread(avaliar_com_reparo, judge, judge_request, tracer)
+                if judged.avaliacao is None:
+                    raise ValueError(f"Juiz não retornou uma avaliação válida: {judged.erro}")
+                result_data = judged.avaliacao
+                result_json = result_data.model_dump()
 
                 score = result_json.get("scores", {}).get("score_geral", 0)
 
                 # --- ATUALIZAR BANCO (Status Completed) ---
-                update_test_run(run_id, {
+                await asyncio.to_thread(update_test_run, run_id, {
                     "status": "completed",
                     "transcript": transcript_objs,
                     "evaluation_result": result_json,
-                    "score": score
+                    "score": score,
+                    "metrics": run_metrics()
                 })
                 
-                yield f"data: {json.dumps({'type': 'result', 'iteration': current_iteration, 'score': score, 'details': result_json})}\n\n"
+                await canal.enviar(
+                    "result", iteration=current_iteration, score=score, details=result_json,
+                    metrics=tracer.resumo(), context=context.economia()
+                )
 
                 # --- VERIFICAR CONDIÇÃO DE PARADA ---
                 if score >= TARGET_SCORE:
-                    yield f"data: {json.dumps({'type': 'status', 'content': f'Alvo atingido! Score {score} >= {TARGET_SCORE}. Parando.'})}\n\n"
-                    yield f"data: {json.dumps({'type': 'done', 'reason': 'target_reached'})}\n\n"
+                    await canal.enviar("status", content=f"Alvo atingido! Score {score} >= {TARGET_SCORE}. Parando.")
+                    await canal.enviar("done", reason="target_reached")
                     break
                 
                 # --- ATUALIZAR MELHOR PROMPT (Rastreamento Histórico) ---
-                # Inicializa na primeira iteração se necessário (fora do loop seria ideal, mas aqui tbm funciona)
-                if 'best_score' not in locals():
-                    best_score = -1
-                    best_subject_instruction = current_subject_instruction
-
                 if score > best_score:
                     best_score = score
                     best_subject_instruction = current_subject_instruction
-                    yield f"data: {json.dumps({'type': 'status', 'content': f'Novo melhor score: {score}!'})}\n\n"
+                    await canal.enviar("status", content=f"Novo melhor score: {score}!")
                 elif score < best_score:
-                     yield f"data: {json.dumps({'type': 'status', 'content': f'Score caiu ({score} < {best_score}). Otimizador usará o melhor histórico como referência.'})}\n\n"
+                    await canal.enviar("status", content=f"Score caiu ({score} < {best_score}). Otimizador usará o melhor histórico como referência.")
+
+                if not budget.budget.ilimitado:
+                    await canal.enviar("budget", **budget.status())
+                exhausted = budget.esgotado()
+                if exhausted:
+                    await canal.enviar("status", content=f"Orçamento esgotado ({exhausted}). Parando no melhor prompt (score {best_score}).")
+                    await budget_done(exhausted)
+                    break
 
                 # --- OTIMIZAÇÃO (Se não atingiu score) ---
-                yield f"data: {json.dumps({'type': 'status', 'content': 'Otimizando prompt...'})}\n\n"
+                await canal.enviar("status", content="Otimizando prompt...")
                 
                 # Passa o melhor prompt histórico para o otimizador usar de base comparativa
-                opt_agent = create_optimizer_agent(current_subject_instruction, result_data, best_prompt=best_subject_instruction)
+                opt_agent = create_optimizer_agent(current_subject_instruction, result_data, best_prompt=best_subject_instruction, api_key=config.openai_api_key)
+                
+                new_prompt = await asyncio.to_thread(
+                    generate_improved_prompt, opt_agent, current_subject_instruction, result_data,
+                    best_prompt=best_subject_instruction, tracer=tracer, api_key=config.openai_api_key
+                )
                 
-                new_prompt = generate_improved_prompt(opt_agent, current_subject_instruction, result_data, best_prompt=best_subject_instruction)
+                # Inclui as chamadas do otimizador/verificador nas métricas da iteração
+                await asyncio.to_thread(update_test_run, run_id, {"metrics": run_metrics()})
                 
+                # Diff contra o prompt atual; o iteration_start seguinte manda só a referência
+                await canal.enviar("optimization", **canal.prompt(new_prompt, base=current_subject_instruction, campo="new_prompt"))
+
+                previous_instruction = current_subject_instruction
                 current_subject_instruction = new_prompt
                 current_iteration += 1
                 iteration_count += 1
-                
-                yield f"data: {json.dumps({'type': 'optimization', 'new_prompt': new_prompt})}\n\n"
-                await asyncio.sleep(1) 
 
             except Exception as e:
-                print(f"Erro no loop: {e}")
-                update_test_run(run_id, {"status": "failed"})
-                yield f"data: {json.dumps({'type': 'error', 'content': str(e)})}\n\n"
+                logger.exception("Erro no loop de otimização")
+                await asyncio.to_thread(update_test_run, run_id, {"status": "failed", "metrics": run_metrics()})
+                await canal.enviar("error", content=str(e))
                 break
         
         else:
-            yield f"data: {json.dumps({'type': 'done', 'reason': 'max_iterations'})}\n\n"
+            await canal.enviar("done", reason="max_iterations")
+
+    return resposta_sse(produtor)
+
+
+# --- Endpoint de Bateria de Personas (Stream) ---
+
+@app.post("/api/collections/{collection_id}/battery")
+async def run_persona_battery_stream(collection_id: str, request: BatteryRunRequest):
+    """
+    Executa uma bateria de personas contra o prompt atual da coleção,
+    transmitindo cada evento (persona, turno, avaliação, agregado) via SSE.
+    """
+    collection = get_collection_by_id(collection_id)
+    if not collection:
+        raise HTTPException(status_code=404, detail="Collection not found")
+
+    # Testa o último prompt gerado pelo loop (ou o base)
+    runs = loop_runs(get_collection_runs(collection_id))
+    subject_instruction = runs[-1]["subject_instruction"] if runs else collection["base_subject_instruction"]
+
+    config = TestConfig(
+        subject_instruction=subject_instruction,
+        evaluator_instruction=collection["base_evaluator_instruction"],
+        openai_api_key=collection["openai_api_key"],
+        max_turns=request.max_turnos or collection["max_turns"],
+        history_strategy=collection.get("history_strategy")
+    )
+
+    async def produtor(canal: CanalSSE) -> None:
+        # asyncio.to_thread copia o contexto da task: os logs da bateria saem com a coleção
+        atualizar_contexto(collection_id=collection_id)
+        try:
+            subject = create_subject_agent(config, model_id=collection.get("subject_model", "gpt-4o"), collection_id=collection_id)
+            judge = create_judge_agent(config)
+
+            async for evento in executar_bateria_async(
+                prompt_teste=request.prompt_teste or config.evaluator_instruction,
+                num_personas=request.num_personas,
+                agente_alvo=subject,
+                agente_juiz=judge,
+                max_turnos=config.max_turns,
+                regras_agente=subject_instruction,
+                modo_selecao=request.modo_selecao,
+                persona_ids=request.persona_ids,
+                estrategia_historico=config.history_strategy,
+                api_key=config.openai_api_key,
+                historico=abrir_historico(),
+                collection_id=collection_id,
+                filtros_personas=request.filtro_personas.model_dump(exclude_none=True) if request.filtro_personas else None,
+                criterio_parada=CriterioParada(
+                    alvo=request.score_alvo,
+                    max_violacoes_criticas=request.max_violacoes_criticas
+                ) if request.score_alvo is not None else None
+            ):
+                await canal.enviar_dados(evento.to_dict())
+
+            await canal.enviar("done", reason="battery_complete")
+        except Exception as e:
+            logger.exception("Erro na bateria de personas")
+            await canal.enviar("error", content=str(e))
+
+    return resposta_sse(produtor)
+
+
+# --- Regressão distribuída (workers) ---
+
+@app.post("/api/collections/{collection_id}/regression")
+def enqueue_regression(collection_id: str, request: RegressionRunRequest):
+    """
+    Enfileira uma regressão do prompt atual da coleção para os workers
+    (`python -m workers`). Cada conversa vira um test_run, concluído pelo job do juiz.
+    """
+    collection = get_collection_by_id(collection_id)
+    if not collection:
+        raise HTTPException(status_code=404, detail="Collection not found")
 
-    return StreamingResponse(event_generator(), media_type="text/event-stream")
+    # Mesmo prompt (e iteração) da última iteração do loop, como a bateria; os
+    # test_runs criados levam kind="regression" e não contam como iteração
+    runs = loop_runs(get_collection_runs(collection_id))
+    subject_instruction = runs[-1]["subject_instruction"] if runs else collection["base_subject_instruction"]
+    iteration = runs[-1]["iteration"] if runs else 1
+
+    persona_ids = request.persona_ids or selecionar_personas(
+        request.num_personas, modo=request.modo_selecao,
+        historico=abrir_historico(), collection_id=collection_id,
+        filtros=request.filtro_personas.model_dump(exclude_none=True) if request.filtro_personas else None
+    )
+    job_ids = enfileirar_regressao(
+        fila_padrao(),
+        collection_id,
+        persona_ids,
+        subject_instruction=subject_instruction,
+        iteration=iteration,
+        prompts_teste=request.prompts_teste or [None],
+        max_turnos=request.max_turnos,
+        avaliar=request.avaliar
+    )
+    return {"jobs": job_ids, "iteration": iteration, "persona_ids": persona_ids}
+
+@app.get("/api/jobs/{job_id}")
+def get_job(job_id: str):
+    """Status e resultado de um job dos workers"""
+    job = fila_padrao().obter(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
@@ -0,0 +1,13 @@
+-- Migration: Adiciona colunas de orçamento na tabela collections
+-- Descrição: Limites de tokens, custo (USD) e tempo (segundos) por execução do loop de otimização
+-- Execute este SQL no Supabase SQL Editor
+
+ALTER TABLE collections 
+ADD COLUMN IF NOT EXISTS max_tokens INTEGER,
+ADD COLUMN IF NOT EXISTS max_cost_usd DOUBLE PRECISION,
+ADD COLUMN IF NOT EXISTS max_wall_seconds DOUBLE PRECISION;
+
+-- Comentários para documentação
+COMMENT ON COLUMN collections.max_tokens IS 'Máximo de tokens (entrada + saída) por execução do loop; NULL = sem limite';
+COMMENT ON COLUMN collections.max_cost_usd IS 'Custo estimado máximo (USD) por execução do loop; NULL = sem limite';
+COMMENT ON COLUMN collections.max_wall_seconds IS 'Duração máxima (segundos) por execução do loop; NULL = sem limite';
@@ -0,0 +1,9 @@
+-- Migration: Adiciona coluna history_strategy na tabela collections
+-- Descrição: Estratégia de histórico enviada aos agentes e ao juiz em conversas longas
+-- Execute este SQL no Supabase SQL Editor
+
+ALTER TABLE collections 
+ADD COLUMN IF NOT EXISTS history_strategy TEXT;
+
+-- Comentário para documentação
+COMMENT ON COLUMN collections.history_strategy IS 'Estratégia de histórico: nativo, completo, janela, tokens ou resumo (NULL = env QA_HISTORY_STRATEGY ou nativo)';
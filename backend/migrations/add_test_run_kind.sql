@@ -0,0 +1,9 @@
+-- Migration: Adiciona coluna kind na tabela test_runs
+-- Descrição: Origem do test_run - iteração do loop de otimização ('loop') ou conversa de regressão dos workers ('regression')
+-- Execute este SQL no Supabase SQL Editor
+
+ALTER TABLE test_runs 
+ADD COLUMN IF NOT EXISTS kind TEXT NOT NULL DEFAULT 'loop';
+
+-- Comentário para documentação
+COMMENT ON COLUMN test_runs.kind IS 'Origem do test_run: loop (iteração do loop de otimização) ou regression (conversa de regressão; não conta como iteração)';
@@ -0,0 +1,9 @@
+-- Migration: Adiciona coluna metrics na tabela test_runs
+-- Descrição: Armazena latência, tokens e custo de cada chamada LLM da iteração (por papel)
+-- Execute este SQL no Supabase SQL Editor
+
+ALTER TABLE test_runs 
+ADD COLUMN IF NOT EXISTS metrics JSONB;
+
+-- Comentário para documentação
+COMMENT ON COLUMN test_runs.metrics IS 'Métricas das chamadas LLM da iteração: total, por_papel (subject, evaluator, judge, optimizer, verifier) e chamadas individuais';
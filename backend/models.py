@@ -6,6 +6,7 @@ class TestConfig(BaseModel):
     evaluator_instruction: str = Field(..., description="Prompt de sistema do agente avaliador")
     openai_api_key: str = Field(..., description="Chave da API OpenAI para ambos os agentes")
     max_turns: int = Field(5, description="Número máximo de turnos de conversa")
+    history_strategy: Optional[str] = Field(None, description="Estratégia de histórico: nativo, completo, janela, tokens ou resumo")
 
 class ChatMessage(BaseModel):
     role: Literal["user", "assistant", "system", "evaluator", "subject"]
@@ -107,6 +108,11 @@ class PersonaTestResult(BaseModel):
     dados_cliente_usados: dict
     # Avaliação do juiz para este teste específico
     avaliacao: Optional[EvaluationResult] = None
+    # Tokens, custo e latência das chamadas LLM deste teste
+    metricas_llm: Optional[dict] = None
+    # Tokens de histórico economizados pela estratégia de contexto (conversa e juiz)
+    contexto: Optional[dict] = None
+    contexto_juiz: Optional[dict] = None
 
 class PersonaScoreSummary(BaseModel):
     """Resumo de scores de uma persona"""
@@ -125,11 +131,17 @@ class GeneralAnalysis(BaseModel):
     taxa_aprovacao: float
     score_medio_geral: float
     scores_medios: Scores
+    # Por dimensão: n, média, desvio, min/max, percentis e IC 95% (bootstrap)
+    estatisticas: Optional[dict] = None
+    # Personas ordenadas pelo score geral médio
+    ranking_personas: Optional[List[dict]] = None
     personas_com_melhor_desempenho: List[str]
     personas_com_pior_desempenho: List[str]
     pontos_fortes_recorrentes: List[str]
     pontos_fracos_recorrentes: List[str]
     recomendacoes_prioritarias: List[str]
+    # Achados agrupados por similaridade: representante, ocorrências, fontes e variantes
+    grupos_recorrentes: Optional[dict] = None
     conclusao: str
 
 class ConsolidatedTestResult(BaseModel):
@@ -147,3 +159,32 @@ class ConsolidatedTestResult(BaseModel):
     testes_detalhados: List[PersonaTestResult]
     # Análise geral consolidada
     analise_geral: GeneralAnalysis
+    # Tokens, custo e latência de todas as chamadas LLM da sessão
+    metricas_llm: Optional[dict] = None
+
+class PersonaFilter(BaseModel):
+    """Filtro do catálogo de personas (valores sem acentos/maiúsculas; listas = qualquer um, tags = todas)"""
+    personalidade: Optional[List[str]] = None
+    nivel_stress: Optional[List[str]] = None
+    tags: Optional[List[str]] = None
+
+class BatteryRunRequest(BaseModel):
+    """Parâmetros de uma bateria de personas disparada pela API (stream SSE)"""
+    prompt_teste: Optional[str] = Field(None, description="Cenário do testador (padrão: instrução base do avaliador da coleção)")
+    num_personas: int = Field(5, ge=1, description="Quantidade de personas (ignorado se persona_ids for informado)")
+    persona_ids: Optional[List[str]] = Field(None, description="IDs específicos de personas")
+    modo_selecao: Literal["aleatorio", "sequencial", "diversificado", "priorizado"] = "aleatorio"
+    filtro_personas: Optional[PersonaFilter] = Field(None, description="Restringe as personas sorteadas (ignorado se persona_ids for informado)")
+    max_turnos: Optional[int] = Field(None, ge=1, description="Máximo de turnos por conversa (padrão: max_turns da coleção)")
+    score_alvo: Optional[float] = Field(None, ge=0, le=100, description="Se informado, encerra a bateria quando o IC do score fica claramente acima/abaixo deste alvo")
+    max_violacoes_criticas: Optional[int] = Field(None, ge=1, description="Com score_alvo, reprova ao atingir este número de conversas com violação crítica")
+
+class RegressionRunRequest(BaseModel):
+    """Regressão enfileirada para os workers (uma conversa por cenário x persona, cada uma vira um test_run)"""
+    prompts_teste: Optional[List[str]] = Field(None, description="Cenários do testador (padrão: instrução base do avaliador da coleção)")
+    num_personas: int = Field(5, ge=1, description="Quantidade de personas (ignorado se persona_ids for informado)")
+    persona_ids: Optional[List[str]] = Field(None, description="IDs específicos de personas")
+    modo_selecao: Literal["aleatorio", "sequencial", "diversificado", "priorizado"] = "aleatorio"
+    filtro_personas: Optional[PersonaFilter] = Field(None, description="Restringe as personas sorteadas (ignorado se persona_ids for informado)")
+    max_turnos: Optional[int] = Field(None, ge=1, description="Máximo de turnos por conversa (padrão: max_turns da coleção)")
+    avaliar: bool = Field(True, description="Enfileirar a avaliação do juiz após cada conversa")
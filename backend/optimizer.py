@@ -1,13 +1,16 @@
-from agno.agent import Agent
-from agno.models.openai import OpenAIChat
+from typing import TYPE_CHECKING
+
+from agents import novo_agente
 from models import EvaluationResult
+from telemetry import LLMTracer
+from prompt_layout import bloco_estatico, montar_prompt
+from credentials import criar_modelo
 
-def create_optimizer_agent(current_prompt: str, evaluation_result: EvaluationResult, best_prompt: str = None) -> Agent:
-    """
-    Cria um agente projetado para otimizar o prompt do agente de teste com base no feedback.
-    """
-    
-    system_prompt = f"""
+if TYPE_CHECKING:
+    from agno.agent import Agent
+
+# System prompts fixos: idênticos em todas as iterações (prefixo cacheável)
+OPTIMIZER_SYSTEM_PROMPT = bloco_estatico("""
     Você é um Especialista Sênior em Engenharia de Prompt e Otimização de Comportamento de IA.
     
     SEU OBJETIVO:
@@ -38,20 +41,9 @@ def create_optimizer_agent(current_prompt: str, evaluation_result: EvaluationRes
     Apenas o TEXTO COMPLETO DO NOVO PROMPT. 
     NÃO inclua explicações, markdown de código (```) ou comentários.
     O prompt deve estar pronto para ser usado.
-    """
-
-    return Agent(
-        model=OpenAIChat(id="gpt-4.1"),
-        description="Você é o Otimizador de Prompts.",
-        instructions=[system_prompt],
-        markdown=False 
-    )
+    """)
 
-def create_verifier_agent() -> Agent:
-    """
-    Cria um agente verificador que garante que o prompt otimizado não perdeu informações do original.
-    """
-    system_prompt = f"""
+VERIFIER_SYSTEM_PROMPT = bloco_estatico("""
     Você é o Auditor de Integridade de Prompts.
     
     SEU OBJETIVO:
@@ -65,78 +57,96 @@ def create_verifier_agent() -> Agent:
     
     SAÍDA ESPERADA:
     Retorne APENAS o texto final do prompt corrigido/validado. NADA MAIS.
+    """)
+
+VERIFIER_TASK = """
+Verifique se o Prompt Gerado "esqueceu" ou resumiu partes importantes do Original.
+Se sim, REESCREVA o prompt completo restaurando o que falta, mas mantendo as melhorias feitas.
+Se não, retorne o Prompt Gerado exatamente como está.
+
+Retorne APENAS o prompt final.
+"""
+
+OPTIMIZER_TASK = """
+ATENÇÃO: Respeite rigorosamente as Regras de Preservação.
+Não remova nada. Apenas corrija o que falhou.
+"""
+
+
+def create_optimizer_agent(current_prompt: str, evaluation_result: EvaluationResult, best_prompt: str = None, api_key: str = None) -> "Agent":
     """
-    
-    return Agent(
-        model=OpenAIChat(id="gpt-4.1"),
+    Cria um agente projetado para otimizar o prompt do agente de teste com base no feedback.
+    api_key é a chave da coleção (None = OPENAI_API_KEY do ambiente).
+    """
+    return novo_agente(
+        model=criar_modelo("gpt-4.1", api_key),
+        description="Você é o Otimizador de Prompts.",
+        instructions=[OPTIMIZER_SYSTEM_PROMPT],
+        markdown=False 
+    )
+
+def create_verifier_agent(api_key: str = None) -> "Agent":
+    """
+    Cria um agente verificador que garante que o prompt otimizado não perdeu informações do original.
+    """
+    return novo_agente(
+        model=criar_modelo("gpt-4.1", api_key),
         description="Você é o Auditor de Prompts.",
-        instructions=[system_prompt],
+        instructions=[VERIFIER_SYSTEM_PROMPT],
         markdown=False
     )
 
-def verify_prompt_integrity(verifier: Agent, original_prompt: str, draft_prompt: str) -> str:
-    user_msg = f"""
-    --- PROMPT ORIGINAL ---
-    {original_prompt}
-    -----------------------
-    
-    --- PROMPT GERADO PELO OTIMIZADOR ---
-    {draft_prompt}
-    -------------------------------------
-    
-    Verifique se o Prompt Gerado "esqueceu" ou resumiu partes importantes do Original.
-    Se sim, REESCREVA o prompt completo restaurando o que falta, mas mantendo as melhorias feitas.
-    Se não, retorne o Prompt Gerado exatamente como está.
-    
-    Retorne APENAS o prompt final.
-    """
-    response = verifier.run(user_msg)
+def verify_prompt_integrity(verifier: "Agent", original_prompt: str, draft_prompt: str, tracer: LLMTracer = None) -> str:
+    # Instruções fixas primeiro; o original (já visto pelo otimizador) antes do rascunho
+    user_msg = montar_prompt(
+        [VERIFIER_TASK],
+        [
+            f"--- PROMPT ORIGINAL ---\n{original_prompt}\n-----------------------",
+            f"--- PROMPT GERADO PELO OTIMIZADOR ---\n{draft_prompt}\n-------------------------------------",
+        ]
+    )
+    tracer = tracer or LLMTracer()
+    response = tracer.run(verifier, user_msg, role="verifier")
     return response.content
 
-def generate_improved_prompt(optimizer_agent: Agent, current_prompt: str, evaluation_result: EvaluationResult, best_prompt: str = None) -> str:
+def generate_improved_prompt(optimizer_agent: "Agent", current_prompt: str, evaluation_result: EvaluationResult, best_prompt: str = None, tracer: LLMTracer = None, api_key: str = None) -> str:
     # 1. Gera o rascunho da otimização
-    feedback_str = f"""
-    --- RESULTADO DA AVALIAÇÃO DO ÚLTIMO TESTE ---
-    Score Geral: {evaluation_result.scores.score_geral}
-    Violações Críticas de Compliance: {evaluation_result.analise.compliance.violacoes_criticas}
-    Pontos Fracos: {evaluation_result.resumo.pontos_fracos}
-    Recomendações: {evaluation_result.resumo.recomendacoes}
-    ------------------------------
-    """
-    
+    # Ordem do mais estável ao mais variável: o melhor prompt histórico muda
+    # raramente, o prompt atual a cada iteração e a avaliação a cada chamada
     comparative_str = ""
     if best_prompt and best_prompt != current_prompt:
-        comparative_str = f"""
-        --- IMPORTANTE: CONTEXTO HISTÓRICO ---
-        Existe um prompt anterior que teve melhor performance (MELHOR HISTÓRICO).
-        Use-o como referência de qualidade se o prompt atual tiver perdido informações importantes.
-        
-        [INÍCIO DO MELHOR PROMPT HISTÓRICO]
-        {best_prompt}
-        [FIM DO MELHOR PROMPT HISTÓRICO]
-        --------------------------------------
-        """
-
-    user_message = f"""
-    --- PROMPT ATUAL (Que precisa ser melhorado) ---
-    {current_prompt}
-    --------------------
-    
-    {feedback_str}
+        comparative_str = f"""--- IMPORTANTE: CONTEXTO HISTÓRICO ---
+Existe um prompt anterior que teve melhor performance (MELHOR HISTÓRICO).
+Use-o como referência de qualidade se o prompt atual tiver perdido informações importantes.
 
-    {comparative_str}
-    
-    ATENÇÃO: Respeite rigorosamente as Regras de Preservação.
-    Não remova nada. Apenas corrija o que falhou.
-    
-    Gere o NOVO PROMPT OTIMIZADO COMPLETO:
-    """
+[INÍCIO DO MELHOR PROMPT HISTÓRICO]
+{best_prompt}
+[FIM DO MELHOR PROMPT HISTÓRICO]
+--------------------------------------"""
+
+    feedback_str = f"""--- RESULTADO DA AVALIAÇÃO DO ÚLTIMO TESTE ---
+Score Geral: {evaluation_result.scores.score_geral}
+Violações Críticas de Compliance: {evaluation_result.analise.compliance.violacoes_criticas}
+Pontos Fracos: {evaluation_result.resumo.pontos_fracos}
+Recomendações: {evaluation_result.resumo.recomendacoes}
+------------------------------"""
+
+    user_message = montar_prompt(
+        [OPTIMIZER_TASK],
+        [
+            comparative_str,
+            f"--- PROMPT ATUAL (Que precisa ser melhorado) ---\n{current_prompt}\n--------------------",
+            feedback_str,
+            "Gere o NOVO PROMPT OTIMIZADO COMPLETO:",
+        ]
+    )
     
-    draft_response = optimizer_agent.run(user_message)
+    tracer = tracer or LLMTracer()
+    draft_response = tracer.run(optimizer_agent, user_message, role="optimizer")
     draft_prompt = draft_response.content
     
     # 2. Verifica integridade (Auto-correção)
-    verifier = create_verifier_agent()
-    final_prompt = verify_prompt_integrity(verifier, current_prompt, draft_prompt)
+    verifier = create_verifier_agent(api_key=api_key)
+    final_prompt = verify_prompt_integrity(verifier, current_prompt, draft_prompt, tracer=tracer)
     
     return final_prompt
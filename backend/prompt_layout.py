@@ -0,0 +1,69 @@
+"""
+Prompt Layout - Montagem de prompts com prefixo estável para o cache do provedor.
+
+O cache de prompt da OpenAI reaproveita o maior prefixo idêntico (byte a byte,
+a partir de ~1024 tokens) entre chamadas. Para que ele funcione, cada papel
+monta suas mensagens na mesma ordem:
+
+1. Prefixo estático: rubrica do juiz, system prompts do otimizador/verificador,
+   prompt de teste + instruções gerais do testador. Lido/normalizado uma vez
+   e reutilizado exatamente igual em todas as chamadas
+2. Dados variáveis por último: persona, dados do cliente, transcrição,
+   prompt atual, resultado da avaliação
+
+A economia aparece em `cached_input_tokens` (ver telemetry.LLMTracer.resumo).
+"""
+
+import os
+import textwrap
+from functools import lru_cache
+from typing import Iterable
+
+PROMPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "prompts")
+SEPARADOR = "\n\n"
+
+
+def normalizar_bloco(texto: str) -> str:
+    """
+    Forma canônica de um bloco de texto: quebras de linha Unix, sem indentação
+    comum (f-strings indentadas no código), sem espaços no fim das linhas e
+    sem linhas vazias nas pontas.
+    """
+    texto = texto.replace("\r\n", "\n").replace("\r", "\n")
+    texto = textwrap.dedent(texto)
+    return "\n".join(linha.rstrip() for linha in texto.split("\n")).strip("\n")
+
+
+@lru_cache(maxsize=None)
+def bloco_estatico(texto: str) -> str:
+    """`normalizar_bloco` memoizado, para textos fixos reutilizados a cada chamada."""
+    return normalizar_bloco(texto)
+
+
+@lru_cache(maxsize=None)
+def carregar_prompt(nome: str) -> str:
+    """
+    Lê (uma única vez por processo) um prompt de `prompts/`.
+
+    Raises:
+        OSError: Se o arquivo não puder ser lido
+    """
+    with open(os.path.join(PROMPTS_DIR, nome), "r", encoding="utf-8") as f:
+        return normalizar_bloco(f.read())
+
+
+def montar_prompt(estatico: Iterable[str], variavel: Iterable[str] = ()) -> str:
+    """
+    Junta os blocos estáticos (na ordem dada) e depois os variáveis.
+
+    Blocos vazios são descartados. Os estáticos passam por `bloco_estatico`,
+    então o prefixo é idêntico sempre que os mesmos textos forem usados; os
+    variáveis (prompts do usuário, transcrições) só perdem as linhas vazias
+    das pontas.
+
+    Example:
+        >>> montar_prompt([INSTRUCOES_FIXAS], [f"Score: {score}"])
+    """
+    partes = [bloco_estatico(b) for b in estatico if b and b.strip()]
+    partes += [b.strip("\n") for b in variavel if b and b.strip()]
+    return SEPARADOR.join(partes)
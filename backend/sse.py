@@ -0,0 +1,199 @@
+"""
+SSE - Canal de Server-Sent Events dos endpoints de stream.
+
+O endpoint escreve eventos em um `CanalSSE` (`await canal.enviar("status", content=...)`)
+a partir de uma task produtora; a resposta HTTP consome a fila do canal.
+
+- Codificação: orjson quando instalado (fallback para json), uma vez por evento.
+- Heartbeat: sem eventos por `heartbeat` segundos, o canal envia um comentário
+  SSE (`: ping`), que mantém proxies e o navegador conectados sem `sleep`s.
+- Backpressure: a fila é limitada. Com um cliente lento, `enviar` espera
+  espaço (o produtor desacelera em vez de acumular memória); eventos
+  substituíveis (`budget`, que traz o estado completo) são descartados.
+- Prompts: `canal.prompt(texto)` devolve só a referência de um prompt que o
+  cliente já recebeu, um diff de linhas contra um prompt conhecido ou, quando
+  o diff não compensa, o texto completo (ver `aplicar_diff`).
+"""
+
+import asyncio
+import difflib
+import hashlib
+import json
+import logging
+import re
+from typing import AsyncIterator, Awaitable, Callable, Optional
+
+from fastapi.responses import StreamingResponse
+
+try:
+    import orjson
+except ImportError:  # orjson é opcional
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HEARTBEAT_SEGUNDOS = 15.0
+DEFAULT_TAMANHO_FILA = 64
+TIPOS_SUBSTITUIVEIS = frozenset({"budget"})
+PING = b": ping\n\n"
+
+_FIM = object()
+_LINHAS = re.compile(r"[^\n]*\n|[^\n]+")
+
+Produtor = Callable[["CanalSSE"], Awaitable[None]]
+
+
+def codificar(dados) -> bytes:
+    """JSON do evento (tipos desconhecidos viram str, como `json.dumps(default=str)`)."""
+    if orjson is not None:
+        return orjson.dumps(dados, default=str, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(dados, default=str, ensure_ascii=False).encode("utf-8")
+
+
+def quadro(dados) -> bytes:
+    """Quadro SSE `data: {...}` completo."""
+    return b"data: " + codificar(dados) + b"\n\n"
+
+
+def referencia_prompt(texto: str) -> str:
+    return hashlib.sha256(texto.encode("utf-8")).hexdigest()[:16]
+
+
+def _linhas(texto: str) -> list[str]:
+    # Mesma divisão do frontend (quebras de linha incluídas na linha)
+    return _LINHAS.findall(texto)
+
+
+def diff_linhas(base: str, novo: str) -> list:
+    """
+    Operações que transformam `base` em `novo`, linha a linha.
+
+    Returns:
+        [["=", n], ["-", n], ["+", [linhas...]], ...]: mantém n linhas da base,
+        pula n linhas da base, insere as linhas dadas
+    """
+    a, b = _linhas(base), _linhas(novo)
+    operacoes = []
+    for op, i1, i2, j1, j2 in difflib.SequenceMatcher(None, a, b, autojunk=False).get_opcodes():
+        if op == "equal":
+            operacoes.append(["=", i2 - i1])
+            continue
+        if i2 > i1:
+            operacoes.append(["-", i2 - i1])
+        if j2 > j1:
+            operacoes.append(["+", b[j1:j2]])
+    return operacoes
+
+
+def aplicar_diff(base: str, operacoes: list) -> str:
+    """Inverso de `diff_linhas` (o frontend implementa o mesmo)."""
+    linhas, saida, i = _linhas(base), [], 0
+    for op, valor in operacoes:
+        if op == "=":
+            saida += linhas[i:i + valor]
+            i += valor
+        elif op == "-":
+            i += valor
+        else:
+            saida += valor
+    return "".join(saida)
+
+
+class CanalSSE:
+    """
+    Fila limitada de eventos SSE entre uma task produtora e a resposta HTTP.
+
+    Args:
+        tamanho_fila: Eventos pendentes antes de o produtor esperar o cliente
+        heartbeat: Segundos sem eventos até enviar um `: ping`
+
+    Example:
+        >>> async def produtor(canal):
+        ...     await canal.enviar("status", content="Iniciando...")
+        >>> return resposta_sse(produtor)
+    """
+
+    def __init__(self, tamanho_fila: int = DEFAULT_TAMANHO_FILA, heartbeat: float = DEFAULT_HEARTBEAT_SEGUNDOS):
+        self._fila: asyncio.Queue = asyncio.Queue(maxsize=tamanho_fila)
+        self.heartbeat = heartbeat
+        self.descartados = 0
+        # Prompts que o cliente já tem (referência -> texto), para diffs e referências
+        self._prompts: dict[str, str] = {}
+
+    async def enviar(self, tipo: str, **dados) -> None:
+        """Enfileira um evento `{"type": tipo, **dados}` (espera se a fila estiver cheia)."""
+        await self.enviar_dados({"type": tipo, **dados})
+
+    async def enviar_dados(self, dados: dict) -> None:
+        """Enfileira um evento já montado (com a chave "type"), ex: `EventoBateria.to_dict()`."""
+        if dados.get("type") in TIPOS_SUBSTITUIVEIS and self._fila.full():
+            self.descartados += 1
+            return
+        await self._fila.put(quadro(dados))
+
+    def prompt(self, texto: str, base: Optional[str] = None, campo: str = "prompt") -> dict:
+        """
+        Campos do evento que levam `texto` ao cliente pelo menor caminho.
+
+        Args:
+            texto: Prompt a enviar
+            base: Prompt do qual `texto` deriva (diff, se o cliente já o tiver)
+            campo: Prefixo dos campos ("prompt" -> prompt_ref, prompt, prompt_base, prompt_diff)
+
+        Returns:
+            {campo_ref} se o cliente já tem o texto; {campo_ref, campo_base,
+            campo_diff} se o diff contra `base` for menor; senão {campo_ref, campo}
+        """
+        ref = referencia_prompt(texto)
+        if ref in self._prompts:
+            return {f"{campo}_ref": ref}
+        self._prompts[ref] = texto
+        if base is not None:
+            ref_base = referencia_prompt(base)
+            if ref_base in self._prompts:
+                operacoes = diff_linhas(base, texto)
+                if len(codificar(operacoes)) < len(texto.encode("utf-8")):
+                    return {f"{campo}_ref": ref, f"{campo}_base": ref_base, f"{campo}_diff": operacoes}
+        return {f"{campo}_ref": ref, campo: texto}
+
+    async def _produzir(self, produtor: Produtor) -> None:
+        try:
+            await produtor(self)
+        except Exception as e:
+            logger.exception("Erro no produtor do stream SSE")
+            await self.enviar("error", content=str(e))
+        await self._fila.put(_FIM)
+
+    async def transmitir(self, produtor: Produtor) -> AsyncIterator[bytes]:
+        """
+        Roda o produtor em uma task e entrega os quadros (com heartbeats).
+
+        Se o cliente desconectar, a task produtora é cancelada.
+        """
+        tarefa = asyncio.create_task(self._produzir(produtor))
+        try:
+            while True:
+                try:
+                    conteudo = await asyncio.wait_for(self._fila.get(), self.heartbeat)
+                except asyncio.TimeoutError:
+                    yield PING
+                    continue
+                if conteudo is _FIM:
+                    break
+                yield conteudo
+        finally:
+            if not tarefa.done():
+                tarefa.cancel()
+            if self.descartados:
+                logger.info("Stream SSE encerrado com %d eventos substituíveis descartados", self.descartados)
+
+
+def resposta_sse(produtor: Produtor, **kwargs) -> StreamingResponse:
+    """StreamingResponse SSE alimentada por `produtor(canal)` (kwargs vão para o CanalSSE)."""
+    canal = CanalSSE(**kwargs)
+    return StreamingResponse(
+        canal.transmitir(produtor),
+        media_type="text/event-stream",
+        # Sem buffer no proxy: cada evento sai assim que é produzido
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -0,0 +1,256 @@
+"""
+Storage Manager - Armazenamento de sessões/memórias dos agentes Agno.
+
+Substitui o antigo `PostgresDb` global de `agents.py` por um gerenciador que:
+- Cria UM engine SQLAlchemy com pool de conexões dimensionado explicitamente
+- Isola sessões e memórias por coleção/execução (user_id e session_id do Agno)
+- Expõe health check do banco
+- Usa SQLite local (um arquivo por escopo) quando o Postgres não está configurado,
+  evitando que execuções paralelas disputem ou poluam a mesma tabela de memória
+"""
+
+import logging
+import os
+import tempfile
+import threading
+from typing import Optional
+from urllib.parse import quote_plus
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Tabelas usadas pelo Agno (mantém o nome histórico da tabela de memórias)
+MEMORY_TABLE = "agent_memories"
+SESSION_TABLE = "agent_sessions"
+
+# Dimensionamento padrão do pool (sobrescrito por variáveis de ambiente)
+DEFAULT_POOL_SIZE = 5
+DEFAULT_MAX_OVERFLOW = 10
+DEFAULT_POOL_TIMEOUT = 30
+DEFAULT_POOL_RECYCLE = 1800
+
+
+def _montar_url_postgres() -> Optional[str]:
+    """Monta a URL do Postgres a partir das variáveis DB_* (ou None se incompletas)."""
+    db_user = os.getenv("DB_USER")
+    db_password = os.getenv("DB_PASSWORD")
+    db_host = os.getenv("DB_HOST")
+    db_port = os.getenv("DB_PORT", "5432")
+    db_name = os.getenv("DB_NAME", "postgres")
+
+    if not (db_user and db_password and db_host):
+        return None
+
+    encoded_password = quote_plus(db_password)
+    return f"postgresql://{db_user}:{encoded_password}@{db_host}:{db_port}/{db_name}"
+
+
+def escopo_sessao(
+    collection_id: Optional[str] = None,
+    run_id: Optional[str] = None,
+    role: Optional[str] = None
+) -> dict:
+    """
+    Gera os identificadores de escopo usados pelos agentes Agno.
+
+    Memórias ficam isoladas por coleção (user_id) e o histórico de cada
+    agente fica isolado por execução e papel (session_id).
+
+    Args:
+        collection_id: ID da coleção (opcional)
+        run_id: ID da execução/teste (opcional)
+        role: Papel do agente ("subject", "evaluator", ...)
+
+    Returns:
+        Dicionário com "user_id" e "session_id" (valores None quando não há escopo)
+
+    Example:
+        >>> escopo_sessao("col-1", "run-9", "subject")
+        {'user_id': 'collection:col-1', 'session_id': 'run-9:subject'}
+    """
+    user_id = f"collection:{collection_id}" if collection_id else None
+    session_id = None
+    if run_id:
+        session_id = f"{run_id}:{role}" if role else run_id
+    return {"user_id": user_id, "session_id": session_id}
+
+
+class StorageManager:
+    """
+    Gerencia o armazenamento dos agentes com pool de conexões e escopo por execução.
+
+    Com Postgres configurado (DB_USER/DB_PASSWORD/DB_HOST), todas as execuções
+    compartilham um único engine com pool explícito e são separadas por
+    user_id/session_id. Sem Postgres (ou com AGENT_STORAGE_BACKEND=sqlite),
+    cada escopo recebe seu próprio arquivo SQLite.
+
+    Attributes:
+        backend: "postgres" ou "sqlite"
+        sqlite_dir: Diretório dos arquivos SQLite de fallback
+
+    Example:
+        >>> storage = get_storage_manager()
+        >>> db = storage.db_para("collection-123")
+        >>> storage.health_check()["ok"]
+        True
+    """
+
+    def __init__(
+        self,
+        db_url: Optional[str] = None,
+        backend: Optional[str] = None,
+        pool_size: Optional[int] = None,
+        max_overflow: Optional[int] = None,
+        pool_timeout: Optional[int] = None,
+        pool_recycle: Optional[int] = None,
+        sqlite_dir: Optional[str] = None
+    ):
+        self.db_url = db_url or _montar_url_postgres()
+        backend = backend or os.getenv("AGENT_STORAGE_BACKEND")
+        if backend is None:
+            backend = "postgres" if self.db_url else "sqlite"
+        if backend not in ("postgres", "sqlite"):
+            raise ValueError(f"Backend de storage inválido: {backend}")
+        if backend == "postgres" and not self.db_url:
+            raise ValueError("Backend 'postgres' requer DB_USER, DB_PASSWORD e DB_HOST")
+        self.backend = backend
+
+        self.pool_size = pool_size or int(os.getenv("DB_POOL_SIZE", DEFAULT_POOL_SIZE))
+        self.max_overflow = max_overflow if max_overflow is not None else int(
+            os.getenv("DB_MAX_OVERFLOW", DEFAULT_MAX_OVERFLOW)
+        )
+        self.pool_timeout = pool_timeout or int(os.getenv("DB_POOL_TIMEOUT", DEFAULT_POOL_TIMEOUT))
+        self.pool_recycle = pool_recycle or int(os.getenv("DB_POOL_RECYCLE", DEFAULT_POOL_RECYCLE))
+        self.sqlite_dir = sqlite_dir or os.getenv(
+            "AGENT_SQLITE_DIR",
+            os.path.join(tempfile.gettempdir(), "qa_master_agents")
+        )
+
+        self._lock = threading.Lock()
+        self._engine = None
+        self._postgres_db = None
+        self._sqlite_dbs: dict[str, object] = {}
+
+    # --- Postgres (pool compartilhado) ---
+
+    def _obter_engine(self):
+        """Cria (uma única vez) o engine SQLAlchemy com pool dimensionado."""
+        if self._engine is None:
+            from sqlalchemy import create_engine
+
+            self._engine = create_engine(
+                self.db_url,
+                pool_size=self.pool_size,
+                max_overflow=self.max_overflow,
+                pool_timeout=self.pool_timeout,
+                pool_recycle=self.pool_recycle,
+                pool_pre_ping=True,
+            )
+            logger.info(
+                "Engine Postgres criado (pool_size=%s, max_overflow=%s)",
+                self.pool_size, self.max_overflow
+            )
+        return self._engine
+
+    def _obter_postgres_db(self):
+        if self._postgres_db is None:
+            from agno.db.postgres import PostgresDb
+
+            self._postgres_db = PostgresDb(
+                db_engine=self._obter_engine(),
+                memory_table=MEMORY_TABLE,
+                session_table=SESSION_TABLE,
+            )
+        return self._postgres_db
+
+    # --- SQLite (um arquivo por escopo) ---
+
+    def _caminho_sqlite(self, escopo: str) -> str:
+        nome_seguro = "".join(c if c.isalnum() or c in "-_" else "_" for c in escopo)
+        return os.path.join(self.sqlite_dir, f"{nome_seguro}.db")
+
+    def _obter_sqlite_db(self, escopo: str):
+        if escopo not in self._sqlite_dbs:
+            from agno.db.sqlite import SqliteDb
+
+            os.makedirs(self.sqlite_dir, exist_ok=True)
+            self._sqlite_dbs[escopo] = SqliteDb(
+                db_file=self._caminho_sqlite(escopo),
+                memory_table=MEMORY_TABLE,
+                session_table=SESSION_TABLE,
+            )
+        return self._sqlite_dbs[escopo]
+
+    # --- API pública ---
+
+    def db_para(self, escopo: Optional[str] = None):
+        """
+        Retorna o banco Agno a ser usado por agentes do escopo informado.
+
+        Args:
+            escopo: ID da coleção ou da execução. No Postgres o isolamento é
+                    feito por user_id/session_id; no SQLite cada escopo tem
+                    seu próprio arquivo.
+
+        Returns:
+            Instância de PostgresDb ou SqliteDb
+        """
+        with self._lock:
+            if self.backend == "postgres":
+                return self._obter_postgres_db()
+            return self._obter_sqlite_db(escopo or "default")
+
+    def health_check(self) -> dict:
+        """
+        Verifica a conectividade do storage.
+
+        Returns:
+            Dicionário com "ok", "backend" e, no Postgres, o estado do pool
+        """
+        if self.backend == "sqlite":
+            return {"ok": True, "backend": "sqlite", "dir": self.sqlite_dir}
+
+        try:
+            from sqlalchemy import text
+
+            engine = self._obter_engine()
+            with engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+            pool = engine.pool
+            return {
+                "ok": True,
+                "backend": "postgres",
+                "pool": {
+                    "size": pool.size(),
+                    "checked_out": pool.checkedout(),
+                    "overflow": pool.overflow(),
+                },
+            }
+        except Exception as e:
+            logger.error("Health check do storage falhou: %s", e)
+            return {"ok": False, "backend": "postgres", "erro": str(e)}
+
+    def fechar(self) -> None:
+        """Libera as conexões do pool (usado no shutdown da aplicação)."""
+        with self._lock:
+            if self._engine is not None:
+                self._engine.dispose()
+                self._engine = None
+                self._postgres_db = None
+            self._sqlite_dbs.clear()
+
+
+_storage_manager: Optional[StorageManager] = None
+_storage_lock = threading.Lock()
+
+
+def get_storage_manager() -> StorageManager:
+    """Retorna o StorageManager do processo (criado no primeiro uso)."""
+    global _storage_manager
+    with _storage_lock:
+        if _storage_manager is None:
+            _storage_manager = StorageManager()
+        return _storage_manager
@@ -0,0 +1,334 @@
+"""
+Telemetry - Instrumentação das chamadas aos agentes (LLM).
+
+Cada `agent.run` feito pelo executor, pelo loop de otimização e pelo otimizador
+passa por `LLMTracer.run`, que registra:
+- Papel (subject, evaluator, judge, judge_repair, optimizer, verifier)
+- Modelo, tokens de entrada/saída e custo estimado, separando a entrada lida
+  do cache de prompt do provedor da não cacheada (ver prompt_layout)
+- Latência e número de novas tentativas
+- Rótulos de contexto (persona, iteração, test_id)
+
+Os registros são consolidados no resultado de cada execução, na linha de
+`test_runs` (coluna `metrics`) e no registro global exposto em `/api/metrics`
+no formato texto do Prometheus.
+"""
+
+import logging
+import threading
+import time
+from dataclasses import dataclass, field, asdict
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+# Preço em USD por 1M de tokens: (entrada, entrada em cache, saída)
+PRECOS_POR_MILHAO = {
+    "gpt-5.2": (1.75, 0.175, 14.00),
+    "gpt-5.1": (1.25, 0.125, 10.00),
+    "gpt-5": (1.25, 0.125, 10.00),
+    "gpt-4.1": (2.00, 0.50, 8.00),
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+    "gpt-4-turbo": (10.00, 10.00, 30.00),
+    "gpt-4": (30.00, 30.00, 60.00),
+    "gpt-3.5-turbo": (0.50, 0.50, 1.50),
+    "o1": (15.00, 7.50, 60.00),
+    "o1-mini": (1.10, 0.55, 4.40),
+    "o1-preview": (15.00, 7.50, 60.00),
+    "o3-mini": (1.10, 0.55, 4.40),
+}
+
+# Limites (segundos) do histograma de latência
+BUCKETS_LATENCIA = (0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 30.0, 60.0)
+
+
+def calcular_custo(model: str, input_tokens: int, output_tokens: int, cached_input_tokens: int = 0) -> float:
+    """
+    Estima o custo (USD) de uma chamada a partir da tabela de preços.
+
+    Modelos fora da tabela têm custo 0 (tokens continuam sendo contabilizados).
+    """
+    precos = PRECOS_POR_MILHAO.get(model)
+    if precos is None:
+        return 0.0
+    preco_entrada, preco_cache, preco_saida = precos
+    nao_cacheados = max(0, input_tokens - cached_input_tokens)
+    return (
+        nao_cacheados * preco_entrada
+        + cached_input_tokens * preco_cache
+        + output_tokens * preco_saida
+    ) / 1_000_000
+
+
+@dataclass
+class LLMCall:
+    """Registro de uma chamada a um agente."""
+    role: str
+    model: str
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cached_input_tokens: int = 0
+    latency_s: float = 0.0
+    retries: int = 0
+    cost_usd: float = 0.0
+    error: Optional[str] = None
+    labels: dict = field(default_factory=dict)
+
+    @property
+    def total_tokens(self) -> int:
+        return self.input_tokens + self.output_tokens
+
+    @property
+    def uncached_input_tokens(self) -> int:
+        return max(0, self.input_tokens - self.cached_input_tokens)
+
+
+def _modelo_do_agente(agent: Any, response: Any = None) -> str:
+    model = getattr(response, "model", None)
+    if isinstance(model, str) and model:
+        return model
+    model_obj = getattr(agent, "model", None)
+    return getattr(model_obj, "id", None) or "desconhecido"
+
+
+def _tokens_da_resposta(response: Any) -> tuple[int, int, int]:
+    """Extrai (entrada, saída, entrada em cache) do `RunOutput.metrics` do Agno."""
+    metrics = getattr(response, "metrics", None)
+    if metrics is None:
+        return 0, 0, 0
+    if isinstance(metrics, dict):
+        get = metrics.get
+    else:
+        def get(chave, padrao=0):
+            return getattr(metrics, chave, padrao)
+    return (
+        int(get("input_tokens", 0) or 0),
+        int(get("output_tokens", 0) or 0),
+        int(get("cache_read_tokens", 0) or 0),
+    )
+
+
+class MetricsRegistry:
+    """
+    Agregador global (por processo) das chamadas, exportado para o Prometheus.
+
+    Séries:
+        qa_llm_calls_total{role,model,status}
+        qa_llm_tokens_total{role,model,kind}
+        qa_llm_cost_usd_total{role,model}
+        qa_llm_retries_total{role,model}
+        qa_llm_latency_seconds{role} (histograma)
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: dict[tuple, int] = {}
+        self._tokens: dict[tuple, int] = {}
+        self._cost: dict[tuple, float] = {}
+        self._retries: dict[tuple, int] = {}
+        self._latency: dict[str, list] = {}
+
+    def observar(self, call: LLMCall) -> None:
+        status = "error" if call.error else "ok"
+        with self._lock:
+            chave = (call.role, call.model)
+            self._calls[chave + (status,)] = self._calls.get(chave + (status,), 0) + 1
+            for kind, valor in (
+                ("input", call.input_tokens),
+                ("output", call.output_tokens),
+                ("cached_input", call.cached_input_tokens),
+                ("uncached_input", call.uncached_input_tokens),
+            ):
+                self._tokens[chave + (kind,)] = self._tokens.get(chave + (kind,), 0) + valor
+            self._cost[chave] = self._cost.get(chave, 0.0) + call.cost_usd
+            self._retries[chave] = self._retries.get(chave, 0) + call.retries
+
+            # Histograma: contagens por bucket + soma + total
+            hist = self._latency.setdefault(call.role, [[0] * len(BUCKETS_LATENCIA), 0.0, 0])
+            for i, limite in enumerate(BUCKETS_LATENCIA):
+                if call.latency_s <= limite:
+                    hist[0][i] += 1
+            hist[1] += call.latency_s
+            hist[2] += 1
+
+    def render_prometheus(self) -> str:
+        """Renderiza as séries no formato texto de exposição do Prometheus."""
+        def rotulos(**kwargs) -> str:
+            partes = []
+            for k, v in kwargs.items():
+                v = str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+                partes.append(f'{k}="{v}"')
+            return "{" + ",".join(partes) + "}"
+
+        linhas = []
+        with self._lock:
+            linhas.append("# HELP qa_llm_calls_total Chamadas aos agentes LLM")
+            linhas.append("# TYPE qa_llm_calls_total counter")
+            for (role, model, status), valor in sorted(self._calls.items()):
+                linhas.append(f"qa_llm_calls_total{rotulos(role=role, model=model, status=status)} {valor}")
+
+            linhas.append("# HELP qa_llm_tokens_total Tokens consumidos por tipo")
+            linhas.append("# TYPE qa_llm_tokens_total counter")
+            for (role, model, kind), valor in sorted(self._tokens.items()):
+                linhas.append(f"qa_llm_tokens_total{rotulos(role=role, model=model, kind=kind)} {valor}")
+
+            linhas.append("# HELP qa_llm_cost_usd_total Custo estimado em USD")
+            linhas.append("# TYPE qa_llm_cost_usd_total counter")
+            for (role, model), valor in sorted(self._cost.items()):
+                linhas.append(f"qa_llm_cost_usd_total{rotulos(role=role, model=model)} {valor:.6f}")
+
+            linhas.append("# HELP qa_llm_retries_total Novas tentativas após erro")
+            linhas.append("# TYPE qa_llm_retries_total counter")
+            for (role, model), valor in sorted(self._retries.items()):
+                linhas.append(f"qa_llm_retries_total{rotulos(role=role, model=model)} {valor}")
+
+            linhas.append("# HELP qa_llm_latency_seconds Latência das chamadas aos agentes")
+            linhas.append("# TYPE qa_llm_latency_seconds histogram")
+            for role, (buckets, soma, total) in sorted(self._latency.items()):
+                for limite, contagem in zip(BUCKETS_LATENCIA, buckets):
+                    linhas.append(f"qa_llm_latency_seconds_bucket{rotulos(role=role, le=limite)} {contagem}")
+                linhas.append(f"qa_llm_latency_seconds_bucket{rotulos(role=role, le='+Inf')} {total}")
+                linhas.append(f"qa_llm_latency_seconds_sum{rotulos(role=role)} {soma:.6f}")
+                linhas.append(f"qa_llm_latency_seconds_count{rotulos(role=role)} {total}")
+
+        return "\n".join(linhas) + "\n"
+
+
+METRICS = MetricsRegistry()
+
+
+class LLMTracer:
+    """
+    Rastreia as chamadas de uma execução (bateria, conversa ou iteração).
+
+    Args:
+        registry: Registro global a alimentar (padrão: METRICS)
+        **labels: Rótulos aplicados a todas as chamadas (ex: collection_id)
+
+    Example:
+        >>> tracer = LLMTracer(collection_id="abc")
+        >>> resposta = tracer.run(agente, "oi", role="subject", iteration=1)
+        >>> tracer.resumo()["total"]["calls"]
+        1
+    """
+
+    def __init__(self, registry: Optional[MetricsRegistry] = None, **labels):
+        self.registry = registry if registry is not None else METRICS
+        self.labels = labels
+        self.calls: list[LLMCall] = []
+        self._lock = threading.Lock()
+
+    def run(self, agent: Any, message: str, role: str, tentativas: int = 1, **labels) -> Any:
+        """
+        Executa `agent.run(message)` registrando latência, tokens e custo.
+
+        Args:
+            agent: Agente Agno (ou compatível com `.run`)
+            message: Mensagem enviada ao agente
+            role: Papel do agente nesta chamada
+            tentativas: Número máximo de tentativas em caso de exceção
+            **labels: Rótulos desta chamada (persona_id, iteration, test_id...)
+
+        Returns:
+            A resposta do agente (inalterada)
+
+        Raises:
+            A exceção da última tentativa, se todas falharem
+        """
+        inicio = time.perf_counter()
+        ultima_exc = None
+        response = None
+        tentativa = 0
+
+        for tentativa in range(max(1, tentativas)):
+            try:
+                response = agent.run(message)
+                ultima_exc = None
+                break
+            except Exception as e:
+                ultima_exc = e
+                logger.warning("Chamada %s falhou (tentativa %s/%s): %s", role, tentativa + 1, tentativas, e)
+
+        input_tokens, output_tokens, cached = _tokens_da_resposta(response)
+        model = _modelo_do_agente(agent, response)
+        call = LLMCall(
+            role=role,
+            model=model,
+            input_tokens=input_tokens,
+            output_tokens=output_tokens,
+            cached_input_tokens=cached,
+            latency_s=time.perf_counter() - inicio,
+            retries=tentativa,
+            cost_usd=calcular_custo(model, input_tokens, output_tokens, cached),
+            error=str(ultima_exc) if ultima_exc else None,
+            labels={**self.labels, **labels},
+        )
+        self.registrar(call)
+        logger.debug(
+            "Chamada %s (%s): %s tokens de entrada, %s do cache e %s sem cache",
+            role, model, input_tokens, cached, call.uncached_input_tokens
+        )
+
+        if ultima_exc is not None:
+            raise ultima_exc
+        return response
+
+    def registrar(self, call: LLMCall) -> None:
+        with self._lock:
+            self.calls.append(call)
+        self.registry.observar(call)
+
+    def resumo(self, detalhado: bool = False, **filtro) -> dict:
+        """
+        Consolida as chamadas (opcionalmente filtradas por rótulo) por papel.
+
+        Args:
+            detalhado: Se True, inclui a lista de chamadas individuais
+            **filtro: Rótulos que a chamada deve ter (ex: test_id="TEST_1")
+
+        Returns:
+            {"total": {...}, "por_papel": {role: {...}}} (+ "chamadas" se detalhado)
+        """
+        with self._lock:
+            calls = [
+                c for c in self.calls
+                if all(c.labels.get(k) == v for k, v in filtro.items())
+            ]
+
+        def somar(lista: list[LLMCall]) -> dict:
+            entrada = sum(c.input_tokens for c in lista)
+            cacheados = sum(c.cached_input_tokens for c in lista)
+            return {
+                "calls": len(lista),
+                "errors": sum(1 for c in lista if c.error),
+                "retries": sum(c.retries for c in lista),
+                "input_tokens": entrada,
+                "output_tokens": sum(c.output_tokens for c in lista),
+                "cached_input_tokens": cacheados,
+                "uncached_input_tokens": sum(c.uncached_input_tokens for c in lista),
+                "cache_hit_rate": round(cacheados / entrada, 4) if entrada else 0.0,
+                "total_tokens": sum(c.total_tokens for c in lista),
+                "cost_usd": round(sum(c.cost_usd for c in lista), 6),
+                "latency_s": round(sum(c.latency_s for c in lista), 3),
+            }
+
+        por_papel: dict[str, list[LLMCall]] = {}
+        for c in calls:
+            por_papel.setdefault(c.role, []).append(c)
+
+        resumo = {
+            "total": somar(calls),
+            "por_papel": {role: somar(lista) for role, lista in por_papel.items()},
+        }
+        if detalhado:
+            resumo["chamadas"] = [
+                {
+                    **asdict(c),
+                    "uncached_input_tokens": c.uncached_input_tokens,
+                    "latency_s": round(c.latency_s, 4),
+                    "cost_usd": round(c.cost_usd, 6),
+                }
+                for c in calls
+            ]
+        return resumo
@@ -10,9 +10,28 @@ from .test_executor import (
     executar_matriz_testes,
     selecionar_personas,
     executar_bateria_com_analise_juiz,
+    executar_bateria_stream,
+    executar_bateria_async,
+    AgregadorBateria,
+    retomar_bateria,
     DEFAULT_MAX_TURNOS,
     DEFAULT_NUM_PERSONAS
 )
+from .matrix_executor import ExecucaoMatriz, executar_matriz_stream
+from .events import (
+    EventoBateria,
+    PersonaIniciada,
+    TurnoConversa,
+    ConversaConcluida,
+    ConversaAvaliada,
+    AgregadoAtualizado,
+    ParadaAntecipada,
+    BateriaConcluida
+)
+from .aggregation import CriterioParada
+from .checkpoint import CheckpointStore, JsonlCheckpointStore, SqliteCheckpointStore, abrir_checkpoint
+from .batch_judge import ClienteBatch, ClienteBatchOpenAI, ClienteBatchLocal, JuizEmLote
+from .history import HistoricoPersonas, abrir_historico
 
 __all__ = [
     "detectar_fim_conversa",
@@ -21,6 +40,31 @@ __all__ = [
     "executar_matriz_testes",
     "selecionar_personas",
     "executar_bateria_com_analise_juiz",
+    "executar_bateria_stream",
+    "executar_bateria_async",
+    "AgregadorBateria",
+    "retomar_bateria",
+    "EventoBateria",
+    "PersonaIniciada",
+    "TurnoConversa",
+    "ConversaConcluida",
+    "ConversaAvaliada",
+    "AgregadoAtualizado",
+    "ParadaAntecipada",
+    "CriterioParada",
+    "BateriaConcluida",
+    "ExecucaoMatriz",
+    "executar_matriz_stream",
+    "CheckpointStore",
+    "JsonlCheckpointStore",
+    "SqliteCheckpointStore",
+    "abrir_checkpoint",
+    "ClienteBatch",
+    "ClienteBatchOpenAI",
+    "ClienteBatchLocal",
+    "JuizEmLote",
+    "HistoricoPersonas",
+    "abrir_historico",
     "DEFAULT_MAX_TURNOS",
     "DEFAULT_NUM_PERSONAS"
 ]
@@ -0,0 +1,383 @@
+"""
+Aggregation - Estatísticas vetorizadas dos scores do juiz.
+
+Os scores ficam em uma matriz NumPy colunar (testes x dimensões). Médias,
+desvios, percentis, intervalos de confiança por bootstrap e ranking por
+persona saem de operações em lote sobre a matriz, então agregar milhares
+de execuções históricas (dashboards de tendência) custa milissegundos.
+
+Scores ausentes são NaN e ignorados em todas as estatísticas.
+
+`CriterioParada` usa as mesmas estatísticas para encerrar uma bateria assim
+que o intervalo de confiança do score fica claramente acima ou abaixo do alvo.
+"""
+
+import math
+import warnings
+from contextlib import contextmanager
+from dataclasses import dataclass
+from statistics import NormalDist
+from typing import Iterable, Optional, Sequence
+
+import numpy as np
+
+DIMENSOES = (
+    "compliance",
+    "eficacia",
+    "eficiencia",
+    "qualidade_comunicacao",
+    "experiencia_usuario",
+    "score_geral"
+)
+
+DEFAULT_PERCENTIS = (10, 25, 50, 75, 90)
+DEFAULT_REAMOSTRAGENS = 1000
+DEFAULT_NIVEL_CONFIANCA = 0.95
+# Elementos (reamostragens x testes) por bloco do bootstrap, limita a memória
+ELEMENTOS_POR_BLOCO = 2_000_000
+# Acima deste número de testes o IC usa a aproximação normal (para a qual o
+# bootstrap converge) em vez de reamostrar
+LIMITE_BOOTSTRAP = 5000
+
+
+@contextmanager
+def _ignorar_colunas_vazias():
+    """Colunas só com NaN geram RuntimeWarning no NumPy; o NaN resultante já é tratado."""
+    with warnings.catch_warnings(), np.errstate(invalid="ignore", divide="ignore"):
+        warnings.simplefilter("ignore", RuntimeWarning)
+        yield
+
+
+def _arredondar(valor: float, casas: int = 2) -> Optional[float]:
+    return None if np.isnan(valor) else round(float(valor), casas)
+
+
+def bootstrap_ic(
+    dados: np.ndarray,
+    nivel: float = DEFAULT_NIVEL_CONFIANCA,
+    reamostragens: int = DEFAULT_REAMOSTRAGENS,
+    seed: Optional[int] = 0
+) -> np.ndarray:
+    """
+    Intervalo de confiança da média de cada coluna por bootstrap percentil.
+
+    Todas as colunas são reamostradas juntas: cada reamostragem é um vetor de
+    pesos multinomiais sobre as linhas, e as médias saem de um produto de
+    matrizes (pesos @ dados), sem materializar as amostras. Com mais de
+    LIMITE_BOOTSTRAP testes usa média ± z·desvio/√n.
+
+    Args:
+        dados: Matriz (testes x dimensões), NaN para valores ausentes
+        nivel: Nível de confiança (ex: 0.95)
+        reamostragens: Número de reamostragens
+        seed: Semente do gerador (None = não determinístico)
+
+    Returns:
+        Matriz (dimensões x 2) com [limite inferior, limite superior]
+    """
+    n, d = dados.shape
+    if n == 0:
+        return np.full((d, 2), np.nan)
+    if n == 1:
+        return np.repeat(dados.T, 2, axis=1)
+
+    alfa = (1.0 - nivel) / 2.0
+    if n > LIMITE_BOOTSTRAP:
+        with _ignorar_colunas_vazias():
+            contagens = np.sum(~np.isnan(dados), axis=0)
+            erro = np.nanstd(dados, axis=0, ddof=1) / np.sqrt(contagens)
+            media = np.nanmean(dados, axis=0)
+        z = NormalDist().inv_cdf(1.0 - alfa)
+        return np.stack([media - z * erro, media + z * erro], axis=1)
+
+    rng = np.random.default_rng(seed)
+    presentes = ~np.isnan(dados)
+    preenchidos = np.where(presentes, dados, 0.0)
+    presentes = presentes.astype(np.float64)
+
+    bloco = max(1, ELEMENTOS_POR_BLOCO // n)
+    medias = np.empty((reamostragens, d))
+    for inicio in range(0, reamostragens, bloco):
+        fim = min(reamostragens, inicio + bloco)
+        pesos = rng.multinomial(n, np.full(n, 1.0 / n), size=fim - inicio).astype(np.float64)
+        with _ignorar_colunas_vazias():
+            medias[inicio:fim] = (pesos @ preenchidos) / (pesos @ presentes)
+
+    with _ignorar_colunas_vazias():
+        return np.nanquantile(medias, [alfa, 1.0 - alfa], axis=0).T
+
+
+class MatrizScores:
+    """
+    Scores de N testes em uma matriz colunar (N x dimensões).
+
+    Args:
+        dimensoes: Nomes das colunas (padrão: as 6 dimensões do juiz)
+        capacidade: Linhas pré-alocadas (a matriz dobra quando enche)
+
+    Example:
+        >>> matriz = MatrizScores()
+        >>> matriz.adicionar({"score_geral": 82, "compliance": 90}, "PERSONA_001")
+        >>> matriz.estatisticas()["score_geral"]["media"]
+        82.0
+    """
+
+    def __init__(self, dimensoes: Sequence[str] = DIMENSOES, capacidade: int = 32):
+        self.dimensoes = tuple(dimensoes)
+        self._dados = np.full((max(1, capacidade), len(self.dimensoes)), np.nan)
+        self._n = 0
+        self.rotulos: list[str] = []
+
+    @classmethod
+    def de_registros(
+        cls,
+        registros: Iterable[tuple[str, dict]],
+        dimensoes: Sequence[str] = DIMENSOES
+    ) -> "MatrizScores":
+        """
+        Monta a matriz de uma vez a partir de (rótulo, scores).
+
+        Útil para agregar execuções históricas (ex: linhas de `test_runs`).
+        """
+        matriz = cls(dimensoes, capacidade=1)
+        rotulos = []
+        linhas = []
+        for rotulo, scores in registros:
+            rotulos.append(rotulo)
+            linhas.append([scores.get(dim, np.nan) for dim in matriz.dimensoes])
+        if linhas:
+            matriz._dados = np.array(linhas, dtype=np.float64)
+            matriz._n = len(linhas)
+            matriz.rotulos = rotulos
+        return matriz
+
+    def __len__(self) -> int:
+        return self._n
+
+    @property
+    def dados(self) -> np.ndarray:
+        """Visão (sem cópia) das linhas preenchidas."""
+        return self._dados[:self._n]
+
+    def adicionar(self, scores: dict, rotulo: str) -> None:
+        """Acrescenta uma linha (dimensões ausentes viram NaN)."""
+        if self._n == len(self._dados):
+            expandida = np.full((len(self._dados) * 2, len(self.dimensoes)), np.nan)
+            expandida[:self._n] = self._dados
+            self._dados = expandida
+        self._dados[self._n] = [
+            np.nan if scores.get(dim) is None else scores[dim]
+            for dim in self.dimensoes
+        ]
+        self.rotulos.append(rotulo)
+        self._n += 1
+
+    def medias(self) -> dict[str, Optional[float]]:
+        """Média de cada dimensão (None sem dados)."""
+        if not self._n:
+            return {dim: None for dim in self.dimensoes}
+        with _ignorar_colunas_vazias():
+            valores = np.nanmean(self.dados, axis=0)
+        return {dim: _arredondar(v) for dim, v in zip(self.dimensoes, valores)}
+
+    def estatisticas(
+        self,
+        percentis: Sequence[float] = DEFAULT_PERCENTIS,
+        nivel: float = DEFAULT_NIVEL_CONFIANCA,
+        reamostragens: int = DEFAULT_REAMOSTRAGENS,
+        seed: Optional[int] = 0
+    ) -> dict[str, dict]:
+        """
+        Distribuição de cada dimensão em uma única passada sobre a matriz.
+
+        Returns:
+            {dimensao: {"n", "media", "desvio", "min", "max", "percentis": {p: v}, "ic": [inf, sup]}}
+        """
+        dados = self.dados
+        resultado = {}
+        if not self._n:
+            for dim in self.dimensoes:
+                resultado[dim] = {"n": 0, "media": None, "desvio": None, "min": None, "max": None,
+                                  "percentis": {str(p): None for p in percentis}, "ic": [None, None]}
+            return resultado
+
+        contagens = np.sum(~np.isnan(dados), axis=0)
+        with _ignorar_colunas_vazias():
+            medias = np.nanmean(dados, axis=0)
+            desvios = np.where(contagens > 1, np.nanstd(dados, axis=0, ddof=1), 0.0)
+            minimos = np.nanmin(dados, axis=0)
+            maximos = np.nanmax(dados, axis=0)
+            valores_percentis = np.nanpercentile(dados, percentis, axis=0)
+        ics = bootstrap_ic(dados, nivel=nivel, reamostragens=reamostragens, seed=seed)
+
+        for j, dim in enumerate(self.dimensoes):
+            resultado[dim] = {
+                "n": int(contagens[j]),
+                "media": _arredondar(medias[j]),
+                "desvio": _arredondar(desvios[j]) if contagens[j] else None,
+                "min": _arredondar(minimos[j]),
+                "max": _arredondar(maximos[j]),
+                "percentis": {str(p): _arredondar(valores_percentis[i, j]) for i, p in enumerate(percentis)},
+                "ic": [_arredondar(ics[j, 0]), _arredondar(ics[j, 1])],
+            }
+        return resultado
+
+    def ranking(self, dimensao: str = "score_geral") -> list[dict]:
+        """
+        Ranking dos rótulos (personas) pela média da dimensão, do melhor ao pior.
+
+        Rótulos repetidos (a mesma persona em várias execuções) são agrupados.
+
+        Returns:
+            [{"rotulo", "testes", "media", "desvio"}] ordenado por média decrescente
+        """
+        if not self._n:
+            return []
+        coluna = self.dados[:, self.dimensoes.index(dimensao)]
+        validos = ~np.isnan(coluna)
+        if not np.any(validos):
+            return []
+
+        rotulos, codigos = np.unique(np.asarray(self.rotulos, dtype=object)[validos].astype(str), return_inverse=True)
+        valores = coluna[validos]
+        contagens = np.bincount(codigos, minlength=len(rotulos))
+        somas = np.bincount(codigos, weights=valores, minlength=len(rotulos))
+        somas_quadrados = np.bincount(codigos, weights=valores * valores, minlength=len(rotulos))
+        medias = somas / contagens
+        with _ignorar_colunas_vazias():
+            variancias = np.where(
+                contagens > 1,
+                (somas_quadrados - contagens * medias * medias) / np.maximum(contagens - 1, 1),
+                0.0
+            )
+        desvios = np.sqrt(np.maximum(variancias, 0.0))
+
+        # Ordem estável: média decrescente, empate pelo rótulo
+        ordem = np.lexsort((rotulos, -medias))
+        return [
+            {
+                "rotulo": str(rotulos[i]),
+                "testes": int(contagens[i]),
+                "media": _arredondar(medias[i]),
+                "desvio": _arredondar(desvios[i]),
+            }
+            for i in ordem
+        ]
+
+
+def _prob_t_bicaudal(t: float, graus_liberdade: int) -> float:
+    """P(|T| < t) da t de Student com graus de liberdade inteiros (série finita exata)."""
+    theta = math.atan(t / math.sqrt(graus_liberdade))
+    cos2 = math.cos(theta) ** 2
+    if graus_liberdade % 2:
+        if graus_liberdade == 1:
+            return 2 * theta / math.pi
+        termo, soma = math.cos(theta), math.cos(theta)
+        for k in range(3, graus_liberdade - 1, 2):
+            termo *= cos2 * (k - 1) / k
+            soma += termo
+        return 2 / math.pi * (theta + math.sin(theta) * soma)
+    termo, soma = 1.0, 1.0
+    for k in range(2, graus_liberdade - 1, 2):
+        termo *= cos2 * (k - 1) / k
+        soma += termo
+    return math.sin(theta) * soma
+
+
+def quantil_t(p: float, graus_liberdade: int) -> float:
+    """
+    Quantil (p > 0.5) da t de Student, por bisseção sobre a distribuição exata.
+
+    Evita depender do SciPy; amostras de bateria são pequenas, então a
+    aproximação normal subestimaria bastante o intervalo.
+    """
+    alvo = 2 * p - 1
+    inferior, superior = 0.0, 1.0
+    while _prob_t_bicaudal(superior, graus_liberdade) < alvo:
+        inferior, superior = superior, superior * 2
+    for _ in range(60):
+        meio = (inferior + superior) / 2
+        if _prob_t_bicaudal(meio, graus_liberdade) < alvo:
+            inferior = meio
+        else:
+            superior = meio
+    return (inferior + superior) / 2
+
+
+@dataclass
+class CriterioParada:
+    """
+    Teste sequencial do score de uma bateria contra um alvo.
+
+    Após cada avaliação, calcula o IC t da média da dimensão; se o IC inteiro
+    estiver acima (ou abaixo) do alvo, as personas restantes não mudariam a
+    conclusão e a bateria pode parar. Como o IC é consultado a cada conversa,
+    o nível é corrigido por Bonferroni sobre o número máximo de consultas.
+
+    Args:
+        alvo: Score que o agente precisa atingir (0-100)
+        nivel: Nível de confiança global
+        minimo: Avaliações mínimas antes de qualquer decisão
+        dimensao: Dimensão do score usada (padrão: score_geral)
+        desvio_minimo: Piso do desvio padrão (o juiz tem ruído mesmo quando
+                       as primeiras notas coincidem)
+        max_violacoes_criticas: Se informado, reprova ao atingir este número
+                                de conversas com violações críticas de compliance
+
+    Example:
+        >>> criterio = CriterioParada(alvo=80, max_violacoes_criticas=2)
+        >>> criterio.decidir([40, 45, 38, 42, 50], max_consultas=20)["decisao"]
+        'abaixo_do_alvo'
+    """
+    alvo: float = 80.0
+    nivel: float = DEFAULT_NIVEL_CONFIANCA
+    minimo: int = 3
+    dimensao: str = "score_geral"
+    desvio_minimo: float = 5.0
+    max_violacoes_criticas: Optional[int] = None
+
+    def decidir(
+        self,
+        valores: Iterable[float],
+        violacoes_criticas: int = 0,
+        max_consultas: Optional[int] = None
+    ) -> Optional[dict]:
+        """
+        Decide se a bateria pode parar.
+
+        Args:
+            valores: Scores da dimensão avaliados até agora (None/NaN ignorados)
+            violacoes_criticas: Conversas com violação crítica até agora
+            max_consultas: Número máximo de vezes que o critério será consultado
+                           (normalmente o total de personas)
+
+        Returns:
+            None para continuar, ou {"decisao": "acima_do_alvo" | "abaixo_do_alvo",
+            "motivo", "n", "media", "ic", "alvo"}
+        """
+        dados = np.asarray([v for v in valores if v is not None], dtype=np.float64)
+        dados = dados[~np.isnan(dados)]
+        n = len(dados)
+        media = _arredondar(dados.mean()) if n else None
+
+        if self.max_violacoes_criticas is not None and violacoes_criticas >= self.max_violacoes_criticas:
+            return {"decisao": "abaixo_do_alvo", "motivo": "violacoes_criticas", "n": n,
+                    "media": media, "ic": [None, None], "alvo": self.alvo}
+        if n < max(2, self.minimo):
+            return None
+
+        alfa = 1.0 - self.nivel
+        if max_consultas:
+            alfa /= max(1, max_consultas - self.minimo + 1)
+        desvio = max(float(dados.std(ddof=1)), self.desvio_minimo)
+        margem = quantil_t(1.0 - alfa / 2.0, n - 1) * desvio / math.sqrt(n)
+        inferior, superior = dados.mean() - margem, dados.mean() + margem
+
+        if inferior > self.alvo:
+            decisao = "acima_do_alvo"
+        elif superior < self.alvo:
+            decisao = "abaixo_do_alvo"
+        else:
+            return None
+        return {"decisao": decisao, "motivo": "intervalo_de_confianca", "n": n, "media": media,
+                "ic": [_arredondar(inferior), _arredondar(superior)], "alvo": self.alvo}
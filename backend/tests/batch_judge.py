@@ -0,0 +1,398 @@
+"""
+Batch Judge - Avaliação offline das conversas pela Batch API.
+
+As chamadas ao juiz não precisam ser interativas. Em baterias e matrizes
+grandes (regressões noturnas) elas podem ir todas de uma vez para a Batch
+API, que tem vazão maior e custa metade:
+
+1. `JuizEmLote.preparar` grava um JSONL com um pedido por conversa
+   (`custom_id` = test_id), montado com o mesmo `montar_pedido_juiz` da
+   avaliação interativa e com a rubrica como system prompt
+2. O `ClienteBatch` envia o arquivo e informa o status do lote
+3. `JuizEmLote.aguardar` consulta o status até o lote terminar
+4. As respostas são interpretadas (`judge.interpretar_avaliacao`) e devolvidas
+   por test_id
+
+O cliente é plugável: `ClienteBatchOpenAI` usa a API da OpenAI e
+`ClienteBatchLocal` responde localmente (testes, benchmarks, desenvolvimento).
+No modo em lote não há chamada de reparo: respostas inválidas ficam sem
+avaliação, como na avaliação interativa quando o reparo também falha.
+"""
+
+import json
+import logging
+import os
+import tempfile
+import time
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import nullcontext
+from typing import Any, Callable, Iterable, Iterator, Optional, Union
+
+from core.context_window import ContextWindow
+from judge import ResultadoJuiz, interpretar_avaliacao, montar_pedido_juiz
+from prompt_layout import carregar_prompt
+from telemetry import LLMCall, LLMTracer, calcular_custo
+
+logger = logging.getLogger(__name__)
+
+ENDPOINT_BATCH = "/v1/chat/completions"
+DEFAULT_MODELO_JUIZ = "gpt-4.1"
+# Desconto da Batch API sobre o preço interativo
+DESCONTO_BATCH = 0.5
+STATUS_FINAIS = ("completed", "failed", "expired", "cancelled")
+
+
+class ClienteBatch(ABC):
+    """
+    Interface de um provedor de Batch API.
+
+    Os resultados seguem o formato de saída da OpenAI: uma linha por pedido com
+    `custom_id` e `response.body` (chat completion) ou `error`.
+    """
+
+    @abstractmethod
+    def enviar(self, caminho_jsonl: str) -> str:
+        """Envia o arquivo de pedidos e devolve o ID do lote."""
+
+    @abstractmethod
+    def consultar(self, lote_id: str) -> str:
+        """Status do lote ("validating", "in_progress", "completed", "failed"...)."""
+
+    @abstractmethod
+    def resultados(self, lote_id: str) -> Iterator[dict]:
+        """Linhas de saída (e de erro) de um lote terminado."""
+
+    def limpar(self, lote_id: str) -> None:
+        """Descarta o que o lote deixou no provedor (arquivos, estado local) após a coleta."""
+
+
+class ClienteBatchOpenAI(ClienteBatch):
+    """
+    Batch API da OpenAI.
+
+    Args:
+        client: Instância de `openai.OpenAI` (padrão: criada com `api_key`)
+        janela: Janela de conclusão do lote
+        api_key: Chave da coleção (padrão: OPENAI_API_KEY do ambiente)
+    """
+
+    def __init__(self, client: Any = None, janela: str = "24h", api_key: Optional[str] = None):
+        if client is None:
+            from openai import OpenAI
+            from credentials import http_client_para
+            api_key = api_key or os.getenv("OPENAI_API_KEY")
+            client = OpenAI(api_key=api_key, http_client=http_client_para(api_key) if api_key else None)
+        self.client = client
+        self.janela = janela
+        self._arquivos_saida: dict[str, tuple[Optional[str], Optional[str]]] = {}
+        self._arquivos_entrada: dict[str, str] = {}
+
+    def enviar(self, caminho_jsonl: str) -> str:
+        with open(caminho_jsonl, "rb") as f:
+            arquivo = self.client.files.create(file=f, purpose="batch")
+        lote = self.client.batches.create(
+            input_file_id=arquivo.id,
+            endpoint=ENDPOINT_BATCH,
+            completion_window=self.janela
+        )
+        self._arquivos_entrada[lote.id] = arquivo.id
+        return lote.id
+
+    def consultar(self, lote_id: str) -> str:
+        lote = self.client.batches.retrieve(lote_id)
+        self._arquivos_saida[lote_id] = (lote.output_file_id, lote.error_file_id)
+        return lote.status
+
+    def resultados(self, lote_id: str) -> Iterator[dict]:
+        if lote_id not in self._arquivos_saida:
+            self.consultar(lote_id)
+        for arquivo_id in self._arquivos_saida[lote_id]:
+            if not arquivo_id:
+                continue
+            for linha in self.client.files.content(arquivo_id).text.splitlines():
+                if linha.strip():
+                    yield json.loads(linha)
+
+    def limpar(self, lote_id: str) -> None:
+        # Arquivos de entrada, saída e erro ficam na conta até serem apagados
+        arquivos = [self._arquivos_entrada.pop(lote_id, None), *self._arquivos_saida.pop(lote_id, (None, None))]
+        for arquivo_id in filter(None, arquivos):
+            try:
+                self.client.files.delete(arquivo_id)
+            except Exception as e:
+                logger.warning("Não foi possível apagar o arquivo %s do lote %s: %s", arquivo_id, lote_id, e)
+
+
+class ClienteBatchLocal(ClienteBatch):
+    """
+    Stub local: processa os pedidos na hora com uma função de resposta.
+
+    Args:
+        responder: Recebe o `body` do pedido e devolve o texto da resposta
+        consultas_ate_concluir: Quantas consultas devolvem "in_progress"
+                                antes de "completed" (simula a espera)
+
+    Example:
+        >>> cliente = ClienteBatchLocal.de_agente(juiz)
+        >>> avaliacoes = JuizEmLote(cliente, intervalo=0).avaliar(testes, regras)
+    """
+
+    def __init__(self, responder: Callable[[dict], str], consultas_ate_concluir: int = 0):
+        self.responder = responder
+        self.consultas_ate_concluir = consultas_ate_concluir
+        self._lotes: dict[str, dict] = {}
+
+    @classmethod
+    def de_agente(cls, agente: Any, **kwargs) -> "ClienteBatchLocal":
+        """Responde cada pedido com `agente.run` (mensagem do usuário do pedido)."""
+        def responder(body: dict) -> str:
+            conteudo = agente.run(body["messages"][-1]["content"])
+            conteudo = getattr(conteudo, "content", conteudo)
+            if hasattr(conteudo, "model_dump_json"):
+                return conteudo.model_dump_json()
+            return conteudo if isinstance(conteudo, str) else json.dumps(conteudo, ensure_ascii=False)
+        return cls(responder, **kwargs)
+
+    def enviar(self, caminho_jsonl: str) -> str:
+        with open(caminho_jsonl, "r", encoding="utf-8") as f:
+            pedidos = [json.loads(linha) for linha in f if linha.strip()]
+        lote_id = f"batch_local_{uuid.uuid4().hex[:12]}"
+        self._lotes[lote_id] = {"pedidos": pedidos, "consultas": 0}
+        return lote_id
+
+    def consultar(self, lote_id: str) -> str:
+        lote = self._lotes[lote_id]
+        lote["consultas"] += 1
+        return "completed" if lote["consultas"] > self.consultas_ate_concluir else "in_progress"
+
+    def resultados(self, lote_id: str) -> Iterator[dict]:
+        for pedido in self._lotes[lote_id]["pedidos"]:
+            try:
+                conteudo = self.responder(pedido["body"])
+            except Exception as e:
+                yield {"custom_id": pedido["custom_id"], "response": None,
+                       "error": {"code": type(e).__name__, "message": str(e)}}
+                continue
+            yield {
+                "custom_id": pedido["custom_id"],
+                "response": {
+                    "status_code": 200,
+                    "body": {
+                        "model": pedido["body"].get("model"),
+                        "choices": [{"message": {"role": "assistant", "content": conteudo}}],
+                        "usage": {"prompt_tokens": 0, "completion_tokens": 0},
+                    },
+                },
+                "error": None,
+            }
+
+    def limpar(self, lote_id: str) -> None:
+        self._lotes.pop(lote_id, None)
+
+
+class JuizEmLote:
+    """
+    Avalia conversas pela Batch API e devolve as avaliações por test_id.
+
+    Args:
+        cliente: Provedor do lote (ClienteBatchOpenAI, ClienteBatchLocal...)
+        diretorio: Onde os arquivos JSONL de pedidos são gravados (padrão: um
+                   diretório temporário por lote); o arquivo é apagado após a
+                   coleta, a menos que `manter_arquivos`
+        manter_arquivos: Mantém o JSONL de pedidos (depuração)
+        modelo: Modelo do juiz nos pedidos
+        intervalo: Segundos entre consultas de status
+        timeout: Tempo máximo de espera pelo lote (segundos)
+
+    Example:
+        >>> juiz = JuizEmLote(ClienteBatchOpenAI(), diretorio="batches/")
+        >>> avaliacoes = juiz.avaliar(resultados_matriz, regras_agente=regras)
+        >>> for r in resultados_matriz:
+        ...     r["avaliacao"] = avaliacoes.get(r["test_id"])
+    """
+
+    def __init__(
+        self,
+        cliente: ClienteBatch,
+        diretorio: Optional[str] = None,
+        modelo: str = DEFAULT_MODELO_JUIZ,
+        intervalo: float = 30.0,
+        timeout: float = 24 * 3600,
+        manter_arquivos: bool = False
+    ):
+        self.cliente = cliente
+        self.diretorio = diretorio
+        self.manter_arquivos = manter_arquivos
+        self.modelo = modelo
+        self.intervalo = intervalo
+        self.timeout = timeout
+
+    def _rubrica(self) -> str:
+        return carregar_prompt("prompt_judge_agent.md")
+
+    def preparar(
+        self,
+        testes: Iterable[dict],
+        regras_agente: str = "",
+        estrategia_historico: Optional[Union[str, ContextWindow]] = None,
+        diretorio: Optional[str] = None
+    ) -> tuple[str, dict[str, dict]]:
+        """
+        Grava o JSONL com um pedido por conversa avaliável.
+
+        Conversas com erro ou vazias são ignoradas. Quem chama `preparar`
+        diretamente é dono do arquivo (`avaliar` o apaga após a coleta).
+
+        Args:
+            diretorio: Destino do arquivo (padrão: `self.diretorio` ou "batches")
+
+        Returns:
+            (caminho do arquivo, {test_id: teste})
+        """
+        diretorio = diretorio or self.diretorio or "batches"
+        os.makedirs(diretorio, exist_ok=True)
+        caminho = os.path.join(diretorio, f"judge_{uuid.uuid4().hex[:8]}.jsonl")
+        rubrica = self._rubrica()
+        por_id: dict[str, dict] = {}
+
+        with open(caminho, "w", encoding="utf-8") as f:
+            for teste in testes:
+                test_id = teste.get("test_id")
+                if not test_id or "erro" in teste or not teste.get("conversa"):
+                    continue
+                contexto_juiz = ContextWindow.criar(estrategia_historico)
+                transcricao = contexto_juiz.transcricao_para_juiz(teste["conversa"])
+                teste["contexto_juiz"] = contexto_juiz.economia()
+                pedido = montar_pedido_juiz(
+                    transcricao,
+                    cenario=teste.get("prompt_teste", "prompt_from_database"),
+                    regras=regras_agente,
+                    persona_id=teste.get("persona_id"),
+                    persona_nome=teste.get("persona_nome"),
+                    total_turnos=teste.get("total_turnos", 0)
+                )
+                f.write(json.dumps({
+                    "custom_id": test_id,
+                    "method": "POST",
+                    "url": ENDPOINT_BATCH,
+                    "body": {
+                        "model": self.modelo,
+                        "messages": [
+                            {"role": "system", "content": rubrica},
+                            {"role": "user", "content": pedido},
+                        ],
+                        "response_format": {"type": "json_object"},
+                    },
+                }, ensure_ascii=False) + "\n")
+                por_id[test_id] = teste
+
+        logger.info("Lote do juiz com %s pedidos gravado em %s", len(por_id), caminho)
+        return caminho, por_id
+
+    def aguardar(self, lote_id: str) -> str:
+        """
+        Consulta o lote até um status final.
+
+        Raises:
+            TimeoutError: Se o lote não terminar dentro de `timeout`
+        """
+        limite = time.monotonic() + self.timeout
+        while True:
+            status = self.cliente.consultar(lote_id)
+            if status in STATUS_FINAIS:
+                return status
+            if time.monotonic() >= limite:
+                raise TimeoutError(f"Lote {lote_id} não terminou em {self.timeout}s (status: {status})")
+            logger.info("Lote %s: %s", lote_id, status)
+            time.sleep(self.intervalo)
+
+    def coletar(
+        self,
+        lote_id: str,
+        testes_por_id: dict[str, dict],
+        tracer: Optional[LLMTracer] = None
+    ) -> dict[str, ResultadoJuiz]:
+        """Interpreta as linhas de saída do lote, registrando tokens e custo no tracer."""
+        resultados: dict[str, ResultadoJuiz] = {}
+        for linha in self.cliente.resultados(lote_id):
+            test_id = linha.get("custom_id")
+            if test_id not in testes_por_id:
+                continue
+            teste = testes_por_id[test_id]
+            body = (linha.get("response") or {}).get("body") or {}
+            erro = linha.get("error")
+            if erro or not body.get("choices"):
+                mensagem = (erro or {}).get("message") or "resposta vazia"
+                resultados[test_id] = ResultadoJuiz(erro=f"Pedido do lote falhou: {mensagem}")
+            else:
+                resultados[test_id] = interpretar_avaliacao(body["choices"][0]["message"].get("content"))
+
+            if tracer is not None:
+                uso = body.get("usage") or {}
+                entrada = int(uso.get("prompt_tokens", 0) or 0)
+                saida = int(uso.get("completion_tokens", 0) or 0)
+                cache = int((uso.get("prompt_tokens_details") or {}).get("cached_tokens", 0) or 0)
+                modelo = body.get("model") or self.modelo
+                tracer.registrar(LLMCall(
+                    role="judge",
+                    model=modelo,
+                    input_tokens=entrada,
+                    output_tokens=saida,
+                    cached_input_tokens=cache,
+                    cost_usd=calcular_custo(modelo, entrada, saida, cache) * DESCONTO_BATCH,
+                    error=resultados[test_id].erro if erro else None,
+                    labels={**tracer.labels, "persona_id": teste.get("persona_id"),
+                            "test_id": test_id, "modo": "batch"},
+                ))
+
+        for test_id in testes_por_id.keys() - resultados.keys():
+            resultados[test_id] = ResultadoJuiz(erro="Pedido ausente na saída do lote")
+        return resultados
+
+    def avaliar(
+        self,
+        testes: Iterable[dict],
+        regras_agente: str = "",
+        estrategia_historico: Optional[Union[str, ContextWindow]] = None,
+        tracer: Optional[LLMTracer] = None
+    ) -> dict[str, Optional[dict]]:
+        """
+        Prepara, envia, aguarda e mescla: avaliação (dict) por test_id.
+
+        Conversas sem avaliação válida ficam com None.
+
+        Raises:
+            RuntimeError: Se o lote falhar como um todo
+            TimeoutError: Se o lote não terminar a tempo
+        """
+        # Sem diretório configurado, o JSONL vive em um diretório temporário do lote
+        temporario = self.diretorio is None and not self.manter_arquivos
+        with tempfile.TemporaryDirectory(prefix="judge_batch_") if temporario else nullcontext(None) as diretorio:
+            caminho, por_id = self.preparar(testes, regras_agente, estrategia_historico, diretorio)
+            try:
+                if not por_id:
+                    return {}
+                return self._enviar_e_coletar(caminho, por_id, tracer)
+            finally:
+                if not temporario and not self.manter_arquivos and os.path.exists(caminho):
+                    os.remove(caminho)
+
+    def _enviar_e_coletar(self, caminho: str, por_id: dict[str, dict], tracer: Optional[LLMTracer]) -> dict[str, Optional[dict]]:
+        lote_id = self.cliente.enviar(caminho)
+        logger.info("Lote %s enviado (%s conversas)", lote_id, len(por_id))
+        try:
+            status = self.aguardar(lote_id)
+            if status == "failed":
+                raise RuntimeError(f"Lote {lote_id} do juiz falhou")
+            if status != "completed":
+                logger.warning("Lote %s terminou como '%s': usando os resultados parciais", lote_id, status)
+
+            avaliacoes = {}
+            for test_id, resultado in self.coletar(lote_id, por_id, tracer).items():
+                avaliacoes[test_id] = resultado.como_dict()
+                if avaliacoes[test_id] is None:
+                    logger.warning("Sem avaliação para %s: %s", test_id, resultado.erro)
+            return avaliacoes
+        finally:
+            self.cliente.limpar(lote_id)
@@ -0,0 +1,229 @@
+"""
+Checkpoint - Persistência incremental de baterias e matrizes de testes.
+
+Cada conversa concluída e cada avaliação do juiz são gravadas assim que
+terminam, indexadas pelo session_id. Se o processo morrer no meio de uma
+execução longa, a retomada pula as células já concluídas.
+
+Dois backends com a mesma interface:
+- JsonlCheckpointStore: um arquivo append-only <session_id>.jsonl por sessão
+- SqliteCheckpointStore: um banco SQLite local (modo WAL) para todas as sessões
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+TIPO_SESSAO = "sessao"
+TIPO_CONVERSA = "conversa"
+TIPO_AVALIACAO = "avaliacao"
+
+
+def chave_celula(persona_id: str, prompt_nome: Optional[str] = None) -> str:
+    """
+    Chave de uma célula dentro da sessão.
+
+    Em baterias a persona identifica a célula; em matrizes, prompt + persona.
+    """
+    return f"{prompt_nome}::{persona_id}" if prompt_nome else persona_id
+
+
+class CheckpointStore(ABC):
+    """
+    Interface dos stores de checkpoint.
+
+    Os registros de uma sessão são carregados como:
+        {chave: {"conversa": dict | None, "avaliacao": dict | None}}
+    """
+
+    @abstractmethod
+    def _gravar(self, session_id: str, tipo: str, chave: str, dados: dict) -> None:
+        """Grava (ou substitui) o registro tipo/chave da sessão."""
+
+    @abstractmethod
+    def _ler(self, session_id: str) -> list[tuple[str, str, dict]]:
+        """Retorna (tipo, chave, dados) na ordem de gravação."""
+
+    def registrar_sessao(self, session_id: str, parametros: dict) -> None:
+        """Grava os parâmetros necessários para retomar a sessão."""
+        self._gravar(session_id, TIPO_SESSAO, "", parametros)
+
+    def registrar_conversa(self, session_id: str, chave: str, resultado: dict) -> None:
+        """Grava uma conversa concluída (sem erro)."""
+        self._gravar(session_id, TIPO_CONVERSA, chave, resultado)
+
+    def registrar_avaliacao(self, session_id: str, chave: str, avaliacao: dict) -> None:
+        """Grava a avaliação do juiz de uma conversa."""
+        self._gravar(session_id, TIPO_AVALIACAO, chave, avaliacao)
+
+    def obter_sessao(self, session_id: str) -> Optional[dict]:
+        """Parâmetros registrados da sessão (ou None se não existir)."""
+        parametros = None
+        for tipo, _, dados in self._ler(session_id):
+            if tipo == TIPO_SESSAO:
+                parametros = dados
+        return parametros
+
+    def carregar(self, session_id: str) -> dict[str, dict]:
+        """Conversas e avaliações já concluídas, por chave de célula."""
+        celulas: dict[str, dict] = {}
+        for tipo, chave, dados in self._ler(session_id):
+            if tipo == TIPO_SESSAO:
+                continue
+            celula = celulas.setdefault(chave, {"conversa": None, "avaliacao": None})
+            celula[tipo] = dados
+        return celulas
+
+
+class JsonlCheckpointStore(CheckpointStore):
+    """
+    Store append-only em JSONL (um arquivo por sessão).
+
+    Cada linha é gravada com flush + fsync; uma última linha truncada por
+    queda do processo é ignorada na leitura e descartada na próxima gravação.
+
+    Args:
+        diretorio: Diretório onde ficam os arquivos <session_id>.jsonl
+    """
+
+    def __init__(self, diretorio: str):
+        self.diretorio = diretorio
+        os.makedirs(diretorio, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def _caminho(self, session_id: str) -> str:
+        return os.path.join(self.diretorio, f"{session_id}.jsonl")
+
+    @staticmethod
+    def _descartar_linha_parcial(f) -> None:
+        """
+        Trunca o arquivo (aberto em "a+b") de volta à última quebra de linha.
+
+        Uma queda no meio da gravação deixa a última linha incompleta; sem
+        isso, o próximo registro seria colado nela e os dois se perderiam.
+        """
+        tamanho = f.seek(0, os.SEEK_END)
+        if tamanho == 0:
+            return
+        f.seek(tamanho - 1)
+        if f.read(1) == b"\n":
+            return
+        posicao = tamanho
+        while posicao > 0:
+            inicio = max(0, posicao - 4096)
+            f.seek(inicio)
+            bloco = f.read(posicao - inicio)
+            quebra = bloco.rfind(b"\n")
+            if quebra >= 0:
+                posicao = inicio + quebra + 1
+                break
+            posicao = inicio
+        logger.warning("Linha parcial no fim de %s descartada (%d bytes)", f.name, tamanho - posicao)
+        f.truncate(posicao)
+
+    def _gravar(self, session_id: str, tipo: str, chave: str, dados: dict) -> None:
+        linha = json.dumps(
+            {"tipo": tipo, "chave": chave, "dados": dados, "gravado_em": datetime.now().isoformat()},
+            ensure_ascii=False,
+            default=str,
+        )
+        with self._lock:
+            with open(self._caminho(session_id), "a+b") as f:
+                self._descartar_linha_parcial(f)
+                f.write((linha + "\n").encode("utf-8"))
+                f.flush()
+                os.fsync(f.fileno())
+
+    def _ler(self, session_id: str) -> list[tuple[str, str, dict]]:
+        caminho = self._caminho(session_id)
+        if not os.path.exists(caminho):
+            return []
+        registros = []
+        with open(caminho, "r", encoding="utf-8") as f:
+            for numero, linha in enumerate(f, 1):
+                if not linha.strip():
+                    continue
+                try:
+                    registro = json.loads(linha)
+                except json.JSONDecodeError:
+                    logger.warning("Linha %s inválida no checkpoint %s (ignorada)", numero, caminho)
+                    continue
+                registros.append((registro["tipo"], registro["chave"], registro["dados"]))
+        return registros
+
+
+class SqliteCheckpointStore(CheckpointStore):
+    """
+    Store em banco SQLite local (uma linha por sessão/tipo/chave).
+
+    Args:
+        caminho: Arquivo do banco (criado se não existir)
+    """
+
+    def __init__(self, caminho: str):
+        self.caminho = caminho
+        diretorio = os.path.dirname(os.path.abspath(caminho))
+        os.makedirs(diretorio, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(caminho, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS checkpoints (
+                session_id TEXT NOT NULL,
+                tipo TEXT NOT NULL,
+                chave TEXT NOT NULL,
+                dados TEXT NOT NULL,
+                gravado_em TEXT NOT NULL,
+                PRIMARY KEY (session_id, tipo, chave)
+            )
+            """
+        )
+        self._conn.commit()
+
+    def _gravar(self, session_id: str, tipo: str, chave: str, dados: dict) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?)",
+                (session_id, tipo, chave, json.dumps(dados, ensure_ascii=False, default=str),
+                 datetime.now().isoformat()),
+            )
+            self._conn.commit()
+
+    def _ler(self, session_id: str) -> list[tuple[str, str, dict]]:
+        with self._lock:
+            linhas = self._conn.execute(
+                "SELECT tipo, chave, dados FROM checkpoints WHERE session_id = ? ORDER BY gravado_em",
+                (session_id,),
+            ).fetchall()
+        return [(tipo, chave, json.loads(dados)) for tipo, chave, dados in linhas]
+
+    def fechar(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def abrir_checkpoint(destino: str) -> CheckpointStore:
+    """
+    Abre o store adequado para o destino informado.
+
+    Args:
+        destino: Arquivo .db/.sqlite/.sqlite3 (SQLite) ou diretório (JSONL)
+
+    Returns:
+        Instância de CheckpointStore
+
+    Example:
+        >>> store = abrir_checkpoint("checkpoints/")          # JSONL
+        >>> store = abrir_checkpoint("checkpoints/runs.db")   # SQLite
+    """
+    if destino.endswith((".db", ".sqlite", ".sqlite3")):
+        return SqliteCheckpointStore(destino)
+    return JsonlCheckpointStore(destino)
@@ -0,0 +1,214 @@
+"""
+Clustering - Agrupamento de pontos fortes/fracos parafraseados.
+
+O juiz descreve o mesmo problema com palavras diferentes em cada conversa
+("Não coletou o telefone" / "Faltou coletar o telefone do cliente"). Contar
+strings exatas não junta essas variações. Este módulo agrupa os achados por
+similaridade de Jaccard entre os radicais das palavras, usando MinHash + LSH
+para encontrar candidatos sem comparar todos os pares:
+
+1. Normalização: minúsculas, sem acentos, sem stopwords, radical = 5 letras
+2. Assinatura MinHash (NumPy) do conjunto de radicais
+3. LSH por bandas: só achados que colidem em alguma banda são candidatos
+4. O achado entra no grupo cujo líder (primeira redação do grupo) tem o maior
+   Jaccard exato acima do limiar; sem isso, abre um grupo novo. Comparar com
+   o líder, e não com qualquer membro, evita o encadeamento de grupos
+
+Textos idênticos após a normalização são contados uma única vez no índice,
+então dezenas de milhares de achados de execuções históricas são agrupados
+em poucos segundos, apenas com CPU.
+"""
+
+import re
+import unicodedata
+import zlib
+from collections import Counter
+from typing import Iterable, Optional
+
+import numpy as np
+
+DEFAULT_LIMIAR = 0.4
+NUM_PERMUTACOES = 96
+NUM_BANDAS = 32  # 3 linhas por banda: colisão provável a partir de Jaccard ~0.3
+TAMANHO_RADICAL = 5
+# Comparações por balde de LSH (baldes enormes vêm de radicais muito comuns)
+MAX_COMPARACOES_POR_BALDE = 8
+
+_PRIMO = np.uint64((1 << 61) - 1)
+
+STOPWORDS = frozenset("""
+a ao aos as com como da das de do dos e em entre era essa esse esta este eu foi
+ha isso isto ja la lhe mais mas me mesmo muito na nas nao no nos o os ou para
+pela pelas pelo pelos por qual quando que se sem ser seu sua sao tambem te tem
+ter um uma umas uns voce ainda apos bem cliente usuario agente conversa
+atendimento durante vezes varias alguns algumas momento momentos problema
+claramente
+""".split())
+
+_RE_PALAVRA = re.compile(r"[a-z0-9]+")
+
+
+def normalizar(texto: str) -> str:
+    """Minúsculas, sem acentos e com espaços colapsados."""
+    sem_acentos = unicodedata.normalize("NFKD", texto.lower()).encode("ascii", "ignore").decode("ascii")
+    return " ".join(_RE_PALAVRA.findall(sem_acentos))
+
+
+def radicais(texto_normalizado: str) -> frozenset[str]:
+    """Conjunto de radicais (prefixos) das palavras relevantes do texto."""
+    termos = frozenset(
+        palavra[:TAMANHO_RADICAL]
+        for palavra in texto_normalizado.split()
+        if len(palavra) > 2 and palavra not in STOPWORDS
+    )
+    # Achados só com stopwords ainda precisam de uma identidade
+    return termos or frozenset([texto_normalizado])
+
+
+def jaccard(a: frozenset, b: frozenset) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+class IndiceAchados:
+    """
+    Índice incremental de achados do juiz agrupados por similaridade.
+
+    Args:
+        limiar: Jaccard mínimo entre radicais para dois achados se juntarem
+        num_permutacoes: Tamanho da assinatura MinHash
+        num_bandas: Bandas do LSH (num_permutacoes deve ser múltiplo)
+        seed: Semente das permutações (fixa = agrupamento reproduzível)
+
+    Example:
+        >>> indice = IndiceAchados()
+        >>> indice.adicionar("Não coletou o telefone", fonte="PERSONA_001")
+        >>> indice.adicionar("Faltou coletar telefone", fonte="PERSONA_002")
+        >>> indice.grupos(1)[0]["ocorrencias"]
+        2
+    """
+
+    def __init__(
+        self,
+        limiar: float = DEFAULT_LIMIAR,
+        num_permutacoes: int = NUM_PERMUTACOES,
+        num_bandas: int = NUM_BANDAS,
+        seed: int = 42
+    ):
+        if num_permutacoes % num_bandas:
+            raise ValueError("num_permutacoes deve ser múltiplo de num_bandas")
+        self.limiar = limiar
+        self.num_bandas = num_bandas
+        self._linhas_por_banda = num_permutacoes // num_bandas
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, 1 << 32, size=num_permutacoes, dtype=np.uint64)
+        self._b = rng.integers(0, 1 << 32, size=num_permutacoes, dtype=np.uint64)
+
+        # Um item por texto normalizado distinto
+        self._id_por_texto: dict[str, int] = {}
+        self._radicais: list[frozenset] = []
+        self._variantes: list[Counter] = []
+        self._fontes: list[set] = []
+        self._baldes: list[dict[bytes, list[int]]] = [{} for _ in range(num_bandas)]
+        self._grupo_do_item: list[int] = []
+        self._lideres: list[int] = []
+        self.total = 0
+
+    def _assinatura(self, termos: frozenset[str]) -> np.ndarray:
+        hashes = np.fromiter((zlib.crc32(t.encode()) for t in termos), dtype=np.uint64, count=len(termos))
+        return ((self._a[:, None] * hashes[None, :] + self._b[:, None]) % _PRIMO).min(axis=1)
+
+    def adicionar(self, texto: str, fonte: Optional[str] = None) -> None:
+        """Adiciona um achado (fonte = persona/execução que o citou)."""
+        texto = (texto or "").strip()
+        if not texto:
+            return
+        self.total += 1
+        normalizado = normalizar(texto) or texto.lower()
+
+        item = self._id_por_texto.get(normalizado)
+        if item is None:
+            item = len(self._radicais)
+            self._id_por_texto[normalizado] = item
+            termos = radicais(normalizado)
+            self._radicais.append(termos)
+            self._variantes.append(Counter())
+            self._fontes.append(set())
+            self._indexar(item, termos)
+
+        self._variantes[item][texto] += 1
+        if fonte is not None:
+            self._fontes[item].add(fonte)
+
+    def adicionar_varios(self, textos: Iterable[str], fonte: Optional[str] = None) -> None:
+        for texto in textos:
+            self.adicionar(texto, fonte)
+
+    def _indexar(self, item: int, termos: frozenset[str]) -> None:
+        assinatura = self._assinatura(termos)
+        r = self._linhas_por_banda
+        grupos_candidatos: set[int] = set()
+        for banda, baldes in enumerate(self._baldes):
+            chave = assinatura[banda * r:(banda + 1) * r].tobytes()
+            membros = baldes.setdefault(chave, [])
+            grupos_candidatos.update(self._grupo_do_item[m] for m in membros[:MAX_COMPARACOES_POR_BALDE])
+            membros.append(item)
+
+        # Entra no grupo cujo líder é mais parecido (cada grupo é comparado uma vez)
+        melhor_grupo, melhor_similaridade = None, self.limiar
+        for grupo in grupos_candidatos:
+            similaridade = jaccard(termos, self._radicais[self._lideres[grupo]])
+            if similaridade >= melhor_similaridade:
+                melhor_grupo, melhor_similaridade = grupo, similaridade
+        if melhor_grupo is None:
+            melhor_grupo = len(self._lideres)
+            self._lideres.append(item)
+        self._grupo_do_item.append(melhor_grupo)
+
+    def grupos(self, limite: Optional[int] = None) -> list[dict]:
+        """
+        Grupos ordenados por frequência (ocorrências, depois fontes distintas).
+
+        Returns:
+            [{"representante", "ocorrencias", "fontes", "variantes"}], onde o
+            representante é a redação mais citada do grupo
+        """
+        por_grupo: dict[int, list[int]] = {}
+        for item, grupo in enumerate(self._grupo_do_item):
+            por_grupo.setdefault(grupo, []).append(item)
+
+        grupos = []
+        for itens in por_grupo.values():
+            variantes: Counter = Counter()
+            fontes: set = set()
+            for item in itens:
+                variantes.update(self._variantes[item])
+                fontes |= self._fontes[item]
+            representante = min(variantes.items(), key=lambda kv: (-kv[1], len(kv[0]), kv[0]))[0]
+            grupos.append({
+                "representante": representante,
+                "ocorrencias": sum(variantes.values()),
+                "fontes": len(fontes),
+                "variantes": [texto for texto, _ in variantes.most_common()],
+            })
+
+        grupos.sort(key=lambda g: (-g["ocorrencias"], -g["fontes"], g["representante"]))
+        return grupos[:limite] if limite is not None else grupos
+
+
+def agrupar_achados(
+    achados: Iterable[str],
+    limite: Optional[int] = None,
+    limiar: float = DEFAULT_LIMIAR
+) -> list[dict]:
+    """
+    Agrupa uma lista de achados de uma vez (ver IndiceAchados.grupos).
+
+    Example:
+        >>> grupos = agrupar_achados(todos_pontos_fracos, limite=5)
+        >>> [g["representante"] for g in grupos]
+    """
+    indice = IndiceAchados(limiar=limiar)
+    indice.adicionar_varios(achados)
+    return indice.grupos(limite)
@@ -0,0 +1,122 @@
+"""
+Eventos da bateria de testes.
+
+`executar_bateria_stream` gera estes eventos conforme a execução avança, em
+vez de devolver um único dicionário no final. Cada evento sabe se serializar
+(`to_dict`) no mesmo formato `{"type": ...}` usado pelos streams SSE do backend.
+
+Ordem típica por persona:
+    PersonaIniciada -> TurnoConversa* -> ConversaConcluida -> ConversaAvaliada -> AgregadoAtualizado
+e, ao final, BateriaConcluida (precedida de ParadaAntecipada se o critério
+de parada encerrou a bateria antes da última persona).
+"""
+
+from dataclasses import dataclass, field, fields
+from typing import Any, ClassVar, Optional
+
+
+@dataclass
+class EventoBateria:
+    """Base dos eventos. Campos com metadata `interno` não são serializados."""
+    tipo: ClassVar[str] = "event"
+
+    session_id: str
+
+    def to_dict(self) -> dict:
+        dados = {"type": self.tipo}
+        for f in fields(self):
+            if not f.metadata.get("interno"):
+                dados[f.name] = getattr(self, f.name)
+        return dados
+
+
+@dataclass
+class PersonaIniciada(EventoBateria):
+    """Uma conversa com a persona vai começar."""
+    tipo: ClassVar[str] = "persona_started"
+
+    persona_id: str
+    indice: int
+    total: int
+
+
+@dataclass
+class TurnoConversa(EventoBateria):
+    """Uma mensagem da conversa (testador = "user", agente = "assistant")."""
+    tipo: ClassVar[str] = "turn"
+
+    persona_id: str
+    test_id: str
+    turno: int
+    role: str
+    content: str
+
+
+@dataclass
+class ConversaConcluida(EventoBateria):
+    """
+    Conversa encerrada (naturalmente, por limite de turnos ou por erro).
+
+    `resultado` traz o dicionário completo de `executar_teste_com_persona`
+    (com a conversa) para quem precisar dele; não entra no `to_dict`.
+    """
+    tipo: ClassVar[str] = "conversation_finished"
+
+    persona_id: str
+    persona_nome: str
+    test_id: str
+    total_turnos: int = 0
+    finalizado_naturalmente: bool = False
+    duracao_segundos: float = 0.0
+    retomada: bool = False
+    erro: Optional[str] = None
+    resultado: dict = field(default_factory=dict, repr=False, metadata={"interno": True})
+
+
+@dataclass
+class ConversaAvaliada(EventoBateria):
+    """Resultado do juiz para uma conversa (scores None se não houve avaliação)."""
+    tipo: ClassVar[str] = "judged"
+
+    persona_id: str
+    persona_nome: str
+    test_id: str
+    scores: Optional[dict] = None
+    aprovado: bool = False
+    erro: Optional[str] = None
+    avaliacao: Optional[dict] = None
+
+
+@dataclass
+class AgregadoAtualizado(EventoBateria):
+    """Análise geral recalculada com as conversas avaliadas até agora."""
+    tipo: ClassVar[str] = "aggregate_updated"
+
+    concluidas: int
+    total: int
+    analise_geral: dict
+
+
+@dataclass
+class ParadaAntecipada(EventoBateria):
+    """O IC do score ficou claramente acima/abaixo do alvo: personas restantes canceladas."""
+    tipo: ClassVar[str] = "early_stop"
+
+    decisao: str
+    motivo: str
+    avaliadas: int
+    economizadas: int
+    media: Optional[float] = None
+    ic: list = field(default_factory=list)
+    alvo: float = 0.0
+
+
+@dataclass
+class BateriaConcluida(EventoBateria):
+    """
+    Fim da bateria. `resultado` é o consolidado sem `testes_detalhados`
+    (as conversas já foram entregues nos eventos ConversaConcluida).
+    """
+    tipo: ClassVar[str] = "battery_done"
+
+    resultado: dict[str, Any]
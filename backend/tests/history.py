@@ -0,0 +1,205 @@
+"""
+History - Índice local do histórico de cada persona por coleção.
+
+Cada bateria concluída grava, por coleção e persona, estatísticas
+suficientes dos resultados (`resultados_por_persona`): execuções, falhas
+(conversas não aprovadas pelo juiz), soma e soma dos quadrados do
+score_geral. Nada de conversas: o índice fica pequeno mesmo após milhares
+de baterias.
+
+A partir dele, `priorizar` ordena as personas como um bandit (Thompson
+sampling): a probabilidade de falha de cada persona é sorteada da sua
+posterior Beta e somada a um bônus pela variância do score. Personas que
+costumam quebrar o agente (ou que oscilam) vão primeiro, então uma
+regressão aparece nas primeiras conversas; personas nunca testadas recebem
+a posterior uniforme e continuam sendo exploradas.
+"""
+
+import logging
+import math
+import os
+import random
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CAMINHO_HISTORICO = "persona_history.db"
+# Desvio do score assumido para personas com menos de 2 execuções
+DESVIO_PRIOR = 15.0
+# Desvio a partir do qual o bônus de variância é máximo
+DESVIO_MAXIMO = 25.0
+PESO_VARIANCIA = 0.25
+
+
+class HistoricoPersonas:
+    """
+    Histórico de scores por coleção e persona em um banco SQLite local.
+
+    Args:
+        caminho: Arquivo do banco (criado se não existir)
+
+    Example:
+        >>> historico = HistoricoPersonas("persona_history.db")
+        >>> historico.registrar(collection_id, resultado["resultados_por_persona"])
+        >>> historico.priorizar(collection_id, ["PERSONA_001", "PERSONA_002", "PERSONA_003"])
+        ['PERSONA_001', 'PERSONA_003', 'PERSONA_002']
+    """
+
+    def __init__(self, caminho: str = DEFAULT_CAMINHO_HISTORICO):
+        self.caminho = caminho
+        diretorio = os.path.dirname(os.path.abspath(caminho))
+        os.makedirs(diretorio, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(caminho, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS historico_personas (
+                collection_id TEXT NOT NULL,
+                persona_id TEXT NOT NULL,
+                execucoes INTEGER NOT NULL DEFAULT 0,
+                falhas INTEGER NOT NULL DEFAULT 0,
+                soma REAL NOT NULL DEFAULT 0,
+                soma_quadrados REAL NOT NULL DEFAULT 0,
+                atualizado_em TEXT NOT NULL,
+                PRIMARY KEY (collection_id, persona_id)
+            )
+            """
+        )
+        self._conn.commit()
+
+    def registrar(self, collection_id: str, resultados_por_persona: Sequence[dict]) -> int:
+        """
+        Acumula os resultados de uma bateria.
+
+        Entradas sem scores (erro na conversa ou avaliação indisponível) são
+        ignoradas: dizem respeito à infraestrutura, não ao agente.
+
+        Returns:
+            Número de entradas registradas
+        """
+        linhas = []
+        agora = datetime.now().isoformat()
+        for entrada in resultados_por_persona:
+            scores = entrada.get("scores")
+            if not scores or scores.get("score_geral") is None:
+                continue
+            score = float(scores["score_geral"])
+            falhou = 0 if entrada.get("aprovado") else 1
+            linhas.append((collection_id, entrada["persona_id"], falhou, score, score * score, agora))
+
+        with self._lock:
+            self._conn.executemany(
+                """
+                INSERT INTO historico_personas
+                    (collection_id, persona_id, execucoes, falhas, soma, soma_quadrados, atualizado_em)
+                VALUES (?, ?, 1, ?, ?, ?, ?)
+                ON CONFLICT (collection_id, persona_id) DO UPDATE SET
+                    execucoes = execucoes + 1,
+                    falhas = falhas + excluded.falhas,
+                    soma = soma + excluded.soma,
+                    soma_quadrados = soma_quadrados + excluded.soma_quadrados,
+                    atualizado_em = excluded.atualizado_em
+                """,
+                linhas,
+            )
+            self._conn.commit()
+        return len(linhas)
+
+    def estatisticas(self, collection_id: str) -> dict[str, dict]:
+        """
+        Estatísticas por persona da coleção.
+
+        Returns:
+            {persona_id: {"execucoes", "falhas", "taxa_falha", "media", "desvio"}}
+            (desvio amostral; None com menos de 2 execuções)
+        """
+        with self._lock:
+            linhas = self._conn.execute(
+                "SELECT persona_id, execucoes, falhas, soma, soma_quadrados "
+                "FROM historico_personas WHERE collection_id = ?",
+                (collection_id,),
+            ).fetchall()
+
+        resultado = {}
+        for persona_id, n, falhas, soma, soma_quadrados in linhas:
+            media = soma / n
+            desvio = None
+            if n >= 2:
+                desvio = math.sqrt(max(0.0, (soma_quadrados - n * media * media) / (n - 1)))
+            resultado[persona_id] = {
+                "execucoes": n,
+                "falhas": falhas,
+                "taxa_falha": round(falhas / n, 4),
+                "media": round(media, 2),
+                "desvio": round(desvio, 2) if desvio is not None else None,
+            }
+        return resultado
+
+    def priorizar(
+        self,
+        collection_id: str,
+        persona_ids: Sequence[str],
+        n: Optional[int] = None,
+        rng: Optional[random.Random] = None,
+        peso_variancia: float = PESO_VARIANCIA
+    ) -> list[str]:
+        """
+        Ordena as personas da mais para a menos provável de revelar uma falha.
+
+        Args:
+            collection_id: Coleção cujo histórico é usado
+            persona_ids: Candidatas
+            n: Devolve só as N primeiras (padrão: todas, reordenadas)
+            rng: Gerador para o sorteio (semente fixa = ordem reproduzível)
+            peso_variancia: Peso do bônus de variância do score (0 = só falhas)
+
+        Returns:
+            IDs na ordem em que devem ser executados
+        """
+        rng = rng or random.Random()
+        estatisticas = self.estatisticas(collection_id)
+
+        prioridades = {}
+        for persona_id in persona_ids:
+            est = estatisticas.get(persona_id)
+            execucoes = est["execucoes"] if est else 0
+            falhas = est["falhas"] if est else 0
+            desvio = est["desvio"] if est and est["desvio"] is not None else DESVIO_PRIOR
+            # Thompson sampling sobre P(falha) ~ Beta(1 + falhas, 1 + aprovações)
+            p_falha = rng.betavariate(1 + falhas, 1 + execucoes - falhas)
+            prioridades[persona_id] = p_falha + peso_variancia * min(desvio / DESVIO_MAXIMO, 1.0)
+
+        ordem = sorted(persona_ids, key=lambda pid: prioridades[pid], reverse=True)
+        if n is not None:
+            ordem = ordem[:n]
+        logger.info(
+            "Personas priorizadas pelo histórico da coleção %s (%s com histórico): %s%s",
+            collection_id, len(estatisticas), ordem[:5], "..." if len(ordem) > 5 else ""
+        )
+        return ordem
+
+    def fechar(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_historicos: dict[str, HistoricoPersonas] = {}
+_historicos_lock = threading.Lock()
+
+
+def abrir_historico(caminho: Optional[str] = None) -> HistoricoPersonas:
+    """
+    Histórico compartilhado do processo para o arquivo dado.
+
+    Args:
+        caminho: Banco SQLite (padrão: QA_PERSONA_HISTORY ou persona_history.db)
+    """
+    caminho = caminho or os.getenv("QA_PERSONA_HISTORY", DEFAULT_CAMINHO_HISTORICO)
+    with _historicos_lock:
+        if caminho not in _historicos:
+            _historicos[caminho] = HistoricoPersonas(caminho)
+        return _historicos[caminho]
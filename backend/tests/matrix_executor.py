@@ -0,0 +1,328 @@
+"""
+Matrix Executor - Execução paralela de matrizes de testes (N prompts x M personas).
+
+Este módulo fornece:
+- Agendamento das N x M células em um pool limitado de workers (threads)
+- Work-stealing: cada worker tem sua fila; ao esvaziá-la, rouba células do
+  final da fila mais cheia, então personas lentas não travam uma "faixa"
+- Streaming dos resultados na ordem em que as células terminam
+- Cancelamento das células restantes
+- Checkpoint opcional: células concluídas são gravadas e puladas na retomada
+"""
+
+import contextvars
+import logging
+import os
+import queue
+import threading
+import uuid
+from collections import deque
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Callable, Iterator, Optional, Union
+
+if TYPE_CHECKING:
+    from agno.agent import Agent
+
+from tests.test_executor import executar_teste_com_persona, DEFAULT_MAX_TURNOS
+from tests.checkpoint import CheckpointStore, chave_celula
+from telemetry import LLMTracer
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_WORKERS = 4
+
+# Agente compartilhado ou fábrica que cria um agente por worker
+AgenteOuFabrica = Union["Agent", Callable[[], "Agent"]]
+
+
+@dataclass(frozen=True)
+class CelulaMatriz:
+    """Uma célula da matriz: um prompt de teste x uma persona."""
+    indice: int
+    indice_prompt: int
+    indice_persona: int
+    prompt_teste: str
+    persona_id: str
+
+
+class FilasWorkStealing:
+    """
+    Conjunto de filas (uma por worker) com roubo de trabalho.
+
+    O dono consome do início da sua fila; quem rouba pega do final da fila
+    mais cheia. Como cada célula dura segundos/minutos, um único lock basta.
+    """
+
+    def __init__(self, celulas: list[CelulaMatriz], num_filas: int):
+        self._lock = threading.Lock()
+        self._filas = [deque() for _ in range(num_filas)]
+        for i, celula in enumerate(celulas):
+            self._filas[i % num_filas].append(celula)
+        self.roubos = 0
+
+    def proxima(self, worker: int) -> Optional[CelulaMatriz]:
+        with self._lock:
+            propria = self._filas[worker]
+            if propria:
+                return propria.popleft()
+            vitima = max(self._filas, key=len)
+            if not vitima:
+                return None
+            self.roubos += 1
+            return vitima.pop()
+
+    def descartar_restantes(self) -> list[CelulaMatriz]:
+        with self._lock:
+            restantes = [c for fila in self._filas for c in fila]
+            for fila in self._filas:
+                fila.clear()
+            return restantes
+
+
+class ExecucaoMatriz:
+    """
+    Execução de uma matriz N prompts x M personas sobre um pool de workers.
+
+    Args:
+        prompts_teste: Caminhos de arquivos .md (ou conteúdos, se is_file_path=False)
+        persona_ids: Lista de IDs de personas
+        agente_alvo: Agente testado ou fábrica sem argumentos que cria um agente.
+                     Com um Agent e mais de um worker, cada worker usa uma cópia
+                     (`deep_copy`) para não misturar sessões entre células.
+        max_turnos: Máximo de turnos por teste
+        personas_path: Caminho para JSON de personas (opcional)
+        is_file_path: Se True, os prompts são caminhos de arquivo
+        max_workers: Número de workers simultâneos
+        tracer: Rastreador de chamadas LLM compartilhado (opcional)
+        estrategia_historico: Estratégia de histórico das conversas
+        checkpoint: Store onde cada célula concluída é gravada (opcional)
+        session_id: ID da execução; com checkpoint, células já gravadas para
+                    este ID não são executadas de novo
+        api_key: Chave OpenAI dos agentes testadores (padrão: OPENAI_API_KEY)
+
+    Example:
+        >>> execucao = ExecucaoMatriz(testes, personas, sofia, max_workers=8)
+        >>> for resultado in execucao.resultados():
+        ...     print(resultado["prompt_teste"], resultado["persona_id"])
+        ...     if deve_parar(resultado):
+        ...         execucao.cancelar()
+    """
+
+    def __init__(
+        self,
+        prompts_teste: list[str],
+        persona_ids: list[str],
+        agente_alvo: AgenteOuFabrica,
+        max_turnos: int = DEFAULT_MAX_TURNOS,
+        personas_path: Optional[str] = None,
+        is_file_path: bool = True,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        tracer: Optional[LLMTracer] = None,
+        estrategia_historico: Optional[Any] = None,
+        checkpoint: Optional[CheckpointStore] = None,
+        session_id: Optional[str] = None,
+        api_key: Optional[str] = None
+    ):
+        self.prompts_teste = prompts_teste
+        self.persona_ids = persona_ids
+        self.agente_alvo = agente_alvo
+        self.max_turnos = max_turnos
+        self.personas_path = personas_path
+        self.is_file_path = is_file_path
+        self.tracer = tracer or LLMTracer()
+        self.estrategia_historico = estrategia_historico
+        self.checkpoint = checkpoint
+        self.api_key = api_key
+        self.session_id = session_id or f"MATRIX_{uuid.uuid4().hex[:8].upper()}"
+
+        celulas = [
+            CelulaMatriz(
+                indice=i_prompt * len(persona_ids) + i_persona,
+                indice_prompt=i_prompt,
+                indice_persona=i_persona,
+                prompt_teste=prompt,
+                persona_id=persona_id,
+            )
+            for i_prompt, prompt in enumerate(prompts_teste)
+            for i_persona, persona_id in enumerate(persona_ids)
+        ]
+        self.total = len(celulas)
+
+        # Separa as células já concluídas em uma execução anterior
+        self.retomadas: list[dict] = []
+        if checkpoint is not None:
+            salvas = checkpoint.carregar(self.session_id)
+            if checkpoint.obter_sessao(self.session_id) is None:
+                checkpoint.registrar_sessao(self.session_id, {
+                    "prompts_teste": prompts_teste,
+                    "persona_ids": persona_ids,
+                    "max_turnos": max_turnos,
+                    "is_file_path": is_file_path
+                })
+            pendentes = []
+            for celula in celulas:
+                salvo = salvas.get(self._chave(celula), {}).get("conversa")
+                if salvo is not None:
+                    self.retomadas.append(salvo)
+                else:
+                    pendentes.append(celula)
+            celulas = pendentes
+            if self.retomadas:
+                logger.info("Retomando matriz %s: %s células com checkpoint", self.session_id, len(self.retomadas))
+
+        self.celulas = celulas
+        self.max_workers = max(1, min(max_workers, len(celulas) or 1))
+
+        self._filas = FilasWorkStealing(self.celulas, self.max_workers)
+        self._resultados: queue.Queue = queue.Queue()
+        self._cancelado = threading.Event()
+        self._iniciado = False
+        self.concluidas = 0
+        self.canceladas: list[CelulaMatriz] = []
+
+    def _agente_do_worker(self, worker: int) -> "Agent":
+        if not hasattr(self.agente_alvo, "run") and callable(self.agente_alvo):
+            return self.agente_alvo()
+        if worker > 0 and hasattr(self.agente_alvo, "deep_copy"):
+            return self.agente_alvo.deep_copy()
+        return self.agente_alvo
+
+    def _nome_prompt(self, celula: CelulaMatriz) -> str:
+        if self.is_file_path:
+            return os.path.basename(celula.prompt_teste)
+        return f"prompt_{celula.indice_prompt + 1}"
+
+    def _chave(self, celula: CelulaMatriz) -> str:
+        # Índice do prompt desambigua o mesmo arquivo repetido na matriz
+        return chave_celula(celula.persona_id, f"{celula.indice_prompt}:{self._nome_prompt(celula)}")
+
+    def _executar_celula(self, celula: CelulaMatriz, agente: "Agent") -> dict:
+        try:
+            resultado = executar_teste_com_persona(
+                prompt_teste=celula.prompt_teste,
+                persona_id=celula.persona_id,
+                agente_alvo=agente,
+                max_turnos=self.max_turnos,
+                personas_path=self.personas_path,
+                is_file_path=self.is_file_path,
+                tracer=self.tracer,
+                estrategia_historico=self.estrategia_historico,
+                api_key=self.api_key
+            )
+        except Exception as e:
+            logger.error("Erro na célula %s x %s: %s", self._nome_prompt(celula), celula.persona_id, e)
+            resultado = {
+                "test_id": f"ERRO_{uuid.uuid4().hex[:8].upper()}",
+                "persona_id": celula.persona_id,
+                "erro": str(e)
+            }
+        resultado["prompt_teste"] = self._nome_prompt(celula)
+        resultado["celula"] = celula.indice
+        if self.checkpoint is not None and "erro" not in resultado:
+            self.checkpoint.registrar_conversa(self.session_id, self._chave(celula), resultado)
+        return resultado
+
+    def _worker(self, worker: int) -> None:
+        try:
+            agente = self._agente_do_worker(worker)
+            while not self._cancelado.is_set():
+                celula = self._filas.proxima(worker)
+                if celula is None:
+                    break
+                self._resultados.put(self._executar_celula(celula, agente))
+        except Exception as e:
+            logger.error("Worker %s da matriz falhou: %s", worker, e)
+        finally:
+            self._resultados.put(None)
+
+    def iniciar(self) -> None:
+        """Inicia os workers (chamado automaticamente por `resultados`)."""
+        if self._iniciado:
+            return
+        self._iniciado = True
+        logger.info(
+            "Iniciando matriz de testes: %s testes x %s personas = %s execuções (%s workers)",
+            len(self.prompts_teste), len(self.persona_ids), self.total, self.max_workers
+        )
+        # Cada worker roda em uma cópia do contexto de quem iniciou a matriz
+        # (campos de log como collection_id/run_id); uma cópia por thread
+        for worker in range(self.max_workers):
+            threading.Thread(
+                target=contextvars.copy_context().run, args=(self._worker, worker), daemon=True
+            ).start()
+
+    def cancelar(self) -> None:
+        """Impede o início de novas células; as que estão em execução terminam normalmente."""
+        self._cancelado.set()
+        self.canceladas.extend(self._filas.descartar_restantes())
+        logger.info("Matriz cancelada. %s células não executadas.", len(self.canceladas))
+
+    def resultados(self) -> Iterator[dict]:
+        """
+        Gera os resultados das células conforme terminam.
+
+        Células retomadas do checkpoint são geradas primeiro. Se o consumidor
+        interromper a iteração, as células restantes são canceladas.
+        """
+        for resultado in self.retomadas:
+            self.concluidas += 1
+            yield resultado
+
+        self.iniciar()
+        workers_ativos = self.max_workers if self.celulas else 0
+        try:
+            while workers_ativos:
+                resultado = self._resultados.get()
+                if resultado is None:
+                    workers_ativos -= 1
+                    continue
+                self.concluidas += 1
+                logger.info(
+                    "Célula %s/%s concluída: %s x %s",
+                    self.concluidas, self.total, resultado["prompt_teste"], resultado["persona_id"]
+                )
+                yield resultado
+        finally:
+            if workers_ativos:
+                self.cancelar()
+        logger.info(
+            "Matriz concluída. %s testes executados, %s células redistribuídas por work-stealing.",
+            self.concluidas, self._filas.roubos
+        )
+
+
+def executar_matriz_stream(
+    prompts_teste_paths: list[str],
+    persona_ids: list[str],
+    agente_alvo: AgenteOuFabrica,
+    max_turnos: int = DEFAULT_MAX_TURNOS,
+    personas_path: Optional[str] = None,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    **kwargs
+) -> Iterator[dict]:
+    """
+    Executa a matriz N x M em paralelo, gerando cada resultado ao terminar.
+
+    Args:
+        prompts_teste_paths: Lista de caminhos para arquivos .md de teste
+        persona_ids: Lista de IDs de personas
+        agente_alvo: Agente testado ou fábrica de agentes
+        max_turnos: Máximo de turnos por teste
+        personas_path: Caminho para JSON de personas (opcional)
+        max_workers: Número de workers simultâneos
+        **kwargs: Demais opções de ExecucaoMatriz (is_file_path, tracer, ...)
+
+    Returns:
+        Iterador de resultados (ordem de conclusão). Cada resultado traz
+        "celula" (índice prompt-major) e "prompt_teste".
+
+    Example:
+        >>> for r in executar_matriz_stream(testes, personas, lambda: criar_sofia()):
+        ...     print(r["celula"], r.get("finalizado_naturalmente"))
+    """
+    execucao = ExecucaoMatriz(
+        prompts_teste_paths, persona_ids, agente_alvo,
+        max_turnos=max_turnos, personas_path=personas_path,
+        max_workers=max_workers, **kwargs
+    )
+    yield from execucao.resultados()
@@ -5,33 +5,62 @@ Este módulo fornece funções para:
 - Detectar fim de conversa
 - Executar testes individuais com personas
 - Executar baterias de testes (1 teste x N personas)
+- Acompanhar baterias por eventos (gerador síncrono ou assíncrono)
 - Executar matrizes de testes (N testes x M personas)
 - Análise consolidada com agente juiz
 """
 
+import asyncio
+import contextvars
 import logging
+import math
 import os
+import queue
 import re
+import threading
 import uuid
 import random
-from collections import Counter
 from datetime import datetime
-from typing import Optional, Any
+from typing import TYPE_CHECKING, Any, AsyncIterator, Callable, Iterator, Optional, Union
 
-from agno.agent import Agent
+if TYPE_CHECKING:
+    from agno.agent import Agent
 
 # Importar PersonaInjector do módulo core
 import sys
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from core.persona_injector import PersonaInjector, gerar_dados_cliente_aleatorios
+from core.context_window import ContextWindow
+from core.persona_catalog import abrir_catalogo, caminho_personas_padrao
+from core.persona_features import cobertura, selecionar_k_centro, vetores_personas
+from tests.checkpoint import CheckpointStore, chave_celula
+from tests.aggregation import CriterioParada, MatrizScores
+from tests.clustering import IndiceAchados
+from tests.batch_judge import JuizEmLote
+from tests.history import HistoricoPersonas, abrir_historico
+from tests.events import (
+    EventoBateria,
+    PersonaIniciada,
+    TurnoConversa,
+    ConversaConcluida,
+    ConversaAvaliada,
+    AgregadoAtualizado,
+    ParadaAntecipada,
+    BateriaConcluida
+)
+from telemetry import LLMTracer
+from conversation import ALVO, LIMITE, TESTADOR, ConversationHook, ConversationRunner, EstadoConversa, Turno
+from credentials import criar_modelo
+from agents import novo_agente
+from judge import avaliar_com_reparo, montar_pedido_juiz
+from logs import AMOSTRA_TURNO, contexto_log
 
-# Configuração de logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Constantes padrão
 DEFAULT_MAX_TURNOS = 20
 DEFAULT_NUM_PERSONAS = 5
+DEFAULT_MODELO_TESTADOR = "gpt-4.1"
 
 
 # Padrões para detecção de fim de conversa
@@ -91,7 +120,7 @@ def detectar_fim_conversa(conversa: list[dict]) -> bool:
         # Verificar padrões de fim
         for padrao in PADROES_FIM_CONVERSA:
             if re.search(padrao, content, re.IGNORECASE):
-                logger.info(f"Fim detectado: padrão '{padrao}'")
+                logger.info("Fim detectado: padrão '%s'", padrao)
                 return True
     
     # Verificar despedida bilateral (últimas 2 mensagens)
@@ -119,13 +148,60 @@ def detectar_fim_conversa(conversa: list[dict]) -> bool:
     return False
 
 
+# Papéis da conversa com persona: o testador é o "user" (cliente) e o alvo o "assistant"
+PAPEIS_CONVERSA = {TESTADOR: "user", ALVO: "assistant"}
+MENSAGEM_RESERVA_TESTADOR = "oi, quero limpar meu sofa"
+
+
+def _mensagem_conversa(turno: Turno, rotulo: str) -> dict:
+    # A abertura e a primeira resposta do alvo são o turno 1; depois, um por mensagem
+    return {
+        "turno": max(1, turno.indice - 1),
+        "role": rotulo,
+        "content": turno.conteudo,
+        "timestamp": datetime.now().isoformat()
+    }
+
+
+class ConversaPersona(ConversationHook):
+    """
+    Hooks da conversa com persona: repassa cada mensagem ao callback `ao_turno`,
+    encerra no fim natural (detectar_fim_conversa) e, se a abertura do testador
+    falhar, segue com uma mensagem de reserva.
+    """
+
+    def __init__(self, test_id: str, ao_turno: Optional[Callable[[str, dict], None]] = None):
+        self.test_id = test_id
+        self.callback = ao_turno
+
+    async def ao_turno(self, estado: EstadoConversa, turno: Turno) -> None:
+        mensagem = turno.mensagem
+        if self.callback is not None:
+            self.callback(self.test_id, mensagem)
+        quem = "Testador" if turno.papel == TESTADOR else "Alvo"
+        logger.info("Turno %d: %s → '%.50s...'", mensagem["turno"], quem, turno.conteudo, extra=AMOSTRA_TURNO)
+
+    async def fim(self, estado: EstadoConversa) -> bool:
+        # A abertura sozinha não encerra a conversa
+        return len(estado.transcricao) > 1 and detectar_fim_conversa(estado.transcricao)
+
+    async def recuperar(self, estado: EstadoConversa, papel: str, erro: Exception) -> Optional[str]:
+        if papel == TESTADOR and not estado.turnos:
+            return MENSAGEM_RESERVA_TESTADOR
+        return None
+
+
 def executar_teste_com_persona(
     prompt_teste: str,
     persona_id: str,
-    agente_alvo: Agent,
+    agente_alvo: "Agent",
     max_turnos: int = DEFAULT_MAX_TURNOS,
     personas_path: Optional[str] = None,
-    is_file_path: bool = False
+    is_file_path: bool = False,
+    tracer: Optional[LLMTracer] = None,
+    estrategia_historico: Optional[Union[str, ContextWindow]] = None,
+    ao_turno: Optional[Callable[[str, dict], None]] = None,
+    api_key: Optional[str] = None
 ) -> dict:
     """
     Executa 1 teste completo com uma persona específica.
@@ -138,6 +214,11 @@ def executar_teste_com_persona(
         personas_path: Caminho para JSON de personas (opcional)
         is_file_path: Se True, prompt_teste é um caminho de arquivo. 
                       Se False, prompt_teste é o conteúdo direto do prompt.
+        tracer: Rastreador de chamadas LLM (opcional, cria um se não fornecido)
+        estrategia_historico: Estratégia de histórico ("nativo", "janela", "tokens",
+                              "resumo"...) ou ContextWindow configurado
+        ao_turno: Callback chamado com (test_id, mensagem) a cada mensagem da conversa
+        api_key: Chave OpenAI do agente testador (padrão: OPENAI_API_KEY do ambiente)
     
     Returns:
         Dicionário com resultado do teste:
@@ -152,7 +233,10 @@ def executar_teste_com_persona(
             "total_turnos": int,
             "finalizado_naturalmente": bool,
             "conversa": list,
-            "dados_cliente_usados": dict
+            "dados_cliente_usados": dict,
+            "metricas_llm": dict,
+            "latencia_turnos": dict,  # latência por papel (ver EstadoConversa.resumo_tempos)
+            "contexto": dict
         }
     
     Example:
@@ -174,9 +258,7 @@ def executar_teste_com_persona(
     """
     # Configurar caminho das personas
     if personas_path is None:
-        # Usar caminho padrão relativo
-        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        personas_path = os.path.join(base_dir, "core", "personas_genericas_puras.json")
+        personas_path = caminho_personas_padrao()
     
     # Carregar prompt de teste
     if is_file_path:
@@ -205,127 +287,80 @@ def executar_teste_com_persona(
         dados_opcionais=dados_cliente
     )
     
-    # Criar agente testador
-    testador = Agent(
-        description=f"Cliente {persona['nome']}",
+    # Criar agente testador (a descrição abre o system prompt: fica fixa e a
+    # persona vai no fim das instruções, ver criar_prompt_testador)
+    testador = novo_agente(
+        model=criar_modelo(DEFAULT_MODELO_TESTADOR, api_key),
+        description="Cliente simulado em um teste de QA",
         instructions=[prompt_testador],
         markdown=False
     )
     
     # Inicializar resultado
     test_id = f"TEST_{uuid.uuid4().hex[:8].upper()}"
+    if tracer is None:
+        tracer = LLMTracer()
+    rotulos = {"persona_id": persona_id, "test_id": test_id}
+    contexto = ContextWindow.criar(estrategia_historico)
     timestamp_inicio = datetime.now().isoformat()
-    conversa: list[dict] = []
-    
-    logger.info(f"Iniciando teste {test_id} com persona {persona_id} ({persona['nome']})")
-    
-    # Loop de conversa
-    turno = 0
-    finalizado_naturalmente = False
-    
-    # Mensagem inicial do testador
-    try:
-        msg_testador = testador.run("Inicie a conversa como descrito na Fase 1.")
-        msg_testador_content = msg_testador.content if hasattr(msg_testador, 'content') else str(msg_testador)
-    except Exception as e:
-        logger.error(f"Erro ao iniciar testador: {e}")
-        msg_testador_content = "oi, quero limpar meu sofa"
-    
-    conversa.append({
-        "turno": 1,
-        "role": "user",
-        "content": msg_testador_content,
-        "timestamp": datetime.now().isoformat()
-    })
+    runner = ConversationRunner(
+        testador, agente_alvo, tracer,
+        abertura="Inicie a conversa como descrito na Fase 1.",
+        # A abertura conta como turno 1; depois, pares alvo + testador até max_turnos
+        max_mensagens=1 + 2 * math.ceil(max_turnos / 2),
+        contexto=contexto,
+        hooks=[ConversaPersona(test_id, ao_turno)],
+        rotulos=PAPEIS_CONVERSA,
+        formatar_mensagem=_mensagem_conversa,
+        rotulos_tracer=rotulos,
+        em_thread=False,
+        propagar_erros=False
+    )
     
-    logger.info(f"Turno 1: Testador → '{msg_testador_content[:50]}...'")
+    with contexto_log(test_id=test_id, persona_id=persona_id):
+        logger.info("Iniciando teste com persona %s", persona["nome"])
     
-    while turno < max_turnos:
-        turno += 1
-        
-        # Agente alvo responde
-        try:
-            msg_alvo = agente_alvo.run(msg_testador_content)
-            msg_alvo_content = msg_alvo.content if hasattr(msg_alvo, 'content') else str(msg_alvo)
-        except Exception as e:
-            logger.error(f"Erro no agente alvo: {e}")
-            break
-        
-        conversa.append({
-            "turno": turno,
-            "role": "assistant",
-            "content": msg_alvo_content,
-            "timestamp": datetime.now().isoformat()
-        })
-        
-        logger.info(f"Turno {turno}: Alvo → '{msg_alvo_content[:50]}...'")
-        
-        # Verificar fim de conversa
-        if detectar_fim_conversa(conversa):
-            finalizado_naturalmente = True
-            logger.info("Conversa finalizada naturalmente")
-            break
-        
-        # Testador responde
-        try:
-            msg_testador = testador.run(msg_alvo_content)
-            msg_testador_content = msg_testador.content if hasattr(msg_testador, 'content') else str(msg_testador)
-        except Exception as e:
-            logger.error(f"Erro no testador: {e}")
-            break
-        
-        turno += 1
-        conversa.append({
-            "turno": turno,
-            "role": "user",
-            "content": msg_testador_content,
-            "timestamp": datetime.now().isoformat()
-        })
-        
-        logger.info(f"Turno {turno}: Testador → '{msg_testador_content[:50]}...'")
-        
-        # Verificar fim após resposta do testador
-        if detectar_fim_conversa(conversa):
-            finalizado_naturalmente = True
+        estado = runner.executar_sincrono()
+        conversa = estado.transcricao
+        finalizado_naturalmente = estado.finalizado_naturalmente
+        if finalizado_naturalmente:
             logger.info("Conversa finalizada naturalmente")
-            break
-    
-    # Calcular duração
-    timestamp_fim = datetime.now().isoformat()
-    duracao = (
-        datetime.fromisoformat(timestamp_fim) - 
-        datetime.fromisoformat(timestamp_inicio)
-    ).total_seconds()
-    
-    if turno >= max_turnos and not finalizado_naturalmente:
-        logger.warning(f"Conversa atingiu limite de {max_turnos} turnos")
-    
-    resultado = {
-        "test_id": test_id,
-        "persona_id": persona_id,
-        "persona_nome": persona["nome"],
-        "prompt_teste": prompt_nome,
-        "timestamp_inicio": timestamp_inicio,
-        "timestamp_fim": timestamp_fim,
-        "duracao_segundos": round(duracao, 2),
-        "total_turnos": len(conversa),
-        "finalizado_naturalmente": finalizado_naturalmente,
-        "conversa": conversa,
-        "dados_cliente_usados": dados_cliente
-    }
+        elif estado.motivo == LIMITE:
+            logger.warning("Conversa atingiu limite de %s turnos", max_turnos)
+    
+        timestamp_fim = estado.fim.isoformat()
+        duracao = (estado.fim - datetime.fromisoformat(timestamp_inicio)).total_seconds()
+    
+        resultado = {
+            "test_id": test_id,
+            "persona_id": persona_id,
+            "persona_nome": persona["nome"],
+            "prompt_teste": prompt_nome,
+            "timestamp_inicio": timestamp_inicio,
+            "timestamp_fim": timestamp_fim,
+            "duracao_segundos": round(duracao, 2),
+            "total_turnos": len(conversa),
+            "finalizado_naturalmente": finalizado_naturalmente,
+            "conversa": conversa,
+            "dados_cliente_usados": dados_cliente,
+            "metricas_llm": tracer.resumo(test_id=test_id),
+            "latencia_turnos": estado.resumo_tempos(),
+            "contexto": contexto.economia()
+        }
     
-    logger.info(f"Teste {test_id} concluído. Turnos: {len(conversa)}, Natural: {finalizado_naturalmente}")
+        logger.info("Teste %s concluído. Turnos: %s, Natural: %s", test_id, len(conversa), finalizado_naturalmente)
     
-    return resultado
+        return resultado
 
 
 def executar_bateria_testes(
     prompt_teste: str,
     persona_ids: list[str],
-    agente_alvo: Agent,
+    agente_alvo: "Agent",
     max_turnos: int = DEFAULT_MAX_TURNOS,
     personas_path: Optional[str] = None,
-    is_file_path: bool = False
+    is_file_path: bool = False,
+    api_key: Optional[str] = None
 ) -> list[dict]:
     """
     Executa mesmo teste com múltiplas personas.
@@ -337,6 +372,7 @@ def executar_bateria_testes(
         max_turnos: Máximo de turnos por teste (padrão: 20)
         personas_path: Caminho para JSON de personas (opcional)
         is_file_path: Se True, prompt_teste é um caminho de arquivo
+        api_key: Chave OpenAI do agente testador (opcional)
     
     Returns:
         Lista de resultados (um por persona)
@@ -351,12 +387,12 @@ def executar_bateria_testes(
         ... )
         >>> print(f"Executados: {len(resultados)} testes")
     """
-    logger.info(f"Iniciando bateria de testes com {len(persona_ids)} personas")
+    logger.info("Iniciando bateria de testes com %s personas", len(persona_ids))
     
     resultados = []
     
     for i, persona_id in enumerate(persona_ids, 1):
-        logger.info(f"Executando teste {i}/{len(persona_ids)}: {persona_id}")
+        logger.info("Executando teste %s/%s: %s", i, len(persona_ids), persona_id)
         
         try:
             resultado = executar_teste_com_persona(
@@ -365,40 +401,60 @@ def executar_bateria_testes(
                 agente_alvo=agente_alvo,
                 max_turnos=max_turnos,
                 personas_path=personas_path,
-                is_file_path=is_file_path
+                is_file_path=is_file_path,
+                api_key=api_key
             )
             resultados.append(resultado)
         except Exception as e:
-            logger.error(f"Erro no teste com {persona_id}: {e}")
+            logger.error("Erro no teste com %s: %s", persona_id, e)
             resultados.append({
                 "test_id": f"ERRO_{uuid.uuid4().hex[:8].upper()}",
                 "persona_id": persona_id,
                 "erro": str(e)
             })
     
-    logger.info(f"Bateria concluída. {len(resultados)} testes executados.")
+    logger.info("Bateria concluída. %s testes executados.", len(resultados))
     return resultados
 
 
 def executar_matriz_testes(
     prompts_teste_paths: list[str],
     persona_ids: list[str],
-    agente_alvo: Agent,
+    agente_alvo: "Agent",
     max_turnos: int = 20,
-    personas_path: Optional[str] = None
+    personas_path: Optional[str] = None,
+    max_workers: int = 4,
+    estrategia_historico: Optional[Union[str, ContextWindow]] = None,
+    checkpoint: Optional[CheckpointStore] = None,
+    session_id: Optional[str] = None,
+    juiz_em_lote: Optional[JuizEmLote] = None,
+    regras_agente: str = "",
+    api_key: Optional[str] = None
 ) -> list[dict]:
     """
     Executa múltiplos testes com múltiplas personas (matriz N x M).
     
+    As células são executadas em paralelo por `tests.matrix_executor`
+    (pool limitado com work-stealing). Para receber os resultados conforme
+    terminam, ou cancelar no meio, use `executar_matriz_stream`.
+    
     Args:
         prompts_teste_paths: Lista de caminhos para arquivos .md de teste
         persona_ids: Lista de IDs de personas
-        agente_alvo: Agente sendo testado
+        agente_alvo: Agente sendo testado (ou fábrica sem argumentos de agentes)
         max_turnos: Máximo de turnos por teste
         personas_path: Caminho para JSON de personas (opcional)
+        max_workers: Número de células executadas simultaneamente
+        estrategia_historico: Estratégia de histórico das conversas
+        checkpoint: Store onde cada célula concluída é gravada (opcional)
+        session_id: ID da execução; repetir o mesmo ID retoma a matriz
+        juiz_em_lote: Se informado, avalia todas as células em um lote da
+                      Batch API ao final (chave "avaliacao" de cada resultado)
+        regras_agente: Regras do agente para a análise do juiz
+        api_key: Chave OpenAI dos agentes testadores (opcional)
     
     Returns:
-        Lista de todos os resultados (N testes x M personas)
+        Lista de todos os resultados (N testes x M personas), na ordem prompt x persona
     
     Example:
         >>> testes = [
@@ -409,163 +465,408 @@ def executar_matriz_testes(
         >>> # 2 testes x 2 personas = 4 execuções
         >>> resultados = executar_matriz_testes(testes, personas, sofia)
     """
-    total = len(prompts_teste_paths) * len(persona_ids)
-    logger.info(
-        f"Iniciando matriz de testes: "
-        f"{len(prompts_teste_paths)} testes x {len(persona_ids)} personas = {total} execuções"
-    )
-    
-    resultados = []
-    contador = 0
-    
-    for prompt_path in prompts_teste_paths:
-        for persona_id in persona_ids:
-            contador += 1
-            logger.info(
-                f"Executando {contador}/{total}: "
-                f"{os.path.basename(prompt_path)} x {persona_id}"
-            )
-            
-            try:
-                resultado = executar_teste_com_persona(
-                    prompt_teste_path=prompt_path,
-                    persona_id=persona_id,
-                    agente_alvo=agente_alvo,
-                    max_turnos=max_turnos,
-                    personas_path=personas_path
-                )
-                resultados.append(resultado)
-            except Exception as e:
-                logger.error(f"Erro: {e}")
-                resultados.append({
-                    "test_id": f"ERRO_{uuid.uuid4().hex[:8].upper()}",
-                    "prompt_teste": os.path.basename(prompt_path),
-                    "persona_id": persona_id,
-                    "erro": str(e)
-                })
-    
-    logger.info(f"Matriz concluída. {len(resultados)} testes executados.")
+    from tests.matrix_executor import executar_matriz_stream
+    
+    resultados = list(executar_matriz_stream(
+        prompts_teste_paths,
+        persona_ids,
+        agente_alvo,
+        max_turnos=max_turnos,
+        personas_path=personas_path,
+        max_workers=max_workers,
+        estrategia_historico=estrategia_historico,
+        checkpoint=checkpoint,
+        session_id=session_id,
+        api_key=api_key
+    ))
+    resultados.sort(key=lambda r: r["celula"])
+    
+    if juiz_em_lote is not None:
+        avaliacoes = juiz_em_lote.avaliar(resultados, regras_agente, estrategia_historico)
+        for resultado in resultados:
+            if "test_id" in resultado and "erro" not in resultado:
+                resultado["avaliacao"] = avaliacoes.get(resultado["test_id"])
     return resultados
 
 
 def selecionar_personas(
     num_personas: int = DEFAULT_NUM_PERSONAS,
     modo: str = "aleatorio",
-    personas_path: Optional[str] = None
+    personas_path: Optional[str] = None,
+    historico: Optional[HistoricoPersonas] = None,
+    collection_id: Optional[str] = None,
+    filtros: Optional[dict] = None
 ) -> list[str]:
     """
     Seleciona N personas para usar nos testes.
     
     Args:
-        num_personas: Quantidade de personas a selecionar (1-20)
-        modo: "aleatorio", "sequencial", ou "diversificado"
-        personas_path: Caminho para JSON de personas (opcional)
+        num_personas: Quantidade de personas a selecionar (até o tamanho do catálogo filtrado)
+        modo: "aleatorio", "sequencial", ou "diversificado" (máxima
+              diversidade de stress, personalidade, tom e comportamentos)
+              ou "priorizado" (personas que mais falham/oscilam nesta
+              coleção primeiro, ver tests.history)
+        personas_path: Arquivo JSON/JSONL ou diretório de shards (padrão:
+                       QA_PERSONAS_PATH ou as 20 personas genéricas)
+        historico: Histórico usado no modo "priorizado" (padrão: abrir_historico())
+        collection_id: Coleção cujo histórico é usado no modo "priorizado"
+        filtros: Restringe os candidatos (CatalogoPersonas.filtrar), ex:
+                 {"nivel_stress": ["alto", "MÁXIMO"], "tags": ["financeiro"]}
     
     Returns:
         Lista de IDs de personas selecionadas
         
     Raises:
-        ValueError: Se num_personas < 1 ou > 20
+        ValueError: Se num_personas < 1 ou maior que as personas disponíveis,
+                    ou modo "priorizado" sem collection_id
     
     Example:
         >>> personas = selecionar_personas(5, modo="aleatorio")
         >>> print(personas)
         ['PERSONA_003', 'PERSONA_010', 'PERSONA_015', ...]
     """
-    # Validar quantidade
-    if num_personas < 1 or num_personas > 20:
-        raise ValueError(f"num_personas deve estar entre 1 e 20, recebido: {num_personas}")
-    
-    # Configurar caminho das personas
-    if personas_path is None:
-        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        personas_path = os.path.join(base_dir, "core", "personas_genericas_puras.json")
+    # Catálogo (índices em memória; corpos lidos só quando necessários)
+    catalogo = abrir_catalogo(personas_path or caminho_personas_padrao())
+    todas_ids = catalogo.filtrar(**filtros) if filtros else catalogo.ids()
     
-    # Carregar personas
-    injector = PersonaInjector(personas_path)
-    todas_ids = list(injector.personas.keys())
+    # Validar quantidade
+    if num_personas < 1 or num_personas > len(todas_ids):
+        raise ValueError(
+            f"num_personas deve estar entre 1 e {len(todas_ids)} (personas disponíveis), recebido: {num_personas}"
+        )
     
     if modo == "sequencial":
         # Pegar as primeiras N
         selecionadas = todas_ids[:num_personas]
     elif modo == "diversificado":
-        # Distribuir uniformemente pelo range
-        step = len(todas_ids) // num_personas
-        indices = [i * step for i in range(num_personas)]
-        selecionadas = [todas_ids[i] for i in indices[:num_personas]]
+        # K-center guloso sobre os vetores de características (stress,
+        # personalidade/tom e comportamentos): as N personas mais diferentes
+        personas = [catalogo.obter(pid) for pid in todas_ids]
+        matriz = vetores_personas(personas)
+        selecionadas = [todas_ids[i] for i in selecionar_k_centro(matriz, num_personas)]
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("Cobertura do catálogo: %s", cobertura(personas, selecionadas, matriz=matriz))
+    elif modo == "priorizado":
+        if collection_id is None:
+            raise ValueError("modo 'priorizado' requer collection_id")
+        historico = historico or abrir_historico()
+        selecionadas = historico.priorizar(collection_id, todas_ids, n=num_personas)
     else:  # aleatorio
         selecionadas = random.sample(todas_ids, num_personas)
     
-    logger.info(f"Selecionadas {len(selecionadas)} personas (modo: {modo})")
+    logger.info("Selecionadas %s personas (modo: %s)", len(selecionadas), modo)
     return selecionadas
 
 
-def executar_bateria_com_analise_juiz(
+class AgregadorBateria:
+    """
+    Consolida incrementalmente as avaliações de uma bateria.
+
+    Guarda apenas scores e pontos citados pelo juiz (não as conversas), então
+    a memória não cresce com o tamanho das conversas. Os scores ficam em uma
+    MatrizScores (tests.aggregation), de onde saem médias, distribuições,
+    intervalos de confiança e o ranking de personas. Pontos fortes, fracos e
+    recomendações são agrupados por similaridade (tests.clustering), então
+    paráfrases do mesmo achado contam como recorrência.
+    """
+
+    def __init__(self):
+        self.resultados_por_persona: list[dict] = []
+        self.total_testes = 0
+        self.pontos_fortes = IndiceAchados()
+        self.pontos_fracos = IndiceAchados()
+        self.recomendacoes = IndiceAchados()
+        self.scores = MatrizScores()
+        self.nomes_personas: dict[str, str] = {}
+        self.testes_aprovados = 0
+        self.testes_reprovados = 0
+        self.testes_atencao = 0
+
+    def adicionar(self, teste: dict, avaliacao: Optional[dict]) -> dict:
+        """
+        Contabiliza um teste (e sua avaliação, se houver).
+
+        Returns:
+            Entrada de `resultados_por_persona` correspondente
+        """
+        persona_id = teste.get("persona_id", "DESCONHECIDO")
+        persona_nome = teste.get("persona_nome", persona_id)
+        self.total_testes += 1
+
+        if "erro" in teste:
+            entrada = {
+                "persona_id": persona_id,
+                "persona_nome": persona_nome,
+                "scores": None,
+                "aprovado": False,
+                "erro": teste["erro"]
+            }
+        elif avaliacao and "scores" in avaliacao:
+            scores = avaliacao["scores"]
+            self.scores.adicionar(scores, persona_id)
+            self.nomes_personas[persona_id] = persona_nome
+            
+            # Coletar pontos fortes/fracos
+            if "resumo" in avaliacao:
+                self.pontos_fortes.adicionar_varios(avaliacao["resumo"].get("pontos_fortes", []), fonte=persona_id)
+                self.pontos_fracos.adicionar_varios(avaliacao["resumo"].get("pontos_fracos", []), fonte=persona_id)
+                self.recomendacoes.adicionar_varios(avaliacao["resumo"].get("recomendacoes", []), fonte=persona_id)
+                
+                resultado_status = avaliacao["resumo"].get("resultado", "ATENÇÃO")
+                if resultado_status == "APROVADO":
+                    self.testes_aprovados += 1
+                elif resultado_status == "REPROVADO":
+                    self.testes_reprovados += 1
+                else:
+                    self.testes_atencao += 1
+            
+            entrada = {
+                "persona_id": persona_id,
+                "persona_nome": persona_nome,
+                "scores": scores,
+                "aprovado": avaliacao.get("status_final", {}).get("aprovado", False),
+                "erro": None
+            }
+        else:
+            # Sem avaliação disponível
+            entrada = {
+                "persona_id": persona_id,
+                "persona_nome": persona_nome,
+                "scores": None,
+                "aprovado": False,
+                "erro": "Avaliação não disponível"
+            }
+
+        self.resultados_por_persona.append(entrada)
+        return entrada
+
+    def analise_geral(self) -> dict:
+        """Análise geral com os testes contabilizados até agora."""
+        # Médias, distribuição e IC de cada dimensão em uma passada
+        estatisticas = self.scores.estatisticas()
+        scores_medios = {
+            key: round(est["media"]) if est["media"] is not None else 0
+            for key, est in estatisticas.items()
+        }
+        
+        # Ranking de personas pelo score geral
+        ranking = [
+            {
+                "persona_id": r["rotulo"],
+                "persona_nome": self.nomes_personas.get(r["rotulo"], r["rotulo"]),
+                "testes": r["testes"],
+                "score_medio": r["media"],
+                "desvio": r["desvio"]
+            }
+            for r in self.scores.ranking("score_geral")
+        ]
+        melhores = [p["persona_nome"] for p in ranking[:3]]
+        piores = [p["persona_nome"] for p in ranking[-3:]] if len(ranking) >= 3 else []
+        
+        # Consolidar pontos recorrentes (grupos de achados parecidos, mais citados primeiro)
+        grupos_fortes = self.pontos_fortes.grupos(5)
+        grupos_fracos = self.pontos_fracos.grupos(5)
+        grupos_recomendacoes = self.recomendacoes.grupos(5)
+        
+        pontos_fortes_recorrentes = [g["representante"] for g in grupos_fortes]
+        pontos_fracos_recorrentes = [g["representante"] for g in grupos_fracos]
+        recomendacoes_prioritarias = [g["representante"] for g in grupos_recomendacoes]
+        
+        # Taxa de aprovação
+        total_analisados = self.testes_aprovados + self.testes_reprovados + self.testes_atencao
+        taxa_aprovacao = round((self.testes_aprovados / total_analisados * 100), 1) if total_analisados > 0 else 0
+        
+        # Gerar conclusão
+        if taxa_aprovacao >= 80:
+            conclusao = f"O agente teve excelente desempenho com taxa de aprovação de {taxa_aprovacao}%. Está pronto para produção com pequenos ajustes sugeridos."
+        elif taxa_aprovacao >= 60:
+            conclusao = f"O agente teve bom desempenho ({taxa_aprovacao}% aprovação) mas necessita melhorias nos pontos fracos identificados antes de ir para produção."
+        elif taxa_aprovacao >= 40:
+            conclusao = f"O agente teve desempenho abaixo do esperado ({taxa_aprovacao}% aprovação). Recomenda-se revisão significativa antes de produção."
+        else:
+            conclusao = f"O agente teve desempenho crítico ({taxa_aprovacao}% aprovação). Necessita reformulação antes de qualquer uso em produção."
+        
+        return {
+            "total_testes": self.total_testes,
+            "testes_aprovados": self.testes_aprovados,
+            "testes_reprovados": self.testes_reprovados,
+            "testes_atencao": self.testes_atencao,
+            "taxa_aprovacao": taxa_aprovacao,
+            "score_medio_geral": scores_medios.get("score_geral", 0),
+            "scores_medios": scores_medios,
+            "estatisticas": estatisticas,
+            "ranking_personas": ranking,
+            "personas_com_melhor_desempenho": melhores,
+            "personas_com_pior_desempenho": piores,
+            "pontos_fortes_recorrentes": pontos_fortes_recorrentes,
+            "pontos_fracos_recorrentes": pontos_fracos_recorrentes,
+            "recomendacoes_prioritarias": recomendacoes_prioritarias,
+            "grupos_recorrentes": {
+                "pontos_fortes": grupos_fortes,
+                "pontos_fracos": grupos_fracos,
+                "recomendacoes": grupos_recomendacoes
+            },
+            "conclusao": conclusao
+        }
+
+
+def _avaliar_com_juiz(
+    teste: dict,
+    agente_juiz: "Agent",
+    regras_agente: str,
+    tracer: LLMTracer,
+    estrategia_historico: Optional[Union[str, ContextWindow]] = None
+) -> Optional[dict]:
+    """Envia uma conversa ao juiz e extrai a avaliação estruturada (ou None)."""
+    persona_id = teste.get("persona_id", "DESCONHECIDO")
+    persona_nome = teste.get("persona_nome", persona_id)
+    avaliacao = None
+    
+    try:
+        # Formatar conversa para análise
+        contexto_juiz = ContextWindow.criar(estrategia_historico)
+        conversa_texto = contexto_juiz.transcricao_para_juiz(teste.get("conversa", []))
+        teste["contexto_juiz"] = contexto_juiz.economia()
+        
+        prompt_analise = montar_pedido_juiz(
+            conversa_texto,
+            cenario=teste.get("prompt_teste", "prompt_from_database"),
+            regras=regras_agente,
+            persona_id=persona_id,
+            persona_nome=persona_nome,
+            total_turnos=teste.get("total_turnos", 0)
+        )
+        
+        # Extrai/valida o JSON (com uma chamada de reparo só se necessário)
+        resultado_juiz = avaliar_com_reparo(
+            agente_juiz, prompt_analise, tracer,
+            persona_id=persona_id, test_id=teste.get("test_id")
+        )
+        avaliacao = resultado_juiz.como_dict()
+        if avaliacao is None:
+            logger.warning("Não foi possível interpretar a avaliação do juiz para %s: %s", persona_id, resultado_juiz.erro)
+        elif resultado_juiz.avaliacao is None:
+            logger.warning("Avaliação do juiz para %s aproveitada parcialmente: %s", persona_id, resultado_juiz.erro)
+        
+    except Exception as e:
+        logger.error("Erro na análise do juiz para %s: %s", persona_id, e)
+    
+    return avaliacao
+
+
+def _executar_conversa_stream(session_id: str, persona_id: str, **kwargs) -> Iterator[Union[TurnoConversa, dict]]:
+    """
+    Executa `executar_teste_com_persona` em uma thread, gerando cada mensagem
+    como TurnoConversa assim que é produzida. O último item é o resultado (dict).
+    """
+    fila: queue.Queue = queue.Queue()
+    fim = object()
+    
+    def ao_turno(test_id: str, mensagem: dict) -> None:
+        fila.put(TurnoConversa(
+            session_id=session_id,
+            persona_id=persona_id,
+            test_id=test_id,
+            turno=mensagem["turno"],
+            role=mensagem["role"],
+            content=mensagem["content"]
+        ))
+    
+    def executar() -> None:
+        try:
+            fila.put(executar_teste_com_persona(persona_id=persona_id, ao_turno=ao_turno, **kwargs))
+        except Exception as e:
+            fila.put(e)
+        finally:
+            fila.put(fim)
+    
+    # Thread com cópia do contexto: os logs da conversa levam collection_id/run_id
+    threading.Thread(target=contextvars.copy_context().run, args=(executar,), daemon=True).start()
+    while (item := fila.get()) is not fim:
+        if isinstance(item, Exception):
+            raise item
+        yield item
+
+
+def executar_bateria_stream(
     prompt_teste: str,
     num_personas: int = DEFAULT_NUM_PERSONAS,
-    agente_alvo: Optional[Agent] = None,
-    agente_juiz: Optional[Agent] = None,
+    agente_alvo: Optional["Agent"] = None,
+    agente_juiz: Optional["Agent"] = None,
     max_turnos: int = DEFAULT_MAX_TURNOS,
     regras_agente: str = "",
     modo_selecao: str = "aleatorio",
     personas_path: Optional[str] = None,
     persona_ids: Optional[list[str]] = None,
-    is_file_path: bool = False
-) -> dict:
+    is_file_path: bool = False,
+    estrategia_historico: Optional[Union[str, ContextWindow]] = None,
+    checkpoint: Optional[CheckpointStore] = None,
+    session_id: Optional[str] = None,
+    juiz_em_lote: Optional[JuizEmLote] = None,
+    criterio_parada: Optional[CriterioParada] = None,
+    api_key: Optional[str] = None,
+    historico: Optional[HistoricoPersonas] = None,
+    collection_id: Optional[str] = None,
+    filtros_personas: Optional[dict] = None
+) -> Iterator[EventoBateria]:
     """
-    Executa bateria de testes com múltiplas personas e análise consolidada do juiz.
+    Executa uma bateria com análise do juiz gerando eventos conforme avança.
     
-    O juiz analisa CADA teste separadamente, gera score individual,
-    e no final produz uma análise geral consolidada.
+    Cada persona é conversada e avaliada em sequência; a análise geral é
+    recalculada após cada avaliação. Nenhuma conversa fica retida pelo
+    gerador: quem consome decide o que guardar.
+    
+    Com `juiz_em_lote`, as conversas são todas executadas primeiro e as
+    avaliações pendentes vão em um único lote ao final; os eventos
+    ConversaAvaliada/AgregadoAtualizado dessas conversas saem depois do lote.
+    
+    Com `criterio_parada`, após cada avaliação o IC do score é comparado ao
+    alvo; quando fica claramente acima ou abaixo, as personas restantes não
+    são executadas (evento ParadaAntecipada). Não se aplica ao modo em lote,
+    em que as avaliações só chegam no fim.
+    
+    Com `historico` e `collection_id`, as personas são executadas na ordem de
+    prioridade do histórico (as que mais falham primeiro) e os resultados da
+    bateria são acumulados no histórico ao final. Com `criterio_parada`, o
+    histórico só escolhe as personas (modo "priorizado") e a ordem de execução
+    é sorteada: o IC da parada antecipada supõe avaliações em ordem aleatória.
     
     Args:
-        prompt_teste: Conteúdo do prompt OU caminho para arquivo .md do teste
-        num_personas: Quantidade de personas a usar (1-20)
-        agente_alvo: Agente sendo testado (obrigatório)
-        agente_juiz: Agente juiz para análise (opcional, cria um se não fornecido)
-        max_turnos: Máximo de turnos por teste (padrão: 20)
-        regras_agente: Regras do agente para análise do juiz
-        modo_selecao: "aleatorio", "sequencial", ou "diversificado"
-        personas_path: Caminho para JSON de personas
-        persona_ids: Lista específica de IDs (ignora num_personas e modo_selecao)
-        is_file_path: Se True, prompt_teste é um caminho de arquivo
+        Os mesmos de `executar_bateria_com_analise_juiz`.
     
-    Returns:
-        Dicionário com resultado consolidado:
-        {
-            "session_id": str,
-            "timestamp_inicio": str,
-            "timestamp_fim": str,
-            "duracao_total_segundos": float,
-            "num_personas": int,
-            "max_turnos_por_teste": int,
-            "prompt_teste_usado": str,
-            "resultados_por_persona": [...],
-            "testes_detalhados": [...],
-            "analise_geral": {...}
-        }
+    Yields:
+        PersonaIniciada, TurnoConversa, ConversaConcluida, ConversaAvaliada,
+        AgregadoAtualizado e, por fim, BateriaConcluida (ver tests.events)
     
     Example:
-        >>> # Usando prompt do banco de dados
-        >>> resultado = executar_bateria_com_analise_juiz(
-        ...     prompt_teste="Você é um cliente testando...",
-        ...     num_personas=5,
-        ...     agente_alvo=sofia_agent,
-        ...     regras_agente="Nunca revelar ser IA, sempre coletar nome e telefone"
-        ... )
+        >>> for evento in executar_bateria_stream(prompt, agente_alvo=sofia, agente_juiz=juiz):
+        ...     if isinstance(evento, ConversaAvaliada):
+        ...         print(evento.persona_id, evento.scores)
     """
     if agente_alvo is None:
         raise ValueError("agente_alvo é obrigatório")
+    if criterio_parada is not None and juiz_em_lote is not None:
+        logger.warning("criterio_parada ignorado: no modo em lote as avaliações só chegam no fim")
+        criterio_parada = None
     
     # Selecionar personas
     if persona_ids:
-        personas_selecionadas = persona_ids[:20]  # Limita a 20
+        personas_selecionadas = list(persona_ids)
+        if historico is not None and collection_id is not None and criterio_parada is None:
+            personas_selecionadas = historico.priorizar(collection_id, personas_selecionadas)
     else:
         personas_selecionadas = selecionar_personas(
             num_personas=num_personas,
             modo=modo_selecao,
-            personas_path=personas_path
+            personas_path=personas_path,
+            historico=historico,
+            collection_id=collection_id,
+            filtros=filtros_personas
         )
+    if criterio_parada is not None:
+        # O IC do critério supõe avaliações em ordem aleatória: executar as que
+        # mais falham primeiro puxaria a parada para "abaixo_do_alvo"
+        personas_selecionadas = random.sample(personas_selecionadas, len(personas_selecionadas))
     
     # Determinar nome do prompt
     if is_file_path:
@@ -574,243 +875,394 @@ def executar_bateria_com_analise_juiz(
         prompt_nome = "prompt_from_database"
     
     # Inicializar sessão
-    session_id = f"SESSION_{uuid.uuid4().hex[:8].upper()}"
+    session_id = session_id or f"SESSION_{uuid.uuid4().hex[:8].upper()}"
     timestamp_inicio = datetime.now().isoformat()
     
-    logger.info(f"=== INICIANDO SESSÃO {session_id} ===")
-    logger.info(f"Personas: {len(personas_selecionadas)}, Max turnos: {max_turnos}")
+    # Checkpoint: reaproveita células concluídas e registra parâmetros para retomada
+    concluidas = {}
+    if checkpoint is not None:
+        concluidas = checkpoint.carregar(session_id)
+        if checkpoint.obter_sessao(session_id) is None:
+            checkpoint.registrar_sessao(session_id, {
+                "prompt_teste": prompt_teste,
+                "persona_ids": personas_selecionadas,
+                "max_turnos": max_turnos,
+                "regras_agente": regras_agente,
+                "personas_path": personas_path,
+                "is_file_path": is_file_path,
+                "estrategia_historico": estrategia_historico if isinstance(estrategia_historico, str) else None
+            })
+        elif concluidas:
+            logger.info("Retomando sessão %s: %s personas com checkpoint", session_id, len(concluidas))
+    
+    tracer = LLMTracer(session_id=session_id)
+    agregador = AgregadorBateria()
+    total = len(personas_selecionadas)
+    pendentes_lote: list[dict] = []
+    violacoes_criticas = 0
+    parada = None
+    
+    def publicar_avaliacao(teste: dict, avaliacao: Optional[dict]) -> Iterator[EventoBateria]:
+        entrada = agregador.adicionar(teste, avaliacao)
+        yield ConversaAvaliada(
+            session_id=session_id,
+            persona_id=teste.get("persona_id", ""),
+            persona_nome=teste.get("persona_nome", teste.get("persona_id", "")),
+            test_id=teste.get("test_id", ""),
+            scores=entrada["scores"],
+            aprovado=entrada["aprovado"],
+            erro=entrada["erro"],
+            avaliacao=avaliacao
+        )
+        yield AgregadoAtualizado(
+            session_id=session_id,
+            concluidas=agregador.total_testes,
+            total=total,
+            analise_geral=agregador.analise_geral()
+        )
     
-    # Executar todos os testes primeiro
-    logger.info("FASE 1: Executando testes com todas as personas...")
-    testes_executados = []
+    logger.info("=== INICIANDO SESSÃO %s ===", session_id)
+    logger.info("Personas: %s, Max turnos: %s", total, max_turnos)
     
     for i, persona_id in enumerate(personas_selecionadas, 1):
-        logger.info(f"[{i}/{len(personas_selecionadas)}] Testando com {persona_id}...")
+        yield PersonaIniciada(session_id=session_id, persona_id=persona_id, indice=i, total=total)
+        salvo = concluidas.get(chave_celula(persona_id), {})
         
-        try:
-            resultado = executar_teste_com_persona(
-                prompt_teste=prompt_teste,
-                persona_id=persona_id,
-                agente_alvo=agente_alvo,
-                max_turnos=max_turnos,
-                personas_path=personas_path,
-                is_file_path=is_file_path
-            )
-            testes_executados.append(resultado)
-        except Exception as e:
-            logger.error(f"Erro no teste com {persona_id}: {e}")
-            testes_executados.append({
-                "test_id": f"ERRO_{uuid.uuid4().hex[:8].upper()}",
-                "persona_id": persona_id,
-                "persona_nome": persona_id,
-                "erro": str(e),
-                "conversa": []
-            })
-    
-    # FASE 2: Analisar cada teste com o juiz
-    logger.info("FASE 2: Analisando cada teste com o agente juiz...")
-    resultados_por_persona = []
-    pontos_fortes_todos = []
-    pontos_fracos_todos = []
-    recomendacoes_todas = []
-    scores_soma = {
-        "compliance": 0,
-        "eficacia": 0,
-        "eficiencia": 0,
-        "qualidade_comunicacao": 0,
-        "experiencia_usuario": 0,
-        "score_geral": 0
-    }
-    testes_aprovados = 0
-    testes_reprovados = 0
-    testes_atencao = 0
-    testes_com_score = 0
-    
-    for teste in testes_executados:
-        persona_id = teste.get("persona_id", "DESCONHECIDO")
-        persona_nome = teste.get("persona_nome", persona_id)
+        # Conversa (ou reaproveitamento do checkpoint)
+        teste = salvo.get("conversa")
+        if teste is not None:
+            logger.info("[%s/%s] %s já concluído (checkpoint)", i, total, persona_id)
+        else:
+            logger.info("[%s/%s] Testando com %s...", i, total, persona_id)
+            try:
+                for item in _executar_conversa_stream(
+                    session_id,
+                    persona_id,
+                    prompt_teste=prompt_teste,
+                    agente_alvo=agente_alvo,
+                    max_turnos=max_turnos,
+                    personas_path=personas_path,
+                    is_file_path=is_file_path,
+                    tracer=tracer,
+                    estrategia_historico=estrategia_historico,
+                    api_key=api_key
+                ):
+                    if isinstance(item, TurnoConversa):
+                        yield item
+                    else:
+                        teste = item
+                if checkpoint is not None:
+                    checkpoint.registrar_conversa(session_id, chave_celula(persona_id), teste)
+            except Exception as e:
+                logger.error("Erro no teste com %s: %s", persona_id, e)
+                teste = {
+                    "test_id": f"ERRO_{uuid.uuid4().hex[:8].upper()}",
+                    "persona_id": persona_id,
+                    "persona_nome": persona_id,
+                    "erro": str(e),
+                    "conversa": []
+                }
         
-        if "erro" in teste:
-            resultados_por_persona.append({
-                "persona_id": persona_id,
-                "persona_nome": persona_nome,
-                "scores": None,
-                "aprovado": False,
-                "erro": teste["erro"]
-            })
-            continue
+        persona_nome = teste.get("persona_nome", persona_id)
+        yield ConversaConcluida(
+            session_id=session_id,
+            persona_id=persona_id,
+            persona_nome=persona_nome,
+            test_id=teste.get("test_id", ""),
+            total_turnos=teste.get("total_turnos", 0),
+            finalizado_naturalmente=teste.get("finalizado_naturalmente", False),
+            duracao_segundos=teste.get("duracao_segundos", 0.0),
+            retomada=salvo.get("conversa") is not None,
+            erro=teste.get("erro"),
+            resultado=teste
+        )
         
-        # Analisar com juiz se disponível
+        # Avaliação do juiz (ou reaproveitamento do checkpoint)
         avaliacao = None
-        if agente_juiz is not None:
-            try:
-                # Formatar conversa para análise
-                conversa_texto = "\n".join([
-                    f"{msg['role'].upper()}: {msg['content']}"
-                    for msg in teste.get("conversa", [])
-                ])
-                
-                prompt_analise = f"""
-## REGRAS DO AGENTE
-{regras_agente}
-
-## CENÁRIO DO TESTE
-Teste com persona: {persona_nome} ({persona_id})
-Prompt: {os.path.basename(prompt_teste_path)}
-Total de turnos: {teste.get('total_turnos', 0)}
-
-## CONVERSA COMPLETA
-{conversa_texto}
-
-Analise esta conversa e forneça a avaliação no formato JSON especificado.
-"""
-                
-                resultado_juiz = agente_juiz.run(prompt_analise)
-                
-                # Tentar extrair dados estruturados
-                if hasattr(resultado_juiz, 'content'):
-                    import json
-                    try:
-                        # Se for um objeto Pydantic
-                        if hasattr(resultado_juiz.content, 'model_dump'):
-                            avaliacao = resultado_juiz.content.model_dump()
-                        elif isinstance(resultado_juiz.content, str):
-                            # Tentar parsear JSON do texto
-                            content = resultado_juiz.content
-                            if '{' in content:
-                                json_start = content.find('{')
-                                json_end = content.rfind('}') + 1
-                                avaliacao = json.loads(content[json_start:json_end])
-                        elif isinstance(resultado_juiz.content, dict):
-                            avaliacao = resultado_juiz.content
-                    except:
-                        logger.warning(f"Não foi possível parsear avaliação do juiz para {persona_id}")
-                
-                teste["avaliacao"] = avaliacao
-                
-            except Exception as e:
-                logger.error(f"Erro na análise do juiz para {persona_id}: {e}")
+        if "erro" not in teste:
+            avaliacao = salvo.get("avaliacao")
+            if avaliacao is None and juiz_em_lote is not None:
+                pendentes_lote.append(teste)
+                continue
+            if avaliacao is None and agente_juiz is not None:
+                avaliacao = _avaliar_com_juiz(teste, agente_juiz, regras_agente, tracer, estrategia_historico)
+                if checkpoint is not None and avaliacao:
+                    checkpoint.registrar_avaliacao(session_id, chave_celula(persona_id), avaliacao)
+            teste["avaliacao"] = avaliacao
         
-        # Coletar métricas
-        if avaliacao and "scores" in avaliacao:
-            scores = avaliacao["scores"]
-            for key in scores_soma:
-                scores_soma[key] += scores.get(key, 0)
-            testes_com_score += 1
-            
-            # Coletar pontos fortes/fracos
-            if "resumo" in avaliacao:
-                pontos_fortes_todos.extend(avaliacao["resumo"].get("pontos_fortes", []))
-                pontos_fracos_todos.extend(avaliacao["resumo"].get("pontos_fracos", []))
-                recomendacoes_todas.extend(avaliacao["resumo"].get("recomendacoes", []))
-                
-                resultado_status = avaliacao["resumo"].get("resultado", "ATENÇÃO")
-                if resultado_status == "APROVADO":
-                    testes_aprovados += 1
-                elif resultado_status == "REPROVADO":
-                    testes_reprovados += 1
-                else:
-                    testes_atencao += 1
-            
-            resultados_por_persona.append({
-                "persona_id": persona_id,
-                "persona_nome": persona_nome,
-                "scores": scores,
-                "aprovado": avaliacao.get("status_final", {}).get("aprovado", False),
-                "erro": None
-            })
-        else:
-            # Sem avaliação disponível
-            resultados_por_persona.append({
-                "persona_id": persona_id,
-                "persona_nome": persona_nome,
-                "scores": None,
-                "aprovado": False,
-                "erro": "Avaliação não disponível"
-            })
-    
-    # FASE 3: Calcular análise geral
-    logger.info("FASE 3: Gerando análise geral consolidada...")
-    
-    # Calcular médias
-    if testes_com_score > 0:
-        scores_medios = {
-            key: round(val / testes_com_score) 
-            for key, val in scores_soma.items()
-        }
-    else:
-        scores_medios = {key: 0 for key in scores_soma}
-    
-    # Encontrar personas com melhor/pior desempenho
-    personas_ordenadas = sorted(
-        [r for r in resultados_por_persona if r.get("scores")],
-        key=lambda x: x["scores"].get("score_geral", 0) if x.get("scores") else 0,
-        reverse=True
-    )
+        yield from publicar_avaliacao(teste, avaliacao)
+        
+        # Teste sequencial: para quando o IC do score já decide contra o alvo
+        if criterio_parada is not None:
+            compliance = ((avaliacao or {}).get("analise") or {}).get("compliance") or {}
+            if compliance.get("violacoes_criticas"):
+                violacoes_criticas += 1
+            matriz = agregador.scores
+            parada = criterio_parada.decidir(
+                matriz.dados[:, matriz.dimensoes.index(criterio_parada.dimensao)],
+                violacoes_criticas=violacoes_criticas,
+                max_consultas=total
+            )
+            if parada is not None and i < total:
+                parada["avaliadas"] = agregador.total_testes
+                parada["conversas_economizadas"] = total - i
+                logger.info(
+                    "Parada antecipada (%s, %s) após %s/%s personas: %s conversas economizadas",
+                    parada["decisao"], parada["motivo"], i, total, total - i
+                )
+                yield ParadaAntecipada(
+                    session_id=session_id,
+                    decisao=parada["decisao"],
+                    motivo=parada["motivo"],
+                    avaliadas=parada["avaliadas"],
+                    economizadas=parada["conversas_economizadas"],
+                    media=parada["media"],
+                    ic=parada["ic"],
+                    alvo=parada["alvo"]
+                )
+                break
+            parada = None
     
-    melhores = [p["persona_nome"] for p in personas_ordenadas[:3]]
-    piores = [p["persona_nome"] for p in personas_ordenadas[-3:]] if len(personas_ordenadas) >= 3 else []
-    
-    # Consolidar pontos recorrentes (aparecem mais de uma vez)
-    pontos_fortes_counter = Counter(pontos_fortes_todos)
-    pontos_fracos_counter = Counter(pontos_fracos_todos)
-    recomendacoes_counter = Counter(recomendacoes_todas)
-    
-    pontos_fortes_recorrentes = [p for p, c in pontos_fortes_counter.most_common(5)]
-    pontos_fracos_recorrentes = [p for p, c in pontos_fracos_counter.most_common(5)]
-    recomendacoes_prioritarias = [r for r, c in recomendacoes_counter.most_common(5)]
-    
-    # Taxa de aprovação
-    total_analisados = testes_aprovados + testes_reprovados + testes_atencao
-    taxa_aprovacao = round((testes_aprovados / total_analisados * 100), 1) if total_analisados > 0 else 0
-    
-    # Gerar conclusão
-    if taxa_aprovacao >= 80:
-        conclusao = f"O agente teve excelente desempenho com taxa de aprovação de {taxa_aprovacao}%. Está pronto para produção com pequenos ajustes sugeridos."
-    elif taxa_aprovacao >= 60:
-        conclusao = f"O agente teve bom desempenho ({taxa_aprovacao}% aprovação) mas necessita melhorias nos pontos fracos identificados antes de ir para produção."
-    elif taxa_aprovacao >= 40:
-        conclusao = f"O agente teve desempenho abaixo do esperado ({taxa_aprovacao}% aprovação). Recomenda-se revisão significativa antes de produção."
-    else:
-        conclusao = f"O agente teve desempenho crítico ({taxa_aprovacao}% aprovação). Necessita reformulação antes de qualquer uso em produção."
-    
-    analise_geral = {
-        "total_testes": len(testes_executados),
-        "testes_aprovados": testes_aprovados,
-        "testes_reprovados": testes_reprovados,
-        "testes_atencao": testes_atencao,
-        "taxa_aprovacao": taxa_aprovacao,
-        "score_medio_geral": scores_medios.get("score_geral", 0),
-        "scores_medios": scores_medios,
-        "personas_com_melhor_desempenho": melhores,
-        "personas_com_pior_desempenho": piores,
-        "pontos_fortes_recorrentes": pontos_fortes_recorrentes,
-        "pontos_fracos_recorrentes": pontos_fracos_recorrentes,
-        "recomendacoes_prioritarias": recomendacoes_prioritarias,
-        "conclusao": conclusao
-    }
+    # Avaliações pendentes em um único lote (modo offline)
+    if pendentes_lote:
+        try:
+            avaliacoes_lote = juiz_em_lote.avaliar(pendentes_lote, regras_agente, estrategia_historico, tracer)
+        except Exception as e:
+            # As conversas ficam no checkpoint: retomar_bateria avalia depois
+            logger.error("Erro na avaliação em lote: %s", e)
+            avaliacoes_lote = {}
+        for teste in pendentes_lote:
+            avaliacao = avaliacoes_lote.get(teste["test_id"])
+            if checkpoint is not None and avaliacao:
+                checkpoint.registrar_avaliacao(session_id, chave_celula(teste["persona_id"]), avaliacao)
+            teste["avaliacao"] = avaliacao
+            yield from publicar_avaliacao(teste, avaliacao)
+    
+    # Histórico por persona (priorização das próximas baterias)
+    if historico is not None and collection_id is not None:
+        try:
+            historico.registrar(collection_id, agregador.resultados_por_persona)
+        except Exception as e:
+            logger.error("Erro ao registrar o histórico das personas: %s", e)
     
     # Finalizar sessão
+    analise_geral = agregador.analise_geral()
     timestamp_fim = datetime.now().isoformat()
     duracao_total = (
         datetime.fromisoformat(timestamp_fim) - 
         datetime.fromisoformat(timestamp_inicio)
     ).total_seconds()
     
-    resultado_consolidado = {
+    logger.info("=== SESSÃO %s CONCLUÍDA ===", session_id)
+    logger.info(
+        "Total: %s testes, Aprovados: %s, Taxa: %s%%",
+        analise_geral["total_testes"], analise_geral["testes_aprovados"], analise_geral["taxa_aprovacao"]
+    )
+    
+    yield BateriaConcluida(session_id=session_id, resultado={
         "session_id": session_id,
         "timestamp_inicio": timestamp_inicio,
         "timestamp_fim": timestamp_fim,
         "duracao_total_segundos": round(duracao_total, 2),
-        "num_personas": len(personas_selecionadas),
+        "num_personas": total,
         "max_turnos_por_teste": max_turnos,
         "prompt_teste_usado": prompt_nome,
-        "resultados_por_persona": resultados_por_persona,
-        "testes_detalhados": testes_executados,
-        "analise_geral": analise_geral
-    }
+        "resultados_por_persona": agregador.resultados_por_persona,
+        "analise_geral": analise_geral,
+        "parada_antecipada": parada,
+        "metricas_llm": tracer.resumo()
+    })
+
+
+async def executar_bateria_async(*args, **kwargs) -> AsyncIterator[EventoBateria]:
+    """
+    Versão assíncrona de `executar_bateria_stream` (mesmos argumentos).
+    
+    O gerador síncrono avança em uma thread, então o event loop fica livre
+    enquanto os agentes respondem.
+    
+    Example:
+        >>> async for evento in executar_bateria_async(prompt, agente_alvo=sofia):
+        ...     await websocket.send_json(evento.to_dict())
+    """
+    gerador = executar_bateria_stream(*args, **kwargs)
+    fim = object()
+    try:
+        while (evento := await asyncio.to_thread(next, gerador, fim)) is not fim:
+            yield evento
+    finally:
+        try:
+            gerador.close()
+        except ValueError:
+            # Cancelado enquanto a thread ainda executava o gerador
+            pass
+
+
+def executar_bateria_com_analise_juiz(
+    prompt_teste: str,
+    num_personas: int = DEFAULT_NUM_PERSONAS,
+    agente_alvo: Optional["Agent"] = None,
+    agente_juiz: Optional["Agent"] = None,
+    max_turnos: int = DEFAULT_MAX_TURNOS,
+    regras_agente: str = "",
+    modo_selecao: str = "aleatorio",
+    personas_path: Optional[str] = None,
+    persona_ids: Optional[list[str]] = None,
+    is_file_path: bool = False,
+    estrategia_historico: Optional[Union[str, ContextWindow]] = None,
+    checkpoint: Optional[CheckpointStore] = None,
+    session_id: Optional[str] = None,
+    juiz_em_lote: Optional[JuizEmLote] = None,
+    criterio_parada: Optional[CriterioParada] = None,
+    api_key: Optional[str] = None,
+    historico: Optional[HistoricoPersonas] = None,
+    collection_id: Optional[str] = None,
+    filtros_personas: Optional[dict] = None
+) -> dict:
+    """
+    Executa bateria de testes com múltiplas personas e análise consolidada do juiz.
+    
+    O juiz analisa CADA teste separadamente, gera score individual,
+    e no final produz uma análise geral consolidada.
+    
+    Consome `executar_bateria_stream` e guarda todas as conversas no retorno;
+    para acompanhar a execução ao vivo sem reter as conversas, use o stream.
+    
+    Args:
+        prompt_teste: Conteúdo do prompt OU caminho para arquivo .md do teste
+        num_personas: Quantidade de personas a usar
+        agente_alvo: Agente sendo testado (obrigatório)
+        agente_juiz: Agente juiz para análise (opcional, cria um se não fornecido)
+        max_turnos: Máximo de turnos por teste (padrão: 20)
+        regras_agente: Regras do agente para análise do juiz
+        modo_selecao: "aleatorio", "sequencial", "diversificado" ou "priorizado"
+        personas_path: Arquivo JSON/JSONL ou diretório de shards de personas
+        persona_ids: Lista específica de IDs (ignora num_personas e modo_selecao)
+        is_file_path: Se True, prompt_teste é um caminho de arquivo
+        estrategia_historico: Estratégia de histórico das conversas e do juiz
+        checkpoint: Store onde cada conversa/avaliação é gravada ao terminar (opcional)
+        session_id: ID da sessão; com checkpoint, conversas e avaliações já
+                    gravadas para este ID são reaproveitadas (retomada)
+        juiz_em_lote: Avalia todas as conversas de uma vez pela Batch API
+                      (offline, ver tests.batch_judge) em vez de uma a uma
+        criterio_parada: Encerra a bateria quando o IC do score fica
+                         claramente acima/abaixo do alvo (ver CriterioParada)
+        api_key: Chave OpenAI do agente testador; não é gravada no checkpoint
+                 (padrão: OPENAI_API_KEY do ambiente)
+        historico: Histórico por persona (tests.history): ordena as personas
+                   pelas que mais falham e acumula os resultados ao final
+                   (com criterio_parada, a ordem é sorteada)
+        collection_id: Coleção à qual o histórico se refere
+        filtros_personas: Restringe as personas sorteadas (personalidade,
+                          nivel_stress, tags; ver CatalogoPersonas.filtrar)
     
-    logger.info(f"=== SESSÃO {session_id} CONCLUÍDA ===")
-    logger.info(f"Total: {len(testes_executados)} testes, Aprovados: {testes_aprovados}, Taxa: {taxa_aprovacao}%")
+    Returns:
+        Dicionário com resultado consolidado:
+        {
+            "session_id": str,
+            "timestamp_inicio": str,
+            "timestamp_fim": str,
+            "duracao_total_segundos": float,
+            "num_personas": int,
+            "max_turnos_por_teste": int,
+            "prompt_teste_usado": str,
+            "resultados_por_persona": [...],
+            "testes_detalhados": [...],
+            "analise_geral": {...},
+            "parada_antecipada": {...} | None,
+            "metricas_llm": {...}
+        }
     
+    Example:
+        >>> # Usando prompt do banco de dados
+        >>> resultado = executar_bateria_com_analise_juiz(
+        ...     prompt_teste="Você é um cliente testando...",
+        ...     num_personas=5,
+        ...     agente_alvo=sofia_agent,
+        ...     regras_agente="Nunca revelar ser IA, sempre coletar nome e telefone"
+        ... )
+    """
+    testes_executados = []
+    resultado_consolidado: dict = {}
+    
+    for evento in executar_bateria_stream(
+        prompt_teste=prompt_teste,
+        num_personas=num_personas,
+        agente_alvo=agente_alvo,
+        agente_juiz=agente_juiz,
+        max_turnos=max_turnos,
+        regras_agente=regras_agente,
+        modo_selecao=modo_selecao,
+        personas_path=personas_path,
+        persona_ids=persona_ids,
+        is_file_path=is_file_path,
+        estrategia_historico=estrategia_historico,
+        checkpoint=checkpoint,
+        session_id=session_id,
+        juiz_em_lote=juiz_em_lote,
+        criterio_parada=criterio_parada,
+        api_key=api_key,
+        historico=historico,
+        collection_id=collection_id,
+        filtros_personas=filtros_personas
+    ):
+        if isinstance(evento, ConversaConcluida):
+            testes_executados.append(evento.resultado)
+        elif isinstance(evento, BateriaConcluida):
+            resultado_consolidado = evento.resultado
+    
+    # Mantém a ordem de chaves do retorno original
+    analise_geral = resultado_consolidado.pop("analise_geral")
+    parada_antecipada = resultado_consolidado.pop("parada_antecipada")
+    metricas_llm = resultado_consolidado.pop("metricas_llm")
+    resultado_consolidado["testes_detalhados"] = testes_executados
+    resultado_consolidado["analise_geral"] = analise_geral
+    resultado_consolidado["parada_antecipada"] = parada_antecipada
+    resultado_consolidado["metricas_llm"] = metricas_llm
     return resultado_consolidado
+
+
+def retomar_bateria(
+    session_id: str,
+    checkpoint: CheckpointStore,
+    agente_alvo: "Agent",
+    agente_juiz: Optional["Agent"] = None,
+    **kwargs
+) -> dict:
+    """
+    Retoma uma bateria interrompida a partir do checkpoint.
+    
+    Usa os parâmetros gravados no início da sessão (prompt, personas,
+    max_turnos, regras) e executa apenas as conversas/avaliações que faltam.
+    
+    Args:
+        session_id: ID da sessão interrompida
+        checkpoint: Store usado na execução original
+        agente_alvo: Agente sendo testado
+        agente_juiz: Agente juiz (opcional)
+        **kwargs: Parâmetros que substituem os gravados
+    
+    Returns:
+        Resultado consolidado, igual ao de executar_bateria_com_analise_juiz
+    
+    Raises:
+        ValueError: Se a sessão não existir no checkpoint
+    
+    Example:
+        >>> store = abrir_checkpoint("checkpoints/")
+        >>> resultado = retomar_bateria("SESSION_AB12CD34", store, sofia, juiz)
+    """
+    parametros = checkpoint.obter_sessao(session_id)
+    if parametros is None:
+        raise ValueError(f"Sessão '{session_id}' não encontrada no checkpoint")
+    
+    parametros = {k: v for k, v in parametros.items() if v is not None}
+    parametros.update(kwargs)
+    
+    return executar_bateria_com_analise_juiz(
+        agente_alvo=agente_alvo,
+        agente_juiz=agente_juiz,
+        checkpoint=checkpoint,
+        session_id=session_id,
+        **parametros
+    )
@@ -0,0 +1,27 @@
+# Workers module for distributed test execution
+"""
+Worker mode: conversations, judge and optimizer jobs dispatched through a
+queue (SQLite, Redis-compatible or in-memory) to N worker processes/hosts.
+"""
+
+from .filas import Job, FilaJobs, FilaMemoria, FilaSqlite, FilaRedis, abrir_fila
+from .jobs import TIPOS_JOB, executar_job
+from .worker import executar_worker, iniciar_processos, iniciar_threads, fila_padrao
+from .despacho import enfileirar_regressao, coletar_regressao
+
+__all__ = [
+    "Job",
+    "FilaJobs",
+    "FilaMemoria",
+    "FilaSqlite",
+    "FilaRedis",
+    "abrir_fila",
+    "TIPOS_JOB",
+    "executar_job",
+    "executar_worker",
+    "iniciar_processos",
+    "iniciar_threads",
+    "fila_padrao",
+    "enfileirar_regressao",
+    "coletar_regressao",
+]
@@ -0,0 +1,47 @@
+"""
+Sobe workers consumindo a fila de jobs.
+
+Uso (a partir de backend/):
+    python -m workers --fila sqlite:///jobs.db --processos 4
+    python -m workers --fila redis://fila:6379/0 --tipos conversation judge
+
+Rode o mesmo comando em quantos hosts quiser (com Redis, ou SQLite em volume
+compartilhado); SIGINT/SIGTERM encerram cada processo após o job atual.
+"""
+
+import argparse
+import logging
+import os
+import signal
+
+from logs import configurar_logging
+from workers.jobs import TIPOS_JOB
+from workers.worker import iniciar_processos
+
+logger = logging.getLogger("workers")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Workers de conversa/juiz/otimizador")
+    parser.add_argument("--fila", default=os.getenv("QA_JOB_QUEUE", "sqlite:///jobs.db"),
+                        help="URL da fila (sqlite:///caminho.db ou redis://host:porta/db)")
+    parser.add_argument("--processos", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--tipos", nargs="+", choices=TIPOS_JOB, default=list(TIPOS_JOB))
+    args = parser.parse_args()
+
+    configurar_logging()
+    processos, parar = iniciar_processos(args.fila, args.processos, args.tipos)
+    logger.info("%s workers consumindo %s", len(processos), args.fila)
+
+    def encerrar(signum, frame):
+        logger.info("Encerrando workers após os jobs em andamento...")
+        parar.set()
+
+    signal.signal(signal.SIGINT, encerrar)
+    signal.signal(signal.SIGTERM, encerrar)
+    for processo in processos:
+        processo.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Despacho de regressões para os workers.
+
+Uma regressão = uma conversa por (prompt de teste, persona), cada uma
+avaliada pelo juiz em um job próprio; cada conversa vira um test_run.
+"""
+
+import logging
+from typing import Optional, Sequence
+
+from workers.filas import FilaJobs
+
+logger = logging.getLogger(__name__)
+
+
+def enfileirar_regressao(
+    fila: FilaJobs,
+    collection_id: str,
+    persona_ids: Sequence[str],
+    subject_instruction: str,
+    iteration: int,
+    prompts_teste: Sequence[Optional[str]] = (None,),
+    max_turnos: Optional[int] = None,
+    avaliar: bool = True
+) -> list[str]:
+    """
+    Enfileira as conversas da regressão.
+
+    Args:
+        fila: Fila dos workers
+        collection_id: Coleção testada (a chave da OpenAI é lida pelo worker)
+        persona_ids: Personas testadas
+        subject_instruction: Prompt do agente testado
+        iteration: Iteração registrada nos test_runs
+        prompts_teste: Cenários do testador (None = instrução do avaliador da coleção)
+        max_turnos: Máximo de turnos (None = max_turns da coleção)
+        avaliar: Enfileirar o job do juiz após cada conversa
+
+    Returns:
+        IDs dos jobs "conversation", na ordem prompt x persona
+
+    Example:
+        >>> ids = enfileirar_regressao(fila, cid, ["PERSONA_001", "PERSONA_010"], prompt, 3)
+        >>> runs = coletar_regressao(fila, ids, timeout=3600)
+    """
+    job_ids = [
+        fila.enfileirar("conversation", {
+            "collection_id": collection_id,
+            "persona_id": persona_id,
+            "prompt_teste": prompt_teste,
+            "subject_instruction": subject_instruction,
+            "iteration": iteration,
+            "max_turnos": max_turnos,
+            "avaliar": avaliar,
+        })
+        for prompt_teste in prompts_teste
+        for persona_id in persona_ids
+    ]
+    logger.info("Regressão da coleção %s: %s conversas enfileiradas", collection_id, len(job_ids))
+    return job_ids
+
+
+def coletar_regressao(fila: FilaJobs, job_ids: Sequence[str], timeout: Optional[float] = None) -> list[dict]:
+    """
+    Espera as conversas e as avaliações e devolve um resumo por conversa
+    (run_id, persona_id, score, status e erro).
+
+    Raises:
+        TimeoutError: Se os jobs não terminarem dentro de `timeout`
+    """
+    conversas = fila.aguardar(job_ids, timeout=timeout)
+    juizes = {
+        c.id: c.resultado["judge_job_id"]
+        for c in conversas if c.status == "done" and c.resultado.get("judge_job_id")
+    }
+    avaliados = {j.id: j for j in fila.aguardar(list(juizes.values()), timeout=timeout)}
+
+    resumo = []
+    for conversa in conversas:
+        item = {
+            "job_id": conversa.id,
+            "persona_id": conversa.payload["persona_id"],
+            "status": conversa.status,
+            "erro": conversa.erro,
+            **({"run_id": conversa.resultado["run_id"]} if conversa.resultado else {}),
+        }
+        juiz = avaliados.get(juizes.get(conversa.id))
+        if juiz is not None:
+            item["status"] = juiz.status
+            item["erro"] = juiz.erro
+            item["score"] = juiz.resultado.get("score") if juiz.resultado else None
+        resumo.append(item)
+    return resumo
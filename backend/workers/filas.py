@@ -0,0 +1,547 @@
+"""
+Filas de jobs dos workers.
+
+Três backends com a mesma interface (`FilaJobs`):
+- FilaMemoria: dentro do processo (threads); fallback sem infraestrutura
+- FilaSqlite: arquivo SQLite em WAL, compartilhado por processos do mesmo
+  host (ou de vários hosts com o arquivo em volume compartilhado)
+- FilaRedis: qualquer servidor compatível com Redis (Redis, Valkey, KeyDB),
+  para workers em vários hosts
+
+Um job reservado e não concluído dentro de `lease_segundos` (worker caiu)
+conta como uma falha (erro ERRO_LEASE_EXPIRADO): volta para a fila enquanto
+houver tentativas e, após `max_tentativas`, fica como "failed" (um job que
+derruba o worker não é repetido para sempre). Enquanto executa um job, o
+worker renova o lease periodicamente (`renovar`), então jobs mais longos que
+o lease não são entregues a um segundo worker.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from typing import Any, Optional, Sequence
+from urllib.parse import urlparse
+
+DEFAULT_LEASE_SEGUNDOS = 30 * 60
+DEFAULT_MAX_TENTATIVAS = 3
+ERRO_LEASE_EXPIRADO = "lease expirado (worker caiu ou travou)"
+
+
+@dataclass
+class Job:
+    """Unidade de trabalho (conversation, judge ou optimizer)."""
+    id: str
+    tipo: str
+    payload: dict
+    status: str = "pending"  # pending, running, done, failed
+    resultado: Any = None
+    erro: Optional[str] = None
+    tentativas: int = 0
+    max_tentativas: int = DEFAULT_MAX_TENTATIVAS
+    worker: Optional[str] = None
+    criado_em: float = field(default_factory=time.time)
+    reservado_em: Optional[float] = None
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id, "tipo": self.tipo, "status": self.status,
+            "resultado": self.resultado, "erro": self.erro, "tentativas": self.tentativas,
+            "worker": self.worker, "criado_em": self.criado_em,
+        }
+
+
+def _novo_id() -> str:
+    return f"JOB_{uuid.uuid4().hex[:12].upper()}"
+
+
+def _json(valor: Any) -> str:
+    return json.dumps(valor, ensure_ascii=False, default=str)
+
+
+class FilaJobs(ABC):
+    """
+    Interface das filas.
+
+    Args:
+        lease_segundos: Tempo máximo de um job reservado antes de voltar à fila
+    """
+
+    def __init__(self, lease_segundos: float = DEFAULT_LEASE_SEGUNDOS):
+        self.lease_segundos = lease_segundos
+
+    @abstractmethod
+    def enfileirar(self, tipo: str, payload: dict, max_tentativas: int = DEFAULT_MAX_TENTATIVAS) -> str:
+        """Adiciona um job e devolve seu ID."""
+
+    @abstractmethod
+    def reservar(self, tipos: Sequence[str], worker: str, timeout: float = 1.0) -> Optional[Job]:
+        """Reserva o próximo job de um dos tipos (None se nenhum chegar em `timeout`)."""
+
+    @abstractmethod
+    def concluir(self, job_id: str, resultado: Any) -> None:
+        """Marca o job como "done" com o resultado."""
+
+    @abstractmethod
+    def falhar(self, job_id: str, erro: str) -> None:
+        """Registra a falha; o job volta à fila enquanto houver tentativas."""
+
+    @abstractmethod
+    def obter(self, job_id: str) -> Optional[Job]:
+        """Estado atual do job (None se não existir)."""
+
+    @abstractmethod
+    def renovar(self, job_id: str, worker: str) -> bool:
+        """
+        Estende o lease de um job em execução por `worker` (heartbeat).
+
+        Returns:
+            False se o job não está mais com este worker (lease já expirado)
+        """
+
+    @abstractmethod
+    def atualizar_payload(self, job_id: str, campos: dict) -> None:
+        """
+        Acrescenta campos ao payload do job (vistos pelas próximas tentativas).
+
+        Ex: o job "conversation" guarda o run_id criado, para que um retry
+        reutilize o mesmo test_run em vez de criar outro.
+        """
+
+    def aguardar(self, job_ids: Sequence[str], timeout: Optional[float] = None, intervalo: float = 0.5) -> list[Job]:
+        """
+        Espera os jobs terminarem (done/failed).
+
+        Raises:
+            TimeoutError: Se algum não terminar dentro de `timeout`
+        """
+        limite = None if timeout is None else time.monotonic() + timeout
+        pendentes = list(job_ids)
+        terminados: dict[str, Job] = {}
+        while pendentes:
+            restantes = []
+            for job_id in pendentes:
+                job = self.obter(job_id)
+                if job is not None and job.status in ("done", "failed"):
+                    terminados[job_id] = job
+                else:
+                    restantes.append(job_id)
+            pendentes = restantes
+            if pendentes:
+                if limite is not None and time.monotonic() >= limite:
+                    raise TimeoutError(f"{len(pendentes)} jobs não terminaram em {timeout}s")
+                time.sleep(intervalo)
+        return [terminados[job_id] for job_id in job_ids]
+
+    def fechar(self) -> None:
+        pass
+
+
+class FilaMemoria(FilaJobs):
+    """Fila dentro do processo (workers em threads)."""
+
+    def __init__(self, lease_segundos: float = DEFAULT_LEASE_SEGUNDOS):
+        super().__init__(lease_segundos)
+        self._jobs: dict[str, Job] = {}
+        self._pendentes: list[str] = []
+        self._cond = threading.Condition()
+
+    def enfileirar(self, tipo: str, payload: dict, max_tentativas: int = DEFAULT_MAX_TENTATIVAS) -> str:
+        job = Job(id=_novo_id(), tipo=tipo, payload=payload, max_tentativas=max_tentativas)
+        with self._cond:
+            self._jobs[job.id] = job
+            self._pendentes.append(job.id)
+            self._cond.notify_all()
+        return job.id
+
+    def _recuperar_expirados(self) -> None:
+        agora = time.time()
+        for job in self._jobs.values():
+            if job.status == "running" and job.reservado_em and agora - job.reservado_em > self.lease_segundos:
+                job.erro = ERRO_LEASE_EXPIRADO
+                if job.tentativas < job.max_tentativas:
+                    job.status = "pending"
+                    self._pendentes.append(job.id)
+                else:
+                    job.status = "failed"
+                    self._cond.notify_all()
+
+    def reservar(self, tipos: Sequence[str], worker: str, timeout: float = 1.0) -> Optional[Job]:
+        limite = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                self._recuperar_expirados()
+                for i, job_id in enumerate(self._pendentes):
+                    job = self._jobs[job_id]
+                    if job.tipo in tipos:
+                        del self._pendentes[i]
+                        job.status, job.worker, job.reservado_em = "running", worker, time.time()
+                        job.tentativas += 1
+                        return job
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    return None
+                self._cond.wait(restante)
+
+    def concluir(self, job_id: str, resultado: Any) -> None:
+        with self._cond:
+            job = self._jobs[job_id]
+            job.status, job.resultado, job.erro = "done", resultado, None
+            self._cond.notify_all()
+
+    def falhar(self, job_id: str, erro: str) -> None:
+        with self._cond:
+            job = self._jobs[job_id]
+            job.erro = erro
+            if job.tentativas < job.max_tentativas:
+                job.status = "pending"
+                self._pendentes.append(job_id)
+            else:
+                job.status = "failed"
+            self._cond.notify_all()
+
+    def obter(self, job_id: str) -> Optional[Job]:
+        with self._cond:
+            return self._jobs.get(job_id)
+
+    def renovar(self, job_id: str, worker: str) -> bool:
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None or job.status != "running" or job.worker != worker:
+                return False
+            job.reservado_em = time.time()
+            return True
+
+    def atualizar_payload(self, job_id: str, campos: dict) -> None:
+        with self._cond:
+            job = self._jobs[job_id]
+            job.payload = {**job.payload, **campos}
+
+
+class FilaSqlite(FilaJobs):
+    """
+    Fila em um arquivo SQLite (WAL). A reserva é atômica (BEGIN IMMEDIATE),
+    então vários processos podem consumir a mesma fila.
+    """
+
+    def __init__(self, caminho: str, lease_segundos: float = DEFAULT_LEASE_SEGUNDOS):
+        super().__init__(lease_segundos)
+        self.caminho = caminho
+        self._local = threading.local()
+        with self._conexao() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    tipo TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    resultado TEXT,
+                    erro TEXT,
+                    tentativas INTEGER NOT NULL DEFAULT 0,
+                    max_tentativas INTEGER NOT NULL,
+                    worker TEXT,
+                    criado_em REAL NOT NULL,
+                    reservado_em REAL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status_tipo ON jobs (status, tipo, criado_em)")
+
+    def _conexao(self) -> sqlite3.Connection:
+        # Uma conexão por thread (sqlite3 não compartilha conexões entre threads)
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.caminho, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def enfileirar(self, tipo: str, payload: dict, max_tentativas: int = DEFAULT_MAX_TENTATIVAS) -> str:
+        job_id = _novo_id()
+        self._conexao().execute(
+            "INSERT INTO jobs (id, tipo, payload, max_tentativas, criado_em) VALUES (?, ?, ?, ?, ?)",
+            (job_id, tipo, _json(payload), max_tentativas, time.time())
+        )
+        return job_id
+
+    def _reservar_uma_vez(self, tipos: Sequence[str], worker: str) -> Optional[Job]:
+        conn = self._conexao()
+        agora = time.time()
+        marcadores = ",".join("?" for _ in tipos)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Lease expirado conta como falha (mesma regra de `falhar`)
+            conn.execute(
+                "UPDATE jobs SET erro = ?, "
+                "status = CASE WHEN tentativas < max_tentativas THEN 'pending' ELSE 'failed' END "
+                "WHERE status = 'running' AND reservado_em < ?",
+                (ERRO_LEASE_EXPIRADO, agora - self.lease_segundos)
+            )
+            linha = conn.execute(
+                f"SELECT id FROM jobs WHERE status = 'pending' AND tipo IN ({marcadores}) "
+                "ORDER BY criado_em LIMIT 1",
+                tuple(tipos)
+            ).fetchone()
+            if linha is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = 'running', worker = ?, reservado_em = ?, tentativas = tentativas + 1 "
+                "WHERE id = ?",
+                (worker, agora, linha["id"])
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return self.obter(linha["id"])
+
+    def reservar(self, tipos: Sequence[str], worker: str, timeout: float = 1.0) -> Optional[Job]:
+        limite = time.monotonic() + timeout
+        while True:
+            job = self._reservar_uma_vez(tipos, worker)
+            if job is not None or time.monotonic() >= limite:
+                return job
+            time.sleep(min(0.2, max(0.0, limite - time.monotonic())))
+
+    def concluir(self, job_id: str, resultado: Any) -> None:
+        self._conexao().execute(
+            "UPDATE jobs SET status = 'done', resultado = ?, erro = NULL WHERE id = ?",
+            (_json(resultado), job_id)
+        )
+
+    def falhar(self, job_id: str, erro: str) -> None:
+        self._conexao().execute(
+            "UPDATE jobs SET erro = ?, "
+            "status = CASE WHEN tentativas < max_tentativas THEN 'pending' ELSE 'failed' END "
+            "WHERE id = ?",
+            (erro, job_id)
+        )
+
+    def renovar(self, job_id: str, worker: str) -> bool:
+        cursor = self._conexao().execute(
+            "UPDATE jobs SET reservado_em = ? WHERE id = ? AND status = 'running' AND worker = ?",
+            (time.time(), job_id, worker)
+        )
+        return cursor.rowcount > 0
+
+    def atualizar_payload(self, job_id: str, campos: dict) -> None:
+        # json_patch: atualização atômica, sem ler e regravar o payload
+        self._conexao().execute(
+            "UPDATE jobs SET payload = json_patch(payload, ?) WHERE id = ?",
+            (_json(campos), job_id)
+        )
+
+    def obter(self, job_id: str) -> Optional[Job]:
+        linha = self._conexao().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if linha is None:
+            return None
+        return Job(
+            id=linha["id"],
+            tipo=linha["tipo"],
+            payload=json.loads(linha["payload"]),
+            status=linha["status"],
+            resultado=json.loads(linha["resultado"]) if linha["resultado"] else None,
+            erro=linha["erro"],
+            tentativas=linha["tentativas"],
+            max_tentativas=linha["max_tentativas"],
+            worker=linha["worker"],
+            criado_em=linha["criado_em"],
+            reservado_em=linha["reservado_em"],
+        )
+
+    def fechar(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+# Tira o próximo job das filas (na ordem dos tipos) e o marca como reservado
+# em um único passo: um worker que cai no meio não some com o job.
+# KEYS: reservados, filas...; ARGV: prefixo das chaves de job, worker, agora
+_LUA_RESERVAR = """
+for i = 2, #KEYS do
+    local job_id = redis.call('RPOP', KEYS[i])
+    if job_id then
+        local chave = ARGV[1] .. job_id
+        redis.call('HSET', chave, 'status', 'running', 'worker', ARGV[2], 'reservado_em', ARGV[3])
+        redis.call('HINCRBY', chave, 'tentativas', 1)
+        redis.call('ZADD', KEYS[1], ARGV[3], job_id)
+        return job_id
+    end
+end
+return false
+"""
+
+# Devolve à fila (ou marca como failed, sem tentativas) os jobs com lease expirado.
+# KEYS: reservados; ARGV: prefixo das chaves de job, prefixo das filas, limite, erro
+_LUA_RECUPERAR = """
+local expirados = redis.call('ZRANGEBYSCORE', KEYS[1], 0, ARGV[3])
+for _, job_id in ipairs(expirados) do
+    redis.call('ZREM', KEYS[1], job_id)
+    local chave = ARGV[1] .. job_id
+    local job = redis.call('HMGET', chave, 'tipo', 'tentativas', 'max_tentativas')
+    if not job[1] then
+        -- hash removido: nada a devolver
+    elseif tonumber(job[2] or 0) < tonumber(job[3] or 0) then
+        redis.call('HSET', chave, 'status', 'pending', 'erro', ARGV[4])
+        redis.call('LPUSH', ARGV[2] .. job[1], job_id)
+    else
+        redis.call('HSET', chave, 'status', 'failed', 'erro', ARGV[4])
+    end
+end
+return #expirados
+"""
+
+# Renova o lease se o job ainda está em execução por este worker.
+# KEYS: hash do job, reservados; ARGV: job_id, worker, agora
+_LUA_RENOVAR = """
+if redis.call('HGET', KEYS[1], 'status') ~= 'running' or redis.call('HGET', KEYS[1], 'worker') ~= ARGV[2] then
+    return 0
+end
+redis.call('HSET', KEYS[1], 'reservado_em', ARGV[3])
+redis.call('ZADD', KEYS[2], ARGV[3], ARGV[1])
+return 1
+"""
+
+
+class FilaRedis(FilaJobs):
+    """
+    Fila em um servidor compatível com Redis.
+
+    Chaves: `{prefixo}:job:{id}` (hash do job), `{prefixo}:fila:{tipo}` (lista
+    de IDs pendentes) e `{prefixo}:reservados` (sorted set por horário da reserva).
+    Reserva e recuperação de leases são scripts Lua (atômicos no servidor).
+    """
+
+    def __init__(self, url: str, prefixo: str = "qa_jobs", lease_segundos: float = DEFAULT_LEASE_SEGUNDOS):
+        super().__init__(lease_segundos)
+        try:
+            import redis
+        except ImportError as e:
+            raise ImportError("FilaRedis requer o pacote 'redis' (pip install redis)") from e
+        self.redis = redis.Redis.from_url(url, decode_responses=True)
+        self.prefixo = prefixo
+        self._script_reservar = self.redis.register_script(_LUA_RESERVAR)
+        self._script_recuperar = self.redis.register_script(_LUA_RECUPERAR)
+        self._script_renovar = self.redis.register_script(_LUA_RENOVAR)
+
+    def _chave_job(self, job_id: str) -> str:
+        return f"{self.prefixo}:job:{job_id}"
+
+    def _chave_fila(self, tipo: str) -> str:
+        return f"{self.prefixo}:fila:{tipo}"
+
+    def enfileirar(self, tipo: str, payload: dict, max_tentativas: int = DEFAULT_MAX_TENTATIVAS) -> str:
+        job_id = _novo_id()
+        pipe = self.redis.pipeline()
+        pipe.hset(self._chave_job(job_id), mapping={
+            "tipo": tipo, "payload": _json(payload), "status": "pending",
+            "tentativas": 0, "max_tentativas": max_tentativas, "criado_em": time.time(),
+        })
+        pipe.lpush(self._chave_fila(tipo), job_id)
+        pipe.execute()
+        return job_id
+
+    def _recuperar_expirados(self) -> None:
+        self._script_recuperar(
+            keys=[f"{self.prefixo}:reservados"],
+            args=[self._chave_job(""), self._chave_fila(""), time.time() - self.lease_segundos, ERRO_LEASE_EXPIRADO]
+        )
+
+    def reservar(self, tipos: Sequence[str], worker: str, timeout: float = 1.0) -> Optional[Job]:
+        # Script não bloqueia no servidor (como o BRPOP): consulta em intervalos até o timeout
+        limite = time.monotonic() + timeout
+        filas = [self._chave_fila(t) for t in tipos]
+        while True:
+            self._recuperar_expirados()
+            job_id = self._script_reservar(
+                keys=[f"{self.prefixo}:reservados", *filas],
+                args=[self._chave_job(""), worker, time.time()]
+            )
+            if job_id:
+                return self.obter(job_id)
+            if time.monotonic() >= limite:
+                return None
+            time.sleep(min(0.2, max(0.0, limite - time.monotonic())))
+
+    def concluir(self, job_id: str, resultado: Any) -> None:
+        pipe = self.redis.pipeline()
+        pipe.hset(self._chave_job(job_id), mapping={"status": "done", "resultado": _json(resultado), "erro": ""})
+        pipe.zrem(f"{self.prefixo}:reservados", job_id)
+        pipe.execute()
+
+    def falhar(self, job_id: str, erro: str) -> None:
+        job = self.obter(job_id)
+        if job is None:
+            return
+        self.redis.zrem(f"{self.prefixo}:reservados", job_id)
+        if job.tentativas < job.max_tentativas:
+            self.redis.hset(self._chave_job(job_id), mapping={"status": "pending", "erro": erro})
+            self.redis.lpush(self._chave_fila(job.tipo), job_id)
+        else:
+            self.redis.hset(self._chave_job(job_id), mapping={"status": "failed", "erro": erro})
+
+    def renovar(self, job_id: str, worker: str) -> bool:
+        return bool(self._script_renovar(
+            keys=[self._chave_job(job_id), f"{self.prefixo}:reservados"],
+            args=[job_id, worker, time.time()]
+        ))
+
+    def atualizar_payload(self, job_id: str, campos: dict) -> None:
+        chave = self._chave_job(job_id)
+
+        def transacao(pipe) -> None:
+            payload = json.loads(pipe.hget(chave, "payload") or "{}")
+            pipe.multi()
+            pipe.hset(chave, "payload", _json({**payload, **campos}))
+
+        self.redis.transaction(transacao, chave)
+
+    def obter(self, job_id: str) -> Optional[Job]:
+        dados = self.redis.hgetall(self._chave_job(job_id))
+        if not dados:
+            return None
+        return Job(
+            id=job_id,
+            tipo=dados["tipo"],
+            payload=json.loads(dados["payload"]),
+            status=dados["status"],
+            resultado=json.loads(dados["resultado"]) if dados.get("resultado") else None,
+            erro=dados.get("erro") or None,
+            tentativas=int(dados.get("tentativas", 0)),
+            max_tentativas=int(dados.get("max_tentativas", DEFAULT_MAX_TENTATIVAS)),
+            worker=dados.get("worker"),
+            criado_em=float(dados.get("criado_em", 0)),
+            reservado_em=float(dados["reservado_em"]) if dados.get("reservado_em") else None,
+        )
+
+    def fechar(self) -> None:
+        self.redis.close()
+
+
+def abrir_fila(url: str = "memory://", **kwargs) -> FilaJobs:
+    """
+    Abre a fila a partir de uma URL.
+
+    - "memory://" -> FilaMemoria (só workers em threads do mesmo processo)
+    - "sqlite:///caminho/jobs.db" -> FilaSqlite
+    - "redis://host:6379/0" (ou rediss://) -> FilaRedis
+
+    Example:
+        >>> fila = abrir_fila(os.getenv("QA_JOB_QUEUE", "sqlite:///jobs.db"))
+    """
+    partes = urlparse(url)
+    if partes.scheme == "memory":
+        return FilaMemoria(**kwargs)
+    if partes.scheme == "sqlite":
+        caminho = url[len("sqlite:///"):] if url.startswith("sqlite:///") else partes.path
+        return FilaSqlite(caminho, **kwargs)
+    if partes.scheme in ("redis", "rediss"):
+        return FilaRedis(url, **kwargs)
+    raise ValueError(f"Fila desconhecida: {url} (use memory://, sqlite:///... ou redis://...)")
@@ -0,0 +1,210 @@
+"""
+Handlers dos jobs executados pelos workers.
+
+- "conversation": conversa de uma persona contra o prompt da coleção; cria o
+  test_run (status "running", um por job, reutilizado nos retries) e, se
+  pedido, enfileira o job "judge"
+- "judge": avalia a conversa e conclui o test_run (avaliação, score, métricas)
+- "optimizer": gera um prompt melhorado a partir de uma avaliação (o novo
+  prompt volta no resultado do job)
+
+Os payloads levam só IDs e textos: a chave da OpenAI é lida da coleção pelo
+próprio worker, nunca gravada na fila.
+"""
+
+import logging
+import os
+import socket
+from typing import Callable, Optional
+
+from agents import create_subject_agent, create_judge_agent
+from core.context_window import ContextWindow
+from database import get_collection_by_id, create_test_run, update_test_run, TestRunCreate, KIND_REGRESSION
+from judge import avaliar_com_reparo, montar_pedido_juiz
+from logs import contexto_log
+from models import TestConfig, EvaluationResult
+from optimizer import create_optimizer_agent, generate_improved_prompt
+from telemetry import LLMTracer
+from tests.test_executor import executar_teste_com_persona
+from workers.filas import FilaJobs, Job
+
+logger = logging.getLogger(__name__)
+
+TIPOS_JOB = ("conversation", "judge", "optimizer")
+
+# Papéis da conversa de persona -> papéis do transcript em test_runs (frontend)
+PAPEIS_TRANSCRIPT = {"user": "evaluator", "assistant": "subject"}
+
+
+def identificador_worker() -> str:
+    """host:pid, para saber qual worker executou cada job."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _config_colecao(collection_id: str, subject_instruction: Optional[str] = None) -> tuple[dict, TestConfig]:
+    collection = get_collection_by_id(collection_id)
+    if not collection:
+        raise ValueError(f"Coleção não encontrada: {collection_id}")
+    config = TestConfig(
+        subject_instruction=subject_instruction or collection["base_subject_instruction"],
+        evaluator_instruction=collection["base_evaluator_instruction"],
+        openai_api_key=collection["openai_api_key"],
+        max_turns=collection["max_turns"],
+        history_strategy=collection.get("history_strategy")
+    )
+    return collection, config
+
+
+def _transcript(conversa: list[dict]) -> list[dict]:
+    return [{"role": PAPEIS_TRANSCRIPT.get(m["role"], m["role"]), "content": m["content"]} for m in conversa]
+
+
+def executar_conversa(job: Job, fila: FilaJobs) -> dict:
+    """
+    Payload: collection_id, persona_id, prompt_teste, subject_instruction,
+    iteration, max_turnos (opcional) e avaliar (padrão True).
+
+    O test_run é criado na primeira tentativa e o run_id gravado no payload:
+    um retry reutiliza a mesma linha (a contagem de iterações da coleção e o
+    "último run" das baterias não veem linhas órfãs).
+    """
+    p = job.payload
+    collection, config = _config_colecao(p["collection_id"], p.get("subject_instruction"))
+
+    run_id = p.get("run_id")
+    if run_id:
+        update_test_run(run_id, {"status": "running"})
+    else:
+        criado = create_test_run(TestRunCreate(
+            collection_id=p["collection_id"],
+            iteration=p["iteration"],
+            status="running",
+            subject_instruction=config.subject_instruction,
+            kind=KIND_REGRESSION
+        ))
+        run_id = criado["id"]
+        fila.atualizar_payload(job.id, {"run_id": run_id})
+    tracer = LLMTracer(collection_id=p["collection_id"], run_id=run_id, iteration=p["iteration"])
+
+    try:
+        subject = create_subject_agent(
+            config, model_id=collection.get("subject_model", "gpt-4o"),
+            collection_id=p["collection_id"], run_id=run_id
+        )
+        teste = executar_teste_com_persona(
+            prompt_teste=p["prompt_teste"] or config.evaluator_instruction,
+            persona_id=p["persona_id"],
+            agente_alvo=subject,
+            max_turnos=p.get("max_turnos") or config.max_turns,
+            tracer=tracer,
+            estrategia_historico=config.history_strategy,
+            api_key=config.openai_api_key
+        )
+    except Exception:
+        update_test_run(run_id, {"status": "failed", "metrics": {**tracer.resumo(detalhado=True), "kind": KIND_REGRESSION}})
+        raise
+
+    # "kind" também nas métricas: identifica a regressão em bancos sem a coluna kind
+    metricas = {
+        **tracer.resumo(detalhado=True), "contexto": teste["contexto"], "worker": job.worker, "kind": KIND_REGRESSION
+    }
+    update_test_run(run_id, {"transcript": _transcript(teste["conversa"]), "metrics": metricas})
+
+    judge_job_id = None
+    if p.get("avaliar", True):
+        judge_job_id = fila.enfileirar("judge", {
+            "collection_id": p["collection_id"],
+            "run_id": run_id,
+            "teste": {k: v for k, v in teste.items() if k != "metricas_llm"},
+            "regras": config.subject_instruction,
+            "metricas_conversa": metricas,
+        })
+    else:
+        update_test_run(run_id, {"status": "completed"})
+
+    return {
+        "run_id": run_id,
+        "test_id": teste["test_id"],
+        "persona_id": p["persona_id"],
+        "total_turnos": teste["total_turnos"],
+        "finalizado_naturalmente": teste["finalizado_naturalmente"],
+        "judge_job_id": judge_job_id,
+    }
+
+
+def executar_juiz(job: Job, fila: FilaJobs) -> dict:
+    """
+    Payload: collection_id, run_id, teste (resultado de executar_teste_com_persona),
+    regras e metricas_conversa (opcional).
+    """
+    p = job.payload
+    teste = p["teste"]
+    _, config = _config_colecao(p["collection_id"], p.get("regras"))
+    tracer = LLMTracer(collection_id=p["collection_id"], run_id=p["run_id"])
+
+    contexto = ContextWindow.criar(config.history_strategy)
+    pedido = montar_pedido_juiz(
+        contexto.transcricao_para_juiz(teste.get("conversa", [])),
+        cenario=teste.get("prompt_teste", "prompt_from_database"),
+        regras=p.get("regras", ""),
+        persona_id=teste.get("persona_id"),
+        persona_nome=teste.get("persona_nome"),
+        total_turnos=teste.get("total_turnos", 0)
+    )
+    julgado = avaliar_com_reparo(
+        create_judge_agent(config), pedido, tracer,
+        persona_id=teste.get("persona_id"), test_id=teste.get("test_id")
+    )
+    avaliacao = julgado.como_dict()
+    metricas = {**p.get("metricas_conversa", {}), "juiz": tracer.resumo()}
+    if avaliacao is None:
+        update_test_run(p["run_id"], {"status": "failed", "metrics": metricas})
+        raise ValueError(f"Juiz não retornou uma avaliação válida: {julgado.erro}")
+
+    score = avaliacao.get("scores", {}).get("score_geral", 0)
+    update_test_run(p["run_id"], {
+        "status": "completed",
+        "evaluation_result": avaliacao,
+        "score": score,
+        "metrics": metricas
+    })
+    return {"run_id": p["run_id"], "persona_id": teste.get("persona_id"), "score": score, "reparado": julgado.reparado}
+
+
+def executar_otimizador(job: Job, fila: FilaJobs) -> dict:
+    """Payload: collection_id, current_prompt, evaluation_result e best_prompt (opcional)."""
+    p = job.payload
+    _, config = _config_colecao(p["collection_id"], p["current_prompt"])
+    tracer = LLMTracer(collection_id=p["collection_id"])
+    avaliacao = EvaluationResult.model_validate(p["evaluation_result"])
+
+    agente = create_optimizer_agent(
+        p["current_prompt"], avaliacao, best_prompt=p.get("best_prompt"), api_key=config.openai_api_key
+    )
+    novo_prompt = generate_improved_prompt(
+        agente, p["current_prompt"], avaliacao, best_prompt=p.get("best_prompt"),
+        tracer=tracer, api_key=config.openai_api_key
+    )
+    return {"new_prompt": novo_prompt, "metrics": tracer.resumo()}
+
+
+HANDLERS: dict[str, Callable[[Job, FilaJobs], dict]] = {
+    "conversation": executar_conversa,
+    "judge": executar_juiz,
+    "optimizer": executar_otimizador,
+}
+
+
+def executar_job(job: Job, fila: FilaJobs) -> dict:
+    """
+    Executa um job reservado.
+
+    Raises:
+        ValueError: Se o tipo do job não tiver handler
+    """
+    handler = HANDLERS.get(job.tipo)
+    if handler is None:
+        raise ValueError(f"Tipo de job desconhecido: {job.tipo}")
+    with contexto_log(job_id=job.id, collection_id=job.payload.get("collection_id"), persona_id=job.payload.get("persona_id")):
+        logger.info("Worker %s executando %s (tentativa %s)", job.worker, job.tipo, job.tentativas)
+        return handler(job, fila)
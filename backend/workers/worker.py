@@ -0,0 +1,167 @@
+"""
+Loop dos workers e inicialização em processos (ou threads, no fallback em memória).
+"""
+
+import logging
+import multiprocessing
+import os
+import signal
+import threading
+from contextlib import contextmanager
+from typing import Iterator, Optional, Sequence
+
+from logs import configurar_logging
+from workers.filas import FilaJobs, FilaMemoria, Job, abrir_fila
+from workers.jobs import TIPOS_JOB, executar_job, identificador_worker
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_URL_FILA = "memory://"
+DEFAULT_THREADS_EM_MEMORIA = 2
+# Renovações do lease por período de lease (margem para atrasos da fila)
+RENOVACOES_POR_LEASE = 3
+
+
+@contextmanager
+def _renovando_lease(fila: FilaJobs, job: Job, worker_id: str) -> Iterator[None]:
+    """Renova o lease do job em uma thread enquanto o bloco executa (heartbeat)."""
+    terminou = threading.Event()
+    intervalo = fila.lease_segundos / RENOVACOES_POR_LEASE
+
+    def renovar() -> None:
+        while not terminou.wait(intervalo):
+            try:
+                if not fila.renovar(job.id, worker_id):
+                    logger.warning("Lease do job %s perdido pelo worker %s (já reentregue)", job.id, worker_id)
+                    return
+            except Exception:
+                logger.exception("Falha ao renovar o lease do job %s", job.id)
+
+    thread = threading.Thread(target=renovar, name=f"lease-{job.id}", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        terminou.set()
+        thread.join()
+
+
+def executar_worker(
+    fila: FilaJobs,
+    tipos: Sequence[str] = TIPOS_JOB,
+    parar: Optional[threading.Event] = None,
+    worker_id: Optional[str] = None,
+    max_jobs: Optional[int] = None
+) -> int:
+    """
+    Consome jobs até `parar` ser sinalizado (ou `max_jobs` serem processados).
+
+    Falhas não derrubam o worker: o job volta à fila enquanto houver tentativas.
+
+    Returns:
+        Número de jobs processados
+    """
+    worker_id = worker_id or identificador_worker()
+    processados = 0
+    logger.info("Worker %s consumindo %s", worker_id, ', '.join(tipos))
+    while (parar is None or not parar.is_set()) and (max_jobs is None or processados < max_jobs):
+        job = fila.reservar(tipos, worker_id, timeout=1.0)
+        if job is None:
+            continue
+        try:
+            with _renovando_lease(fila, job, worker_id):
+                resultado = executar_job(job, fila)
+        except Exception as e:
+            logger.exception("Job %s %s falhou no worker %s", job.tipo, job.id, worker_id)
+            fila.falhar(job.id, f"{type(e).__name__}: {e}")
+        else:
+            fila.concluir(job.id, resultado)
+        processados += 1
+    return processados
+
+
+def _processo_worker(url_fila: str, tipos: Sequence[str], parar) -> None:
+    # Ctrl+C chega a todo o grupo; quem encerra é o processo pai, via `parar`
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # A thread de escrita dos logs do pai não existe no processo filho
+    configurar_logging()
+    fila = abrir_fila(url_fila)
+    try:
+        executar_worker(fila, tipos, parar=parar)
+    finally:
+        fila.fechar()
+
+
+def iniciar_processos(
+    url_fila: str,
+    processos: Optional[int] = None,
+    tipos: Sequence[str] = TIPOS_JOB
+) -> tuple[list[multiprocessing.Process], "multiprocessing.synchronize.Event"]:
+    """
+    Sobe N processos workers consumindo a fila `url_fila`.
+
+    Args:
+        url_fila: sqlite:///... ou redis://... (memory:// não é compartilhável)
+        processos: Quantidade (padrão: número de CPUs)
+        tipos: Tipos de job consumidos
+
+    Returns:
+        (processos, evento de parada); `parar.set()` encerra após o job atual
+
+    Raises:
+        ValueError: Se a fila for em memória
+    """
+    if url_fila.startswith("memory://"):
+        raise ValueError("Fila em memória não é compartilhada entre processos; use sqlite:/// ou redis://")
+    parar = multiprocessing.Event()
+    lista = []
+    for i in range(processos or os.cpu_count() or 1):
+        processo = multiprocessing.Process(
+            target=_processo_worker, args=(url_fila, tuple(tipos), parar),
+            name=f"qa-worker-{i}", daemon=False
+        )
+        processo.start()
+        lista.append(processo)
+    return lista, parar
+
+
+def iniciar_threads(
+    fila: FilaJobs,
+    threads: int = DEFAULT_THREADS_EM_MEMORIA,
+    tipos: Sequence[str] = TIPOS_JOB
+) -> tuple[list[threading.Thread], threading.Event]:
+    """Workers em threads do processo atual (fallback para a fila em memória)."""
+    parar = threading.Event()
+    lista = []
+    for i in range(threads):
+        thread = threading.Thread(
+            target=executar_worker,
+            kwargs={"fila": fila, "tipos": tipos, "parar": parar, "worker_id": f"{identificador_worker()}:t{i}"},
+            name=f"qa-worker-{i}", daemon=True
+        )
+        thread.start()
+        lista.append(thread)
+    return lista, parar
+
+
+_fila_padrao: Optional[FilaJobs] = None
+_lock = threading.Lock()
+
+
+def fila_padrao() -> FilaJobs:
+    """
+    Fila da API, aberta no primeiro uso a partir de QA_JOB_QUEUE.
+
+    Sem QA_JOB_QUEUE (ou com memory://) a fila fica em memória e
+    QA_WORKER_THREADS workers em threads (padrão 2) são iniciados aqui mesmo;
+    com sqlite/redis os jobs esperam workers externos (`python -m workers`).
+    """
+    global _fila_padrao
+    if _fila_padrao is None:
+        with _lock:
+            if _fila_padrao is None:
+                fila = abrir_fila(os.getenv("QA_JOB_QUEUE", DEFAULT_URL_FILA))
+                if isinstance(fila, FilaMemoria):
+                    iniciar_threads(fila, int(os.getenv("QA_WORKER_THREADS", DEFAULT_THREADS_EM_MEMORIA)))
+                _fila_padrao = fila
+    return _fila_padrao
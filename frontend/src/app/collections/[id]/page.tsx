@@ -24,6 +24,29 @@ interface TestRun {
     created_at?: string;
 }
 
+// Prompts chegam no stream como texto, referência (prompt_ref) a um prompt já
+// recebido ou diff de linhas (prompt_diff) contra outro (ver backend/sse.py)
+type PromptDiff = (["=", number] | ["-", number] | ["+", string[]])[];
+
+const splitLines = (text: string): string[] => text.match(/[^\n]*\n|[^\n]+/g) || [];
+
+const applyPromptDiff = (base: string, ops: PromptDiff): string => {
+    const lines = splitLines(base);
+    const out: string[] = [];
+    let i = 0;
+    for (const entry of ops) {
+        if (entry[0] === "=") {
+            out.push(...lines.slice(i, i + entry[1]));
+            i += entry[1];
+        } else if (entry[0] === "-") {
+            i += entry[1];
+        } else {
+            out.push(...entry[1]);
+        }
+    }
+    return out.join("");
+};
+
 export default function CollectionOptimizationPage() {
     const { id } = useParams();
     const [collection, setCollection] = useState<Collection | null>(null);
@@ -37,6 +60,7 @@ export default function CollectionOptimizationPage() {
     const [liveMessages, setLiveMessages] = useState<{ role: string, content: string }[]>([]);
     const [currentIteration, setCurrentIteration] = useState(0);
     const [selectedRun, setSelectedRun] = useState<TestRun | null>(null);
+    const streamPrompts = useRef<Record<string, string>>({});
 
     // Expandable sections state
     const [expandedSections, setExpandedSections] = useState<{
@@ -102,6 +126,7 @@ export default function CollectionOptimizationPage() {
         if (isLooping) return;
         setIsLooping(true);
         setLiveMessages([]);
+        streamPrompts.current = {};
         addLog("Iniciando Loop de Otimização...", "info");
 
         try {
@@ -124,6 +149,7 @@ export default function CollectionOptimizationPage() {
                 const lines = buffer.split("\n\n");
                 buffer = lines.pop() || "";
 
+                // Heartbeats (": ping") não começam com "data: " e são ignorados
                 for (const line of lines) {
                     if (line.startsWith("data: ")) {
                         const jsonStr = line.substring(6);
@@ -146,6 +172,20 @@ export default function CollectionOptimizationPage() {
         }
     };
 
+    // Atualiza o prompt exibido a partir de um evento do stream
+    const showStreamPrompt = (event: any, field: string) => {
+        const ref: string | undefined = event[`${field}_ref`];
+        let text: string | undefined = event[field];
+        if (text === undefined && event[`${field}_diff`]) {
+            const base = streamPrompts.current[event[`${field}_base`]];
+            if (base !== undefined) text = applyPromptDiff(base, event[`${field}_diff`]);
+        }
+        if (text === undefined && ref) text = streamPrompts.current[ref];
+        if (text === undefined) return;
+        if (ref) streamPrompts.current[ref] = text;
+        setCurrentPrompt(text);
+    };
+
     const handleEvent = (event: any) => {
         switch (event.type) {
             case "status":
@@ -153,7 +193,7 @@ export default function CollectionOptimizationPage() {
                 break;
             case "iteration_start":
                 setCurrentIteration(event.iteration);
-                setCurrentPrompt(event.prompt);
+                showStreamPrompt(event, "prompt");
                 setLiveMessages([]);
                 addLog(`>>> ITERAÇÃO ${event.iteration} <<<`, "system");
                 break;
@@ -166,7 +206,7 @@ export default function CollectionOptimizationPage() {
                 break;
             case "optimization":
                 addLog("PROMPT OTIMIZADO PELO AGENTE", "system");
-                setCurrentPrompt(event.new_prompt);
+                showStreamPrompt(event, "new_prompt");
                 break;
             case "error":
                 addLog(`ERRO: ${event.content}`, "error");